@@ -0,0 +1,203 @@
+import hashlib
+from typing import AsyncIterable, Iterable, Iterator
+
+import numpy as np
+
+from llm_call import LLM
+
+
+class CountMinSketch:
+    def __init__(
+        self, width: int = 4096, depth: int = 4, table: np.ndarray | None = None
+    ) -> None:
+        self.width = width
+        self.depth = depth
+        self._table = (
+            np.zeros((depth, width), dtype=np.int64)
+            if table is None
+            else np.asarray(table, dtype=np.int64).reshape(depth, width)
+        )
+        self._rows = np.arange(depth)
+
+    @property
+    def table(self) -> np.ndarray:
+        return self._table
+
+    def _columns(self, key: str) -> np.ndarray:
+        # Stable across processes (unlike hash()), so sketches can be merged
+        digest = hashlib.blake2b(key.encode(), digest_size=16).digest()
+        h1 = int.from_bytes(digest[:8], "little")
+        h2 = int.from_bytes(digest[8:], "little") | 1
+        return np.array(
+            [(h1 + i * h2) % self.width for i in range(0, self.depth)],
+            dtype=np.int64,
+        )
+
+    def add(self, key: str, count: int = 1) -> None:
+        self._table[self._rows, self._columns(key)] += count
+
+    def estimate(self, key: str) -> int:
+        return int(self._table[self._rows, self._columns(key)].min())
+
+    def merge(self, other: "CountMinSketch") -> None:
+        if (self.width, self.depth) != (other.width, other.depth):
+            raise ValueError("Cannot merge sketches of different dimensions")
+        self._table += other.table
+
+    def to_dict(self) -> dict:
+        return {"width": self.width, "depth": self.depth, "table": self._table.tolist()}
+
+    @staticmethod
+    def from_dict(data: dict) -> "CountMinSketch":
+        return CountMinSketch(data["width"], data["depth"], np.array(data["table"]))
+
+
+class VoteAggregator:
+    # Brand x position counts for ranked-list answers. Up to `capacity`
+    # brands are tracked exactly; past that the rows behave as a
+    # space-saving sketch, evicting the brand with the fewest votes.
+    # pylint: disable=too-many-instance-attributes
+    def __init__(
+        self,
+        positions: int,
+        capacity: int = 10_000,
+        sketch_width: int = 4096,
+        sketch_depth: int = 4,
+    ) -> None:
+        self.positions = positions
+        self.capacity = capacity
+        self.samples = 0
+        self.empty = 0
+        self.sketch = CountMinSketch(sketch_width, sketch_depth)
+        self._index: dict[str, int] = {}
+        self._brands: list[str] = []
+        rows = min(capacity, 64)
+        self._counts = np.zeros((rows, positions), dtype=np.int64)
+        self._totals = np.zeros(rows, dtype=np.int64)
+        self._errors = np.zeros(rows, dtype=np.int64)
+
+    def __len__(self) -> int:
+        return len(self._brands)
+
+    def add(self, answers: list[str]) -> None:
+        if not answers:
+            self.empty += 1
+            return
+        self.samples += 1
+        for position, brand in enumerate(answers[: self.positions]):
+            row = self._row(brand)
+            self._counts[row, position] += 1
+            self._totals[row] += 1
+            self.sketch.add(brand)
+
+    def add_response(self, response: LLM.Response) -> None:
+        self.add(response.answers)
+
+    def consume(self, responses: Iterable[LLM.Response]) -> None:
+        for response in responses:
+            self.add(response.answers)
+
+    async def consume_async(self, responses: AsyncIterable[LLM.Response]) -> None:
+        async for response in responses:
+            self.add(response.answers)
+
+    def counts(self, brand: str) -> list[int]:
+        row = self._index.get(brand)
+        if row is None:
+            return [0] * self.positions
+        return self._counts[row].tolist()
+
+    def estimate(self, brand: str) -> int:
+        row = self._index.get(brand)
+        if row is not None:
+            return int(self._totals[row])
+        return self.sketch.estimate(brand)
+
+    def top(self, k: int | None = None) -> list[tuple[str, int, int]]:
+        order = np.argsort(-self._totals[: len(self._brands)], kind="stable")
+        if k is not None:
+            order = order[:k]
+        return [
+            (self._brands[row], int(self._totals[row]), int(self._errors[row]))
+            for row in order
+        ]
+
+    def table(self, k: int | None = None) -> list[list]:
+        rows = [[brand] + self.counts(brand) for brand, _, _ in self.top()]
+        rows.sort(key=lambda r: r[1:], reverse=True)
+        return rows[:k] if k is not None else rows
+
+    def rows(self) -> Iterator[tuple[str, np.ndarray, int, int]]:
+        # (brand, counts by position, total, overestimate) per tracked brand
+        for row, brand in enumerate(self._brands):
+            total, error = int(self._totals[row]), int(self._errors[row])
+            yield brand, self._counts[row], total, error
+
+    def add_counts(
+        self, brand: str, counts: Iterable[int], total: int, error: int = 0
+    ) -> None:
+        # Adds a row tallied elsewhere, e.g. by another shard
+        row = self._row(brand)
+        self._counts[row] += np.asarray(counts, dtype=np.int64)
+        self._totals[row] += total
+        self._errors[row] += error
+
+    def merge(self, other: "VoteAggregator") -> None:
+        if other.positions != self.positions:
+            raise ValueError("Cannot merge aggregates with different positions")
+        for brand, counts, total, error in other.rows():
+            self.add_counts(brand, counts, total, error)
+        self.sketch.merge(other.sketch)
+        self.samples += other.samples
+        self.empty += other.empty
+
+    def to_dict(self) -> dict:
+        rows = len(self._brands)
+        return {
+            "positions": self.positions,
+            "capacity": self.capacity,
+            "samples": self.samples,
+            "empty": self.empty,
+            "brands": list(self._brands),
+            "counts": self._counts[:rows].tolist(),
+            "totals": self._totals[:rows].tolist(),
+            "errors": self._errors[:rows].tolist(),
+            "sketch": self.sketch.to_dict(),
+        }
+
+    @staticmethod
+    def from_dict(data: dict) -> "VoteAggregator":
+        aggregator = VoteAggregator(data["positions"], data["capacity"])
+        aggregator.samples = data["samples"]
+        aggregator.empty = data["empty"]
+        aggregator.sketch = CountMinSketch.from_dict(data["sketch"])
+        for row in zip(data["brands"], data["counts"], data["totals"], data["errors"]):
+            aggregator.add_counts(*row)
+        return aggregator
+
+    def _row(self, brand: str) -> int:
+        row = self._index.get(brand)
+        if row is not None:
+            return row
+        if len(self._brands) < self.capacity:
+            row = len(self._brands)
+            if row == len(self._totals):
+                self._grow(min(self.capacity, row * 2))
+            self._brands.append(brand)
+        else:
+            row = int(np.argmin(self._totals))
+            del self._index[self._brands[row]]
+            self._brands[row] = brand
+            # The newcomer inherits the evicted count as its overestimate
+            self._errors[row] = self._totals[row]
+            self._counts[row] = 0
+        self._index[brand] = row
+        return row
+
+    def _grow(self, rows: int) -> None:
+        extra = rows - len(self._totals)
+        self._counts = np.vstack(
+            [self._counts, np.zeros((extra, self.positions), dtype=np.int64)]
+        )
+        self._totals = np.concatenate([self._totals, np.zeros(extra, dtype=np.int64)])
+        self._errors = np.concatenate([self._errors, np.zeros(extra, dtype=np.int64)])
@@ -0,0 +1,95 @@
+import json
+import os
+import tempfile
+import uuid
+from abc import ABC, abstractmethod
+from dataclasses import dataclass
+from typing import Awaitable, Callable
+
+BATCH_RUNNING = "running"
+BATCH_SUCCEEDED = "succeeded"
+BATCH_FAILED = "failed"
+
+
+class BatchError(Exception):
+    pass
+
+
+@dataclass
+class BatchRequest:
+    id: str
+    system_prompt: str
+    question: str
+    temperature: float | None
+    is_json: bool
+
+
+class BatchBackend(ABC):
+    # Transport for a provider's bulk endpoint: submit JSONL lines, poll the
+    # job, fetch result lines. Line formats belong to the provider Model.
+    @abstractmethod
+    async def submit(self, lines: list[dict]) -> str:
+        pass
+
+    @abstractmethod
+    async def poll(self, job_id: str) -> str:
+        pass
+
+    @abstractmethod
+    async def results(self, job_id: str) -> list[dict]:
+        pass
+
+
+def write_jsonl(lines: list[dict], directory: str | None = None) -> str:
+    fd, path = tempfile.mkstemp(suffix=".jsonl", dir=directory)
+    with os.fdopen(fd, "w", encoding="utf-8") as f:
+        for line in lines:
+            f.write(json.dumps(line))
+            f.write("\n")
+    return path
+
+
+def read_jsonl(text: str) -> list[dict]:
+    return [json.loads(line) for line in text.splitlines() if line.strip()]
+
+
+class LocalBatchEndpoint(BatchBackend):
+    # In-process stand-in for a provider batch endpoint. Jobs stay running
+    # for `polls_until_done` polls, then every input line is answered with
+    # `respond` and written to an output file next to the input.
+    def __init__(
+        self,
+        respond: Callable[[dict], Awaitable[dict]],
+        directory: str | None = None,
+        polls_until_done: int = 1,
+    ) -> None:
+        self._respond = respond
+        self._directory = directory or tempfile.mkdtemp(prefix="llm-batch-")
+        self._polls_until_done = polls_until_done
+        self._remaining: dict[str, int] = {}
+        self._inputs: dict[str, str] = {}
+        self._outputs: dict[str, str] = {}
+
+    async def submit(self, lines: list[dict]) -> str:
+        job_id = uuid.uuid4().hex
+        self._inputs[job_id] = write_jsonl(lines, self._directory)
+        self._remaining[job_id] = self._polls_until_done
+        return job_id
+
+    async def poll(self, job_id: str) -> str:
+        if job_id not in self._remaining:
+            raise BatchError(f"Unknown batch job {job_id}")
+        if self._remaining[job_id] > 0:
+            self._remaining[job_id] -= 1
+            return BATCH_RUNNING
+        if job_id not in self._outputs:
+            with open(self._inputs[job_id], encoding="utf-8") as f:
+                lines = read_jsonl(f.read())
+            self._outputs[job_id] = write_jsonl(
+                [await self._respond(line) for line in lines], self._directory
+            )
+        return BATCH_SUCCEEDED
+
+    async def results(self, job_id: str) -> list[dict]:
+        with open(self._outputs[job_id], encoding="utf-8") as f:
+            return read_jsonl(f.read())
@@ -0,0 +1,434 @@
+import argparse
+import asyncio
+import json
+import multiprocessing
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+from dataclasses import asdict, dataclass, field
+from typing import Any, Iterator
+
+from tabulate import tabulate
+
+from aggregate import VoteAggregator
+from canonical import BrandCanonicalizer
+from ledger import ROW_HEADERS, CostLedger, tagged
+from llm_call import LLM
+from providers import PROVIDERS, load_model
+from results import ResultStore, Sample
+from scheduler import BULK, Scheduler
+
+
+@dataclass
+class Job:
+    id: str
+    kind: str
+    templates: list[str]
+    iterations: int
+    category: str = ""
+    number: int = 5
+    temperature: float = 1.0
+
+    def question(self, i: int) -> str:
+        return (
+            self.templates[i % len(self.templates)]
+            .replace("[insert written number]", str(self.number))
+            .replace("[insert product category]", self.category)
+        )
+
+    @property
+    def positions(self) -> int:
+        return self.number if self.kind == "list" else 1
+
+
+@dataclass
+class JobState:
+    aggregate: VoteAggregator
+    completed: set[int] = field(default_factory=set[int])
+    # Iterations that came back empty; they stay pending for the next run
+    failures: int = 0
+
+
+def load_jobs(path: str) -> list[Job]:
+    jobs = []
+    with open(path, encoding="utf-8") as f:
+        for line in f:
+            if not line.strip():
+                continue
+            spec = json.loads(line)
+            if "template" in spec:
+                spec["templates"] = [spec.pop("template")]
+            if spec["kind"] not in {"list", "choice"}:
+                raise ValueError(f"Unknown job kind {spec['kind']} in {spec['id']}")
+            jobs.append(Job(**spec))
+    return jobs
+
+
+def to_ranges(indices: set[int]) -> list[list[int]]:
+    ranges: list[list[int]] = []
+    for i in sorted(indices):
+        if ranges and ranges[-1][1] == i:
+            ranges[-1][1] = i + 1
+        else:
+            ranges.append([i, i + 1])
+    return ranges
+
+
+def from_ranges(ranges: list[list[int]]) -> set[int]:
+    return {i for start, end in ranges for i in range(start, end)}
+
+
+class BatchRunner:
+    # pylint: disable=too-many-instance-attributes
+    def __init__(
+        self,
+        model: LLM,
+        jobs: list[Job],
+        checkpoint_path: str,
+        checkpoint_interval: float = 30.0,
+        parallelism: int | None = None,
+        shard: int = 0,
+        shards: int = 1,
+        scheduler: Scheduler | None = None,
+        store: ResultStore | None = None,
+    ) -> None:
+        self.model = model
+        self.jobs = jobs
+        self.checkpoint_path = checkpoint_path
+        self.checkpoint_interval = checkpoint_interval
+        self.parallelism = parallelism or model.max_parallelism
+        # Only iterations i with i % shards == shard are run; striding keeps
+        # every template represented in every shard
+        self.shard = shard
+        self.shards = shards
+        # With a shared scheduler, jobs run as BULK work, each job its own
+        # tenant, behind any interactive calls on the same model
+        self.scheduler = scheduler
+        # Jobs stopped through scheduler.cancel(job.id)
+        self.cancelled: set[str] = set()
+        # Every raw sample is also appended here, so tables can be re-cut
+        # later without re-polling
+        self.store = store
+        self.state = {
+            job.id: JobState(aggregate=VoteAggregator(positions=job.positions))
+            for job in jobs
+        }
+        # Identifies this run in the result store; resuming keeps it
+        self.attempt = time.time_ns()
+        if os.path.exists(checkpoint_path):
+            self.restore()
+
+    def restore(self) -> None:
+        with open(self.checkpoint_path, encoding="utf-8") as f:
+            checkpoint = json.load(f)
+        self.attempt = checkpoint.get("attempt", self.attempt)
+        for job_id, saved in checkpoint["jobs"].items():
+            if job_id in self.state:
+                self.state[job_id] = JobState(
+                    aggregate=VoteAggregator.from_dict(saved["aggregate"]),
+                    completed=from_ranges(saved["completed"]),
+                    failures=saved.get("failures", 0),
+                )
+
+    def checkpoint(self) -> None:
+        # Samples are written first, so everything the checkpoint counts as
+        # done is in the store; a crash in between only repeats rows, which
+        # the store ignores
+        if self.store is not None:
+            self.store.flush()
+        checkpoint = {
+            "attempt": self.attempt,
+            "jobs": {
+                job_id: {
+                    "completed": to_ranges(state.completed),
+                    "failures": state.failures,
+                    "aggregate": state.aggregate.to_dict(),
+                }
+                for job_id, state in self.state.items()
+            },
+        }
+        # Write-then-rename so a crash mid-write never corrupts the checkpoint
+        tmp_path = f"{self.checkpoint_path}.tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(checkpoint, f)
+        os.replace(tmp_path, self.checkpoint_path)
+
+    @property
+    def failures(self) -> dict[str, int]:
+        return {job_id: state.failures for job_id, state in self.state.items()}
+
+    def pending(self) -> Iterator[tuple[Job, int]]:
+        for job in self.jobs:
+            completed = self.state[job.id].completed
+            for i in range(self.shard, job.iterations, self.shards):
+                if job.id in self.cancelled:
+                    break
+                if i not in completed:
+                    yield job, i
+
+    async def run(self) -> dict[str, VoteAggregator]:
+        work = self.pending()
+
+        async def run_calls(_):
+            for job, i in work:
+                await self.run_one(job, i)
+
+        async def checkpoint_periodically():
+            while True:
+                await asyncio.sleep(self.checkpoint_interval)
+                self.checkpoint()
+
+        checkpointer = asyncio.create_task(checkpoint_periodically())
+        try:
+            await asyncio.gather(*[run_calls(i) for i in range(0, self.parallelism)])
+        finally:
+            checkpointer.cancel()
+            self.checkpoint()
+        return {job_id: state.aggregate for job_id, state in self.state.items()}
+
+    async def run_one(self, job: Job, i: int) -> None:
+        if self.scheduler is None:
+            await self.ask(job, i)
+        else:
+            try:
+                await self.scheduler.run(lambda: self.ask(job, i), BULK, job.id)
+            except asyncio.CancelledError:
+                # A cancelled tenant stops its job, not the whole run
+                if asyncio.current_task().cancelling():
+                    raise
+                self.cancelled.add(job.id)
+
+    async def ask(self, job: Job, i: int) -> None:
+        question = job.question(i)
+        start = time.perf_counter()
+        with tagged(method=job.kind, job=job.id):
+            if job.kind == "list":
+                result = await self.model.ask_for_list(
+                    job.number, question, "", job.temperature
+                )
+                answers = result.answers
+                system_prompt = self.model.ranked_list_system_prompt
+                probability = None
+            else:
+                result = await self.model.choice_from_pair(question, job.temperature, 1)
+                answers = [result.answer] if result.answer else []
+                system_prompt = self.model.choice_system_prompt
+                probability = result.probability
+        state = self.state[job.id]
+        if not answers:
+            # Providers turn errors and unparseable replies into empty answers;
+            # leaving the iteration pending lets a resumed run retry it
+            state.failures += 1
+            return
+        if self.store is not None:
+            self.store.add(
+                Sample(
+                    model=result.model or self.model.computed_model_name,
+                    template=job.templates[i % len(job.templates)],
+                    answers=answers,
+                    temperature=job.temperature,
+                    category=job.category,
+                    kind=job.kind,
+                    system_prompt=system_prompt,
+                    probability=probability,
+                    input_tokens=result.input_tokens,
+                    output_tokens=result.output_tokens,
+                    latency=time.perf_counter() - start,
+                    job=job.id,
+                    iteration=i,
+                    attempt=self.attempt,
+                )
+            )
+        state.aggregate.add(answers)
+        state.completed.add(i)
+
+
+def run_to_end(runner: BatchRunner) -> dict[str, VoteAggregator]:
+    # Runs on a new event loop; the model's clients and the store are closed
+    # however the run ends, so buffered samples are not lost
+    async def run() -> dict[str, VoteAggregator]:
+        async with runner.model:
+            return await runner.run()
+
+    try:
+        return asyncio.run(run())
+    finally:
+        if runner.store is not None:
+            runner.store.close()
+
+
+def run_shard(
+    provider: str,
+    model_kwargs: dict[str, Any],
+    jobs: list[dict],
+    checkpoint_path: str,
+    checkpoint_interval: float,
+    parallelism: int | None,
+    shard: int,
+    shards: int,
+    canonical: bool,
+    store_path: str | None,
+) -> dict:
+    # Runs in a worker process with its own event loop and model; results go
+    # back as plain dicts so they pickle cheaply
+    cost = CostLedger()
+    model = load_model(
+        provider,
+        ledger=cost,
+        canonicalizer=BrandCanonicalizer() if canonical else None,
+        **model_kwargs,
+    )
+    # Every shard sends under the same quota, so each gets its share
+    model.split_limits(shards)
+    store = ResultStore(store_path) if store_path else None
+    runner = BatchRunner(
+        model,
+        [Job(**job) for job in jobs],
+        checkpoint_path,
+        checkpoint_interval,
+        parallelism,
+        shard,
+        shards,
+        store=store,
+    )
+    results = run_to_end(runner)
+    return {
+        "aggregates": {job_id: agg.to_dict() for job_id, agg in results.items()},
+        "failures": runner.failures,
+        "ledger": cost.to_dict(),
+    }
+
+
+class ShardedRunner:
+    # Splits every job's iterations over `shards` worker processes, each
+    # with its own event loop, model and connection pools, so decoding and
+    # TLS work is spread over cores. Each shard checkpoints to its own file
+    # and resumes from it; tallies and costs are merged in the parent.
+    # pylint: disable=too-many-instance-attributes
+    def __init__(
+        self,
+        provider: str,
+        jobs: list[Job],
+        checkpoint_path: str,
+        shards: int | None = None,
+        checkpoint_interval: float = 30.0,
+        parallelism: int | None = None,
+        canonical: bool = False,
+        store_path: str | None = None,
+        **model_kwargs: Any,
+    ) -> None:
+        self.provider = provider
+        self.jobs = jobs
+        self.checkpoint_path = checkpoint_path
+        self.shards = shards or os.cpu_count() or 1
+        self.checkpoint_interval = checkpoint_interval
+        self.parallelism = parallelism
+        self.canonical = canonical
+        # Shards append to one result store; ids are assigned at write time
+        self.store_path = store_path
+        self.model_kwargs = model_kwargs
+        self.ledger = CostLedger()
+        self.failures = {job.id: 0 for job in jobs}
+
+    def shard_checkpoint(self, shard: int) -> str:
+        return f"{self.checkpoint_path}.{shard}-of-{self.shards}"
+
+    async def run(self) -> dict[str, VoteAggregator]:
+        loop = asyncio.get_running_loop()
+        jobs = [asdict(job) for job in self.jobs]
+        # Spawned rather than forked so workers don't inherit the parent's
+        # event loop, clients or ledger
+        context = multiprocessing.get_context("spawn")
+        with ProcessPoolExecutor(self.shards, mp_context=context) as pool:
+            outputs = await asyncio.gather(
+                *[
+                    loop.run_in_executor(
+                        pool,
+                        run_shard,
+                        self.provider,
+                        self.model_kwargs,
+                        jobs,
+                        self.shard_checkpoint(shard),
+                        self.checkpoint_interval,
+                        self.parallelism,
+                        shard,
+                        self.shards,
+                        self.canonical,
+                        self.store_path,
+                    )
+                    for shard in range(0, self.shards)
+                ]
+            )
+        results = {job.id: VoteAggregator(positions=job.positions) for job in self.jobs}
+        for output in outputs:
+            for job_id, saved in output["aggregates"].items():
+                results[job_id].merge(VoteAggregator.from_dict(saved))
+            for job_id, failures in output["failures"].items():
+                self.failures[job_id] += failures
+            self.ledger.merge(CostLedger.from_dict(output["ledger"]))
+        return results
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Run polls from a JSONL job file")
+    parser.add_argument("jobs")
+    parser.add_argument("--provider", choices=list(PROVIDERS), default="gemini")
+    parser.add_argument("--checkpoint", default="batch_checkpoint.json")
+    parser.add_argument("--interval", type=float, default=30.0)
+    parser.add_argument("--parallelism", type=int)
+    parser.add_argument("--canonical", action="store_true")
+    parser.add_argument(
+        "--shards",
+        type=int,
+        default=1,
+        help="Worker processes, each with its own event loop (0 = one per core)",
+    )
+    parser.add_argument("--store", help="Append raw samples to this result store")
+    args = parser.parse_args()
+
+    jobs = load_jobs(args.jobs)
+    if args.shards == 1:
+        model = load_model(
+            args.provider,
+            canonicalizer=BrandCanonicalizer() if args.canonical else None,
+        )
+        store = ResultStore(args.store) if args.store else None
+        runner = BatchRunner(
+            model, jobs, args.checkpoint, args.interval, args.parallelism, store=store
+        )
+        results = run_to_end(runner)
+        failures = runner.failures
+        cost = model.ledger
+    else:
+        sharded = ShardedRunner(
+            args.provider,
+            jobs,
+            args.checkpoint,
+            args.shards or None,
+            args.interval,
+            args.parallelism,
+            args.canonical,
+            args.store,
+        )
+        results = asyncio.run(sharded.run())
+        failures = sharded.failures
+        cost = sharded.ledger
+    for job in jobs:
+        aggregate = results[job.id]
+        print(
+            f"\n{job.id}: {aggregate.samples} answers, "
+            f"{failures[job.id]} failed and left pending"
+        )
+        print(
+            tabulate(
+                aggregate.table(),
+                headers=["Brand"] + [f"#{i + 1}" for i in range(0, job.positions)],
+                tablefmt="github",
+            )
+        )
+    print("\nCost")
+    print(tabulate(cost.rows(), headers=ROW_HEADERS, tablefmt="github"))
+
+
+if __name__ == "__main__":
+    main()
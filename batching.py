@@ -0,0 +1,142 @@
+import asyncio
+from typing import TYPE_CHECKING, Any, AsyncIterator
+
+from batch_api import (
+    BATCH_RUNNING,
+    BATCH_SUCCEEDED,
+    BatchBackend,
+    BatchError,
+    BatchRequest,
+)
+from ledger import booked, booked_as
+
+if TYPE_CHECKING:
+    from llm_call import LLM
+
+
+class BatchingMixin:
+    # Bulk requests through the provider's batch API, or through regular
+    # dispatch for providers without one
+    def __init__(
+        self, batch_backend: BatchBackend | None = None, **kwargs: Any
+    ) -> None:
+        super().__init__(**kwargs)
+        self._batch_backend = batch_backend
+
+    @property
+    def has_batch_api(self) -> bool:
+        # Providers with an asynchronous batch endpoint implement
+        # create_batch_backend, batch_line and parse_batch_line
+        return False
+
+    @property
+    def batch_backend(self) -> BatchBackend:
+        if self._batch_backend is None:
+            self._batch_backend = self.create_batch_backend()
+        return self._batch_backend
+
+    def create_batch_backend(self) -> BatchBackend:
+        raise NotImplementedError(f"{self.computed_model_name} has no batch API")
+
+    def batch_line(self, request: BatchRequest) -> dict:
+        raise NotImplementedError(f"{self.computed_model_name} has no batch API")
+
+    def parse_batch_line(self, line: dict) -> tuple[str, "LLM.SimpleResponse"]:
+        raise NotImplementedError(f"{self.computed_model_name} has no batch API")
+
+    async def run_batch(
+        self,
+        requests: list[BatchRequest],
+        poll_interval: float = 30.0,
+        method: str = "batch",
+    ) -> AsyncIterator[tuple[str, "LLM.SimpleResponse"]]:
+        if not self.has_batch_api:
+            async for request_id, result in self.run_online(requests, method):
+                yield request_id, result
+            return
+        backend = self.batch_backend
+        job_id = await backend.submit([self.batch_line(r) for r in requests])
+        while (status := await backend.poll(job_id)) == BATCH_RUNNING:
+            await asyncio.sleep(poll_interval)
+        if status != BATCH_SUCCEEDED:
+            raise BatchError(f"Batch job {job_id} finished as {status}")
+        for line in await backend.results(job_id):
+            request_id, result = self.parse_batch_line(line)
+            with booked(method):
+                self._ledger.record(
+                    self.computed_model_name,
+                    self.price,
+                    result.input_tokens or 0,
+                    result.output_tokens or 0,
+                    batch=True,
+                    cached_tokens=result.cached_tokens,
+                )
+            yield request_id, result
+
+    async def run_online(
+        self, requests: list[BatchRequest], method: str = "batch"
+    ) -> AsyncIterator[tuple[str, "LLM.SimpleResponse"]]:
+        # Fallback for providers without a batch API: the same requests go
+        # through regular dispatch and are yielded as they finish
+        @booked_as(method)
+        async def ask(request: BatchRequest) -> tuple[str, "LLM.SimpleResponse"]:
+            responses = await self.ask_generic_question_samples(
+                request.system_prompt,
+                request.question,
+                request.temperature,
+                request.is_json,
+                1,
+            )
+            return request.id, (
+                responses[0] if responses else self.SimpleResponse("", None, 0, 0)
+            )
+
+        for result in asyncio.as_completed([ask(r) for r in requests]):
+            yield await result
+
+    # pylint: disable=broad-exception-caught
+    async def ask_for_list_batch(
+        self,
+        choices: int,
+        questions: list[str],
+        temperature: float | None,
+        poll_interval: float = 30.0,
+    ) -> AsyncIterator[tuple[int, "LLM.Response"]]:
+        requests = [
+            BatchRequest(str(i), self.ranked_list_system_prompt, q, temperature, True)
+            for i, q in enumerate(questions)
+        ]
+        async for request_id, result in self.run_batch(requests, poll_interval, "list"):
+            try:
+                answers = self.ranked_list_answers(result.answer)
+            except Exception as ex:
+                self.record_parse_failure(result.answer, ex)
+                answers = []
+            yield int(request_id), self.Response(
+                answers=self.truncate(answers, choices),
+                input_tokens=result.input_tokens,
+                output_tokens=result.output_tokens,
+            )
+
+    async def choice_from_pair_batch(
+        self,
+        questions: list[str],
+        temperature: float,
+        system_prompt=None,
+        poll_interval: float = 30.0,
+    ) -> AsyncIterator[tuple[int, "LLM.Choice"]]:
+        if not system_prompt:
+            system_prompt = self.choice_system_prompt
+        requests = [
+            BatchRequest(str(i), system_prompt, q, temperature, False)
+            for i, q in enumerate(questions)
+        ]
+        async for request_id, result in self.run_batch(
+            requests, poll_interval, "choice"
+        ):
+            yield int(request_id), self.Choice(
+                answer=self.clean_reply(result.answer),
+                probability=result.probability,
+                input_tokens=result.input_tokens,
+                output_tokens=result.output_tokens,
+            )
@@ -0,0 +1,290 @@
+import argparse
+import asyncio
+import json
+import platform
+import statistics
+import time
+from collections import Counter
+from dataclasses import asdict, dataclass, field
+from datetime import datetime, timezone
+from typing import Awaitable, Callable
+
+from tabulate import tabulate
+
+from concurrency import AdaptiveLimiter
+from ledger import tagged
+from llm_call import LLM
+from parsing import JSON_BACKEND
+from retrying import captured_errors
+from providers import PROVIDERS, load_model
+
+CHOICE_QUESTION = "In one word, which vintage car is the best - Volvo or Saab? Must choose one. Do not include any explanations"
+CHOICE_OPTIONS = {"Volvo", "Saab"}
+LIST_QUESTION = "Which 5 brands stand out to you the most in Luxury SUVs?"
+LIST_CHOICES = 5
+
+# Representative ranked-list replies for the parser microbenchmark
+PARSE_PAYLOADS = {
+    "valid": json.dumps(
+        {
+            "choices": {
+                "Land Rover": 1,
+                "Mercedes-Benz": 2,
+                "BMW": 3,
+                "Porsche": 4,
+                "Audi": 5,
+            }
+        }
+    ),
+    "long": json.dumps({"choices": {f"Brand {i}": i for i in range(1, 21)}}),
+    "rejected": json.dumps({"choices": {"1": 1, "2": 2, "3": 3}}),
+    "malformed": '{"choices": {"Land Rover": 1, "BMW"',
+}
+
+
+@dataclass
+class LevelResult:
+    # One field per report column
+    # pylint: disable=too-many-instance-attributes
+    method: str
+    parallelism: int
+    requests: int
+    elapsed: float
+    rpm: float
+    p50: float
+    p95: float
+    p99: float
+    error_rate: float
+    cpu_per_request_ms: float
+    live_parallelism: int
+    errors: dict[str, int] = field(default_factory=dict[str, int])
+    cost_per_1k: float = 0.0
+
+
+def classify_choice(choice: LLM.Choice) -> str | None:
+    if not choice.answer:
+        return "empty"
+    if choice.answer not in CHOICE_OPTIONS:
+        return "invalid"
+    return None
+
+
+def classify_list(response: LLM.Response) -> str | None:
+    if not response.answers:
+        return "empty"
+    if len(response.answers) < LIST_CHOICES:
+        return "short"
+    return None
+
+
+def classify_errors(error: str | None, statuses: list[int | None]) -> str | None:
+    # Providers turn HTTP errors into empty answers; report those by status
+    if error != "empty" or not statuses:
+        return error
+    status = statuses[-1]
+    return f"http_{status}" if status else "error"
+
+
+def method_call(model: LLM, method: str) -> Callable[[], Awaitable[str | None]]:
+    async def choice() -> str | None:
+        return classify_choice(await model.choice_from_pair(CHOICE_QUESTION, 1.0, 1))
+
+    async def ranked_list() -> str | None:
+        return classify_list(
+            await model.ask_for_list(LIST_CHOICES, LIST_QUESTION, "", 0.1)
+        )
+
+    call = {"choice": choice, "list": ranked_list}[method]
+
+    async def classified() -> str | None:
+        with captured_errors() as statuses:
+            error = await call()
+        return classify_errors(error, statuses)
+
+    return classified
+
+
+def percentile(latencies: list[float], pct: int) -> float:
+    if len(latencies) < 2:
+        return latencies[0] if latencies else 0.0
+    return statistics.quantiles(latencies, n=100, method="inclusive")[pct - 1]
+
+
+async def run_level(
+    model: LLM, method: str, parallelism: int, requests: int
+) -> LevelResult:
+    call = method_call(model, method)
+    latencies: list[float] = []
+    errors: Counter[str] = Counter()
+    remaining = [requests]
+
+    async def run_calls(_):
+        while remaining[0] > 0:
+            remaining[0] -= 1
+            start = time.perf_counter()
+            try:
+                error = await call()
+            # pylint: disable=broad-exception-caught
+            except Exception as ex:
+                error = f"exception:{type(ex).__name__}"
+            latencies.append(time.perf_counter() - start)
+            if error:
+                errors[error] += 1
+
+    # thread_time only counts the event loop thread, not time spent waiting
+    cost_start = model.ledger.total().cost
+    cpu_start = time.thread_time()
+    start_time = time.perf_counter()
+    with tagged(method=method, job="benchmark"):
+        await asyncio.gather(*[run_calls(i) for i in range(0, parallelism)])
+    elapsed = time.perf_counter() - start_time
+    cpu = time.thread_time() - cpu_start
+    cost = model.ledger.total().cost - cost_start
+
+    return LevelResult(
+        method=method,
+        parallelism=parallelism,
+        requests=requests,
+        elapsed=elapsed,
+        rpm=requests / (elapsed / 60),
+        p50=percentile(latencies, 50),
+        p95=percentile(latencies, 95),
+        p99=percentile(latencies, 99),
+        error_rate=sum(errors.values()) / requests,
+        cpu_per_request_ms=cpu * 1000 / requests,
+        live_parallelism=model.parallelism,
+        errors=dict(errors),
+        cost_per_1k=cost * 1000 / requests,
+    )
+
+
+async def sweep(
+    provider: str,
+    methods: list[str],
+    levels: list[int],
+    requests: int,
+    adaptive: bool = False,
+) -> list[LevelResult]:
+    results = []
+    for method in methods:
+        for level in levels:
+            # A pinned limiter measures the client at exactly this parallelism
+            limiter = (
+                AdaptiveLimiter(initial_limit=level, max_limit=level)
+                if adaptive
+                else AdaptiveLimiter(
+                    initial_limit=level, min_limit=level, max_limit=level
+                )
+            )
+            model = load_model(provider, limiter=limiter)
+            results.append(await run_level(model, method, level, requests))
+    return results
+
+
+def report(results: list[LevelResult]) -> str:
+    return tabulate(
+        [
+            [
+                r.method,
+                r.parallelism,
+                r.requests,
+                f"{r.rpm:.0f}",
+                f"{r.p50 * 1000:.1f}",
+                f"{r.p95 * 1000:.1f}",
+                f"{r.p99 * 1000:.1f}",
+                f"{r.error_rate:.2%}",
+                f"{r.cpu_per_request_ms:.3f}",
+                r.live_parallelism,
+                f"{r.cost_per_1k:.4f}",
+            ]
+            for r in results
+        ],
+        headers=[
+            "Method",
+            "Parallel",
+            "Requests",
+            "RPM",
+            "p50 ms",
+            "p95 ms",
+            "p99 ms",
+            "Errors",
+            "CPU ms/req",
+            "Live limit",
+            "USD/1k req",
+        ],
+        tablefmt="github",
+    )
+
+
+def parse_cost(iterations: int) -> dict[str, float]:
+    # Microseconds per LLM.parse_json_ranked_list call for each payload shape
+    costs = {}
+    for name, payload in PARSE_PAYLOADS.items():
+        start = time.perf_counter()
+        for _ in range(0, iterations):
+            try:
+                LLM.parse_json_ranked_list(payload)
+            # pylint: disable=broad-exception-caught
+            except Exception:
+                pass
+        costs[name] = (time.perf_counter() - start) * 1_000_000 / iterations
+    return costs
+
+
+def parse_report(costs: dict[str, float], rpm: int) -> str:
+    # Share of one core spent parsing if every response at `rpm` had this shape
+    return tabulate(
+        [
+            [name, f"{us:.2f}", f"{us * rpm / 60 / 1_000_000:.2%}"]
+            for name, us in costs.items()
+        ],
+        headers=["Payload", f"us/parse ({JSON_BACKEND})", f"Core at {rpm} RPM"],
+        tablefmt="github",
+    )
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Sweep LLM client throughput")
+    parser.add_argument("--provider", choices=list(PROVIDERS), default="mock")
+    parser.add_argument("--methods", default="choice,list")
+    parser.add_argument("--levels", default="10,100,1000")
+    parser.add_argument("--requests", type=int, default=2000)
+    parser.add_argument("--adaptive", action="store_true")
+    parser.add_argument("--output", help="write machine-readable results here")
+    parser.add_argument(
+        "--parse", type=int, help="only time the ranked-list parser, N iterations"
+    )
+    parser.add_argument("--rpm", type=int, default=30000)
+    args = parser.parse_args()
+
+    if args.parse:
+        print(parse_report(parse_cost(args.parse), args.rpm))
+        return
+
+    results = asyncio.run(
+        sweep(
+            args.provider,
+            args.methods.split(","),
+            [int(level) for level in args.levels.split(",")],
+            args.requests,
+            args.adaptive,
+        )
+    )
+    print(report(results))
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(
+                {
+                    "provider": args.provider,
+                    "timestamp": datetime.now(timezone.utc).isoformat(),
+                    "python": platform.python_version(),
+                    "adaptive": args.adaptive,
+                    "results": [asdict(r) for r in results],
+                },
+                f,
+                indent=2,
+            )
+
+
+if __name__ == "__main__":
+    main()
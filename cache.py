@@ -0,0 +1,111 @@
+import hashlib
+import json
+import sqlite3
+import time
+from typing import Any
+
+DEFAULT_CACHE_PATH = ".llm_cache.sqlite"
+
+
+class ResponseCache:
+    # Content-addressed SQLite store for provider responses with TTL and
+    # least-recently-used eviction once max_entries is exceeded.
+    def __init__(
+        self,
+        path: str = DEFAULT_CACHE_PATH,
+        ttl: float | None = None,
+        max_entries: int | None = 100_000,
+        cache_stochastic: bool = False,
+    ) -> None:
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.cache_stochastic = cache_stochastic
+        self._db = sqlite3.connect(path, isolation_level=None)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute("PRAGMA synchronous=NORMAL")
+        self._db.execute(
+            """
+            CREATE TABLE IF NOT EXISTS responses (
+                key TEXT PRIMARY KEY,
+                payload TEXT NOT NULL,
+                created REAL NOT NULL,
+                used REAL NOT NULL
+            )
+            """
+        )
+        self._db.execute("CREATE INDEX IF NOT EXISTS responses_used ON responses(used)")
+        # Kept in step with the table so the size cap is checked on every put
+        # without counting rows
+        (self._count,) = self._db.execute("SELECT COUNT(*) FROM responses").fetchone()
+
+    @staticmethod
+    def key(
+        model: str,
+        system_prompt: str,
+        question: str,
+        temperature: float | None,
+        schema: Any,
+        samples: int = 1,
+    ) -> str:
+        content = json.dumps(
+            [model, system_prompt, question, temperature, schema, samples],
+            sort_keys=True,
+        )
+        return hashlib.sha256(content.encode()).hexdigest()
+
+    def bypass(self, temperature: float | None) -> bool:
+        # None is the provider's default temperature, which is stochastic
+        return not self.cache_stochastic and temperature != 0
+
+    def get(self, key: str) -> Any:
+        row = self._db.execute(
+            "SELECT payload, created FROM responses WHERE key = ?", (key,)
+        ).fetchone()
+        if row is None:
+            return None
+        now = time.time()
+        if self.ttl is not None and now - row[1] > self.ttl:
+            self._count -= self._db.execute(
+                "DELETE FROM responses WHERE key = ?", (key,)
+            ).rowcount
+            return None
+        self._db.execute("UPDATE responses SET used = ? WHERE key = ?", (now, key))
+        return json.loads(row[0])
+
+    def put(self, key: str, payload: Any) -> None:
+        now = time.time()
+        replaced = self._db.execute(
+            "SELECT 1 FROM responses WHERE key = ?", (key,)
+        ).fetchone()
+        self._db.execute(
+            "INSERT OR REPLACE INTO responses (key, payload, created, used) VALUES (?, ?, ?, ?)",
+            (key, json.dumps(payload), now, now),
+        )
+        if replaced is None:
+            self._count += 1
+        self._trim()
+
+    def evict(self) -> None:
+        if self.ttl is not None:
+            self._db.execute(
+                "DELETE FROM responses WHERE created < ?", (time.time() - self.ttl,)
+            )
+        # Recounted here, as other processes may share the file
+        (self._count,) = self._db.execute("SELECT COUNT(*) FROM responses").fetchone()
+        self._trim()
+
+    def _trim(self) -> None:
+        # Drops least recently used entries down to max_entries
+        if self.max_entries is None or self._count <= self.max_entries:
+            return
+        self._count -= self._db.execute(
+            "DELETE FROM responses WHERE key IN (SELECT key FROM responses ORDER BY used LIMIT ?)",
+            (self._count - self.max_entries,),
+        ).rowcount
+
+    def clear(self) -> None:
+        self._db.execute("DELETE FROM responses")
+        self._count = 0
+
+    def close(self) -> None:
+        self._db.close()
@@ -0,0 +1,87 @@
+import re
+from difflib import get_close_matches
+from functools import lru_cache
+
+# Canonical brand -> product lines and spellings seen in ranked-list answers
+DEFAULT_ALIASES = {
+    "Land Rover": ["Range Rover", "Range Rover SV", "Land Rover Range Rover"],
+    "Mercedes-Benz": [
+        "Mercedes",
+        "Mercedes-Maybach",
+        "Maybach",
+        "G-Class",
+        "G-Wagen",
+        "G-Wagon",
+        "GLS",
+        "AMG",
+    ],
+    "BMW": ["X5", "X7", "X Series", "X-Series"],
+    "Porsche": ["Cayenne"],
+    "Cadillac": ["Escalade"],
+    "Bentley": ["Bentayga"],
+    "Lexus": ["LX"],
+    "Rolls-Royce": ["Cullinan"],
+    "Aston Martin": ["DBX"],
+    "Lamborghini": ["Urus"],
+    "Audi": ["Q7", "Q8"],
+}
+
+_NOT_ALPHANUMERIC = re.compile(r"[^0-9a-z]+")
+_SEPARATORS = re.compile(r"[()/]")
+
+
+def normalize(text: str) -> str:
+    return _NOT_ALPHANUMERIC.sub(" ", text.casefold()).strip()
+
+
+class BrandCanonicalizer:
+    def __init__(
+        self,
+        aliases: dict[str, list[str]] | None = None,
+        fuzzy_cutoff: float = 0.88,
+        cache_size: int = 65536,
+    ) -> None:
+        self.fuzzy_cutoff = fuzzy_cutoff
+        self._index: dict[str, str] = {}
+        for brand, names in (aliases or DEFAULT_ALIASES).items():
+            for name in [brand] + names:
+                self._index[normalize(name)] = brand
+        self._keys = list(self._index)
+        # Longest first so "land rover range rover" beats "land rover"
+        self._prefixes = sorted(self._keys, key=len, reverse=True)
+        self._cached = lru_cache(maxsize=cache_size)(self._resolve)
+
+    def canonical(self, answer: str) -> str:
+        return self._cached(answer)
+
+    def canonicalize(self, answers: list[str]) -> list[str]:
+        seen = set()
+        result = []
+        for answer in answers:
+            brand = self.canonical(answer)
+            if brand not in seen:
+                seen.add(brand)
+                result.append(brand)
+        return result
+
+    def _resolve(self, answer: str) -> str:
+        text = answer.strip()
+        if (brand := self._match(text)) is not None:
+            return brand
+        # "Land Rover (Range Rover)", "BMW X5/X7", "Mercedes-Benz (G-Class/GLS)"
+        parts = [p.strip() for p in _SEPARATORS.split(text) if p.strip()]
+        for part in parts:
+            if (brand := self._match(part)) is not None:
+                return brand
+        # Unknown brand: drop the qualifier and keep the leading name
+        return parts[0] if parts else text
+
+    def _match(self, text: str) -> str | None:
+        key = normalize(text)
+        if key in self._index:
+            return self._index[key]
+        for prefix in self._prefixes:
+            if key.startswith(prefix + " "):
+                return self._index[prefix]
+        close = get_close_matches(key, self._keys, n=1, cutoff=self.fuzzy_cutoff)
+        return self._index[close[0]] if close else None
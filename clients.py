@@ -0,0 +1,99 @@
+import asyncio
+import importlib.util
+import weakref
+from dataclasses import dataclass
+from typing import Any, Awaitable, Callable
+
+import aiohttp
+import httpx
+
+HTTP2_AVAILABLE = importlib.util.find_spec("h2") is not None
+
+Closer = Callable[[], Awaitable[None]]
+
+
+@dataclass(frozen=True)
+class PoolLimits:
+    max_connections: int = 1000
+    max_keepalive_connections: int = 200
+    keepalive_expiry: float = 30.0
+    http2: bool = True
+
+
+def httpx_transport(limits: PoolLimits) -> httpx.AsyncHTTPTransport:
+    return httpx.AsyncHTTPTransport(
+        http2=limits.http2 and HTTP2_AVAILABLE,
+        limits=httpx.Limits(
+            max_connections=limits.max_connections,
+            max_keepalive_connections=limits.max_keepalive_connections,
+            keepalive_expiry=limits.keepalive_expiry,
+        ),
+    )
+
+
+def aiohttp_session(limits: PoolLimits) -> aiohttp.ClientSession:
+    # aiohttp speaks HTTP/1.1 only; keep-alive reuse is what saves the handshakes
+    return aiohttp.ClientSession(
+        connector=aiohttp.TCPConnector(
+            limit=limits.max_connections,
+            keepalive_timeout=limits.keepalive_expiry,
+        )
+    )
+
+
+class ClientRegistry:
+    # Process-wide home for provider HTTP clients, so every Model talking to
+    # the same endpoint shares one keep-alive pool. Connection pools belong to
+    # the event loop that opened them, so clients are kept per running loop.
+    # Models attach on creation and release when closed; the clients are
+    # closed with the last release.
+    def __init__(self, limits: PoolLimits | None = None) -> None:
+        self.limits = limits or PoolLimits()
+        self._clients: weakref.WeakKeyDictionary[
+            asyncio.AbstractEventLoop, dict[str, tuple[Any, Closer]]
+        ] = weakref.WeakKeyDictionary()
+        self._users = 0
+
+    def get(self, name: str, factory: Callable[[PoolLimits], tuple[Any, Closer]]):
+        clients = self._clients.setdefault(asyncio.get_running_loop(), {})
+        if name not in clients:
+            clients[name] = factory(self.limits)
+        return clients[name][0]
+
+    def __contains__(self, name: str) -> bool:
+        return name in self._clients.get(asyncio.get_running_loop(), {})
+
+    def attach(self) -> None:
+        self._users += 1
+
+    async def release(self) -> None:
+        self._users = max(0, self._users - 1)
+        if not self._users:
+            await self.close()
+
+    async def close(self) -> None:
+        # Clients are recreated on next use; requests still in flight on them
+        # fail, hence attach() and release() for shared use
+        clients = self._clients.pop(asyncio.get_running_loop(), {})
+        for _, close in clients.values():
+            await close()
+
+    async def __aenter__(self) -> "ClientRegistry":
+        return self
+
+    async def __aexit__(self, *exc_info) -> None:
+        await self.close()
+
+
+_registry = ClientRegistry()
+
+
+def registry() -> ClientRegistry:
+    return _registry
+
+
+def configure(limits: PoolLimits) -> ClientRegistry:
+    # pylint: disable=global-statement
+    global _registry
+    _registry = ClientRegistry(limits)
+    return _registry
@@ -0,0 +1,145 @@
+import asyncio
+import time
+from collections import deque
+from contextlib import asynccontextmanager
+from dataclasses import dataclass, field
+from typing import AsyncIterator
+
+THROTTLE_STATUSES = frozenset({429, 503})
+
+
+@dataclass
+class Permit:
+    started: float = field(default_factory=time.perf_counter)
+    status: int | None = None
+    failed: bool = False
+
+
+class AdaptiveLimiter:
+    # AIMD: grow the in-flight limit while latency and error rate stay close
+    # to their long-run averages, cut it multiplicatively on throttling.
+    # Tuning knobs plus the latency and error averages they act on.
+    # pylint: disable=too-many-instance-attributes
+    def __init__(
+        self,
+        initial_limit: int = 10,
+        min_limit: int = 1,
+        max_limit: int = 1000,
+        backoff: float = 0.7,
+        latency_tolerance: float = 2.0,
+        error_tolerance: float = 0.05,
+        window: float = 60.0,
+    ) -> None:
+        self._min_limit = min_limit
+        self._max_limit = max_limit
+        self._limit = float(min(max(initial_limit, min_limit), max_limit))
+        self._backoff = backoff
+        self._latency_tolerance = latency_tolerance
+        self._error_tolerance = error_tolerance
+        self._window = window
+        self._in_flight = 0
+        self._waiters: deque[asyncio.Future[None]] = deque()
+        self._slow_start = True
+        self._last_backoff = 0.0
+        self._short_latency: float | None = None
+        self._long_latency: float | None = None
+        self._error_rate = 0.0
+        self._completed: deque[float] = deque()
+
+    @property
+    def limit(self) -> int:
+        return int(self._limit)
+
+    @property
+    def in_flight(self) -> int:
+        return self._in_flight
+
+    @property
+    def latency(self) -> float | None:
+        # Recent successful-request latency, None until the first completes
+        return self._short_latency
+
+    @property
+    def rpm(self) -> float:
+        self._trim(time.perf_counter())
+        return len(self._completed) * 60.0 / self._window
+
+    @property
+    def error_rate(self) -> float:
+        return self._error_rate
+
+    @asynccontextmanager
+    async def slot(self) -> AsyncIterator[Permit]:
+        await self._acquire()
+        permit = Permit()
+        try:
+            yield permit
+        except Exception:
+            permit.failed = True
+            raise
+        finally:
+            self._release(permit)
+
+    async def _acquire(self) -> None:
+        if self._in_flight < self.limit and not self._waiters:
+            self._in_flight += 1
+            return
+        waiter = asyncio.get_running_loop().create_future()
+        self._waiters.append(waiter)
+        try:
+            await waiter
+        except asyncio.CancelledError:
+            # The slot may have been handed over right before cancellation
+            if waiter.done() and not waiter.cancelled():
+                self._in_flight -= 1
+                self._wake()
+            raise
+
+    def _release(self, permit: Permit) -> None:
+        now = time.perf_counter()
+        self._in_flight -= 1
+        self._completed.append(now)
+        self._trim(now)
+        if permit.status in THROTTLE_STATUSES:
+            self._on_throttle(permit, now)
+        else:
+            self._on_complete(now - permit.started, permit.failed)
+        self._wake()
+
+    def _wake(self) -> None:
+        while self._waiters and self._in_flight < self.limit:
+            waiter = self._waiters.popleft()
+            if waiter.done():
+                continue
+            self._in_flight += 1
+            waiter.set_result(None)
+
+    def _trim(self, now: float) -> None:
+        while self._completed and self._completed[0] < now - self._window:
+            self._completed.popleft()
+
+    def _on_throttle(self, permit: Permit, now: float) -> None:
+        self._error_rate = 0.95 * self._error_rate + 0.05
+        # Requests sent before the last backoff belong to the same burst
+        if permit.started < self._last_backoff:
+            return
+        self._slow_start = False
+        self._last_backoff = now
+        self._limit = max(float(self._min_limit), self._limit * self._backoff)
+
+    def _on_complete(self, latency: float, failed: bool) -> None:
+        self._error_rate = 0.95 * self._error_rate + (0.05 if failed else 0.0)
+        if failed:
+            return
+        if self._short_latency is None or self._long_latency is None:
+            self._short_latency = self._long_latency = latency
+        else:
+            self._short_latency = 0.9 * self._short_latency + 0.1 * latency
+            self._long_latency = 0.99 * self._long_latency + 0.01 * latency
+        if (
+            self._error_rate > self._error_tolerance
+            or self._short_latency > self._latency_tolerance * self._long_latency
+        ):
+            return
+        increase = 1.0 if self._slow_start else 1.0 / self._limit
+        self._limit = min(float(self._max_limit), self._limit + increase)
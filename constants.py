@@ -14,3 +14,11 @@ EMPTY_ANSWER = LLM.SimpleResponse(
 
 class Choices(BaseModel):
     choices: dict[str, int]
+
+
+# Generated once; pydantic rebuilds the schema on every call
+CHOICES_SCHEMA = Choices.model_json_schema()
+
+# Alternatives requested per generated token on plain-text replies, enough to
+# cover every option of a pairwise choice
+TOP_LOGPROBS = 5
@@ -0,0 +1,261 @@
+import asyncio
+import time
+from dataclasses import asdict, replace
+from typing import TYPE_CHECKING, Any, AsyncIterator, Awaitable, Callable
+
+from cache import ResponseCache
+from concurrency import AdaptiveLimiter
+from ledger import CostLedger, Price, ledger as default_ledger
+from rate_limit import Quota, QuotaLimiter
+from streaming import StreamDecoder
+from telemetry import Telemetry, telemetry as default_telemetry
+
+if TYPE_CHECKING:
+    from llm_call import LLM
+
+
+class DispatchMixin:
+    # Sends provider requests through the response cache, the RPM/TPM quota
+    # and the adaptive concurrency limiter, and bills them to the ledger
+    def __init__(
+        self,
+        limiter: AdaptiveLimiter | None = None,
+        quota: Quota | None = None,
+        cache: ResponseCache | None = None,
+        ledger: CostLedger | None = None,
+        telemetry: Telemetry | None = None,
+        stream: bool = False,
+        **kwargs: Any,
+    ) -> None:
+        super().__init__(**kwargs)
+        self._limiter = limiter or AdaptiveLimiter(
+            initial_limit=max(1, self.max_parallelism // 10),
+            max_limit=self.max_parallelism,
+        )
+        self._quota = QuotaLimiter(quota or self.default_quota)
+        self._cache = cache
+        self._ledger = ledger or default_ledger()
+        self._telemetry = telemetry or default_telemetry()
+        self._stream = stream
+
+    @property
+    def max_parallelism(self) -> int:
+        return 1
+
+    @property
+    def limiter(self) -> AdaptiveLimiter:
+        return self._limiter
+
+    @property
+    def parallelism(self) -> int:
+        return self._limiter.limit
+
+    @property
+    def observed_rpm(self) -> float:
+        return self._limiter.rpm
+
+    @property
+    def default_quota(self) -> Quota:
+        return Quota()
+
+    @property
+    def quota(self) -> Quota:
+        return self._quota.quota
+
+    def split_limits(self, shares: int) -> None:
+        # For one of `shares` processes running this model, so that together
+        # they stay within its quota and concurrency; call before any request
+        self._quota = QuotaLimiter(self.quota.split(shares))
+        max_limit = max(1, self.max_parallelism // shares)
+        self._limiter = AdaptiveLimiter(
+            initial_limit=max(1, max_limit // 10), max_limit=max_limit
+        )
+
+    def admission_delay(self, tokens: int) -> float:
+        # Pools waiting to be flushed are requests about to be admitted
+        return self._quota.delay(tokens, self._pending_pools)
+
+    @property
+    def cache(self) -> ResponseCache | None:
+        return self._cache
+
+    @property
+    def price(self) -> Price:
+        return Price()
+
+    @property
+    def ledger(self) -> CostLedger:
+        return self._ledger
+
+    @property
+    def telemetry(self) -> Telemetry:
+        return self._telemetry
+
+    def cache_key(
+        self,
+        system_prompt: str,
+        question: str,
+        temperature: float | None,
+        schema: Any,
+        samples: int = 1,
+        until: Callable[[], StreamDecoder] | None = None,
+    ) -> str | None:
+        # Keyed requests are coalesced while in flight, so deterministic ones
+        # get a key even without a cache
+        if self._cache is None and temperature != 0:
+            return None
+        if self._cache is not None and self._cache.bypass(temperature):
+            return None
+        if until is not None:
+            schema = [schema, until().tag]
+        return ResponseCache.key(
+            self.computed_model_name,
+            system_prompt,
+            question,
+            temperature,
+            schema,
+            samples,
+        )
+
+    async def dispatch(
+        self,
+        send: Callable[[], Awaitable[list["LLM.SimpleResponse"]]],
+        estimated_tokens: int = 0,
+        key: str | None = None,
+    ) -> list["LLM.SimpleResponse"]:
+        return await self.coalesced(
+            key, lambda: self.send_request(send, estimated_tokens, key)
+        )
+
+    async def send_request(
+        self,
+        send: Callable[[], Awaitable[list["LLM.SimpleResponse"]]],
+        estimated_tokens: int = 0,
+        key: str | None = None,
+    ) -> list["LLM.SimpleResponse"]:
+        model = self.computed_model_name
+        if key is not None and self._cache is not None:
+            if (cached := self._cache.get(key)) is not None:
+                self._telemetry.count("llm_cache_hits_total", model=model)
+                # Nothing was spent on a hit, so callers must not bill it
+                return [
+                    replace(
+                        self.SimpleResponse(**r),
+                        input_tokens=0,
+                        output_tokens=0,
+                        cached_tokens=0,
+                    )
+                    for r in cached
+                ]
+
+        await self._quota.admit(estimated_tokens)
+        async with self._limiter.slot() as permit:
+            with self._telemetry.span("llm.send", model=model):
+                try:
+                    result = await send()
+                except asyncio.CancelledError:
+                    self._quota.settle(estimated_tokens, 0)
+                    raise
+                except Exception as exc:
+                    permit.status = self.error_status(exc)
+                    self._quota.settle(estimated_tokens, 0)
+                    self._telemetry.count(
+                        "llm_requests_total",
+                        model=model,
+                        status=str(permit.status or "error"),
+                    )
+                    raise
+        self._telemetry.observe(
+            "llm_request_seconds", time.perf_counter() - permit.started, model=model
+        )
+        self._telemetry.count("llm_requests_total", model=model, status="ok")
+        if empty := sum(1 for r in result if not r.answer):
+            self._telemetry.count(
+                "llm_empty_answers_total", empty, model=model, kind="response"
+            )
+        if reported := self.reported_tokens(result):
+            self._quota.settle(estimated_tokens, reported)
+        self._ledger.record(
+            self.computed_model_name,
+            self.price,
+            sum(r.input_tokens or 0 for r in result),
+            sum(r.output_tokens or 0 for r in result),
+            cached_tokens=sum(r.cached_tokens for r in result),
+        )
+
+        if key is not None and self._cache is not None and result:
+            self._cache.put(key, [asdict(r) for r in result])
+        return result
+
+    @property
+    def streaming(self) -> bool:
+        return self._stream
+
+    def streamed(
+        self,
+        chunks: Callable[[], AsyncIterator["LLM.SimpleResponse"]],
+        until: Callable[[], StreamDecoder],
+        system_prompt: str,
+        question: str,
+    ) -> Callable[[], Awaitable[list["LLM.SimpleResponse"]]]:
+        # Builds a dispatch send() over a provider stream. Chunks carry the
+        # new text plus the probability and token counts so far; the stream
+        # is closed as soon as the decoder is satisfied.
+        async def send() -> list["LLM.SimpleResponse"]:
+            decoder = until()
+            probability = alternatives = None
+            input_tokens = output_tokens = cached_tokens = 0
+            cut = False
+            stream = chunks()
+            try:
+                async for chunk in stream:
+                    if chunk.probability is not None:
+                        probability = chunk.probability
+                    alternatives = alternatives or chunk.alternatives
+                    input_tokens = max(input_tokens, chunk.input_tokens or 0)
+                    output_tokens = max(output_tokens, chunk.output_tokens or 0)
+                    cached_tokens = max(cached_tokens, chunk.cached_tokens)
+                    if decoder.feed(chunk.answer):
+                        cut = True
+                        break
+            finally:
+                await stream.aclose()
+            answer = decoder.text()
+            if cut:
+                self._telemetry.count(
+                    "llm_stream_cuts_total", model=self.computed_model_name
+                )
+                # Usage usually arrives with the last chunk, which a cut
+                # stream never sees
+                input_tokens = input_tokens or self.estimate_input_tokens(
+                    system_prompt, question
+                )
+                output_tokens = output_tokens or len(answer) // 4 + 1
+            return [
+                self.SimpleResponse(
+                    answer=answer,
+                    probability=probability,
+                    input_tokens=input_tokens,
+                    output_tokens=output_tokens,
+                    cached_tokens=cached_tokens,
+                    alternatives=alternatives,
+                )
+            ]
+
+        return send
+
+    @staticmethod
+    def estimate_tokens(system_prompt: str, question: str, is_json: bool) -> int:
+        # Plus a typical reply
+        return DispatchMixin.estimate_input_tokens(system_prompt, question) + (
+            64 if is_json else 8
+        )
+
+    @staticmethod
+    def estimate_input_tokens(system_prompt: str, question: str) -> int:
+        # Roughly 4 characters per token
+        return (len(system_prompt) + len(question)) // 4
+
+    @staticmethod
+    def reported_tokens(result: list["LLM.SimpleResponse"]) -> int:
+        return sum((r.input_tokens or 0) + (r.output_tokens or 0) for r in result)
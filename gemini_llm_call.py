@@ -1,5 +1,7 @@
 import math
-from typing import Any
+import os
+from dataclasses import replace
+from typing import Any, AsyncIterator, Callable
 
 from dotenv import load_dotenv
 from google import genai
@@ -10,23 +12,57 @@ from constants import (
     EMPTY_ANSWER,
     EMPTY_LIST,
     NEW_RANKED_LIST_SYS_PROMPT,
-    Choices,
+    CHOICES_SCHEMA,
+    TOP_LOGPROBS,
 )
+from batch_api import (
+    BATCH_FAILED,
+    BATCH_RUNNING,
+    BATCH_SUCCEEDED,
+    BatchBackend,
+    BatchRequest,
+    read_jsonl,
+    write_jsonl,
+)
+from clients import Closer, PoolLimits, httpx_transport
+from ledger import Price
 from llm_call import LLM
+from rate_limit import Quota
+from retry import CircuitOpenError, parse_retry_after
+from streaming import ChoicesDecoder, StreamDecoder, WordDecoder
 
 
 SUPPORTED_MODEL = "gemini-2.5-flash"
 
+# Project quota tier; override per deployment with Model(quota=...)
+QUOTAS = {
+    SUPPORTED_MODEL: Quota(rpm=40000, tpm=8_000_000),
+}
+
+# Published list prices, USD per million tokens
+PRICES = {
+    SUPPORTED_MODEL: Price(
+        input_per_million=0.30,
+        output_per_million=2.50,
+        cached_input_per_million=0.03,
+    ),
+}
+
 load_dotenv()
 
 
 class Model(LLM):
-    def __init__(self) -> None:
-        self.__client = genai.Client(
-            http_options=types.HttpOptions(
-                api_version="v1",
-                retry_options=types.HttpRetryOptions(attempts=10),
-            )
+    # Overrides the provider hooks of the LLM interface
+    # pylint: disable=too-many-public-methods
+    @property
+    def __client(self) -> genai.Client:
+        return self.clients.get("gemini", lambda limits: pooled_client(limits, "v1"))
+
+    @property
+    def __beta_client(self) -> genai.Client:
+        # The batch endpoints are only served by v1beta
+        return self.clients.get(
+            "gemini-v1beta", lambda limits: pooled_client(limits, "v1beta")
         )
 
     @property
@@ -34,9 +70,29 @@ class Model(LLM):
         return SUPPORTED_MODEL
 
     @property
-    def parallelism(self) -> int:
+    def max_parallelism(self) -> int:
         return 25000
 
+    @property
+    def default_quota(self) -> Quota:
+        return QUOTAS.get(self.computed_model_name, Quota())
+
+    @property
+    def price(self) -> Price:
+        return PRICES.get(self.computed_model_name, Price())
+
+    @property
+    def max_samples_per_request(self) -> int:
+        return 8
+
+    @property
+    def choice_system_prompt(self) -> str:
+        return CHOICE_SYS_PROMPT
+
+    @property
+    def ranked_list_system_prompt(self) -> str:
+        return NEW_RANKED_LIST_SYS_PROMPT
+
     async def ask_for_list(
         self,
         choices: int,
@@ -47,41 +103,62 @@ class Model(LLM):
         # Ideally, some logic here to determine ranked vs open list
         # and call accordingly
         result = await self.ask_for_ranked_list(
-            NEW_RANKED_LIST_SYS_PROMPT, question, temperature
+            NEW_RANKED_LIST_SYS_PROMPT,
+            question,
+            temperature,
+            (lambda: ChoicesDecoder(choices)) if self.streaming else None,
         )
-        if len(result.answers) > choices:
-            print(
-                f'Ignoring extra {len(result.answers) - choices} choices in Gemini: {",".join(result.answers)}'
-            )
-            result.answers = result.answers[:choices]
+        result.answers = self.truncate(result.answers, choices)
         return result
 
     async def conversation(
         self, questions: list[str], temperature: float | None
     ) -> LLM.Conversation:
-        chat = self.__client.aio.chats.create(
-            model=SUPPORTED_MODEL,
-            config=types.GenerateContentConfig(
-                temperature=temperature,
-            ),
+        return await self.converse(questions, temperature)
+
+    async def ask_with_history(
+        self,
+        system_prompt: str,
+        history: list[LLM.Conversation.Answer],
+        question: str,
+        temperature: float | None,
+    ) -> list[LLM.SimpleResponse]:
+        # Turns are replayed in the same order every time, so each request
+        # extends the previous one's prefix and hits Gemini's implicit cache
+        contents = []
+        for turn in history:
+            contents.append(
+                types.Content(role="user", parts=[types.Part(text=turn.question)])
+            )
+            contents.append(
+                types.Content(
+                    role="model", parts=[types.Part(text=a) for a in turn.answers]
+                )
+            )
+        contents.append(types.Content(role="user", parts=[types.Part(text=question)]))
+        config = types.GenerateContentConfig(
+            system_instruction=system_prompt or None,
+            temperature=temperature,
         )
-        conversation = LLM.Conversation()
+
+        async def send() -> list[LLM.SimpleResponse]:
+            response = await self.__client.aio.models.generate_content(
+                model=self.computed_model_name,
+                contents=contents,
+                config=config,
+            )
+            return self.simple_responses(response)
+
         try:
-            for i, q in enumerate(questions):
-                response = await chat.send_message(q)
-                answer = conversation.Answer(
-                    ordinal=i,
-                    question=q,
-                    answers=[part.text for part in response.parts],
-                    input_tokens=response.usage_metadata.prompt_token_count,
-                    output_tokens=response.usage_metadata.candidates_token_count,
-                )
-                conversation.add(answer)
+            return await self.dispatch(
+                send,
+                self.estimate_tokens(
+                    system_prompt, self.history_text(history, question), False
+                ),
+            )
         except errors.APIError as exc:
-            print("Error in Gemini chat:", exc)
-            return LLM.Conversation()
-
-        return conversation
+            self.record_error(exc)
+            return []
 
     async def ask_generic_question(
         self,
@@ -89,43 +166,146 @@ class Model(LLM):
         question: str,
         temperature: float,
         is_json: bool,
+        until: Callable[[], StreamDecoder] | None = None,
     ) -> LLM.SimpleResponse:
-        logprobs = 1 if not is_json else 0
+        if until is None:
+            responses = await self.pooled_samples(
+                system_prompt, question, temperature, is_json
+            )
+        else:
+            responses = await self.__ask_streaming(
+                system_prompt, question, temperature, is_json, until
+            )
+        return responses[0] if responses else EMPTY_ANSWER
+
+    async def __ask_streaming(
+        self,
+        system_prompt: str,
+        question: str,
+        temperature: float,
+        is_json: bool,
+        until: Callable[[], StreamDecoder],
+    ) -> list[LLM.SimpleResponse]:
+        config = self.__config(system_prompt, temperature, is_json, 1)
+
+        async def chunks() -> AsyncIterator[LLM.SimpleResponse]:
+            stream = await self.__client.aio.models.generate_content_stream(
+                model=self.computed_model_name,
+                contents=question,
+                config=config,
+            )
+            first = True
+            try:
+                async for response in stream:
+                    for chunk in self.simple_responses(response)[:1]:
+                        # The reported probability is the first token's
+                        yield chunk if first else replace(chunk, probability=None)
+                        first = False
+            finally:
+                await stream.aclose()
+
         try:
-            if not is_json:
-                response = await self.__client.aio.models.generate_content(
-                    model=self.computed_model_name,
-                    contents=question,
-                    config=types.GenerateContentConfig(
-                        system_instruction=system_prompt,
-                        temperature=temperature,
-                        response_logprobs=self.has_logprob,
-                        logprobs=logprobs,
-                        response_mime_type="text/plain",
-                    ),
-                )
-            else:
-                response = await self.__client.aio.models.generate_content(
-                    model=self.computed_model_name,
-                    contents=question,
-                    config=types.GenerateContentConfig(
-                        system_instruction=system_prompt,
-                        temperature=temperature,
-                        response_logprobs=self.has_logprob,
-                        logprobs=logprobs,
-                        response_mime_type="application/json",
-                        response_json_schema=Choices.model_json_schema(),
-                    ),
-                )
-            return LLM.SimpleResponse(
-                answer=response.text,
-                probability=self.extract_logprobs(response),
-                input_tokens=response.usage_metadata.prompt_token_count,
-                output_tokens=response.usage_metadata.candidates_token_count,
+            return await self.dispatch_with_retries(
+                self.streamed(chunks, until, system_prompt, question),
+                self.estimate_tokens(system_prompt, question, is_json),
+                self.cache_key(
+                    system_prompt,
+                    question,
+                    temperature,
+                    config.response_json_schema,
+                    until=until,
+                ),
             )
-        except errors.APIError as exc:
-            print(f"Error in Gemini: {exc}")
-            return EMPTY_ANSWER
+        except (errors.APIError, CircuitOpenError, TimeoutError) as exc:
+            self.record_error(exc)
+            return []
+
+    async def ask_generic_question_samples(
+        self,
+        system_prompt: str,
+        question: str,
+        temperature: float,
+        is_json: bool,
+        samples: int,
+    ) -> list[LLM.SimpleResponse]:
+        config = self.__config(system_prompt, temperature, is_json, samples)
+
+        async def send() -> list[LLM.SimpleResponse]:
+            response = await self.__client.aio.models.generate_content(
+                model=self.computed_model_name,
+                contents=question,
+                config=config,
+            )
+            return self.simple_responses(response)
+
+        try:
+            return await self.dispatch_with_retries(
+                send,
+                samples * self.estimate_tokens(system_prompt, question, is_json),
+                self.cache_key(
+                    system_prompt,
+                    question,
+                    temperature,
+                    config.response_json_schema,
+                    samples,
+                ),
+            )
+        except (errors.APIError, CircuitOpenError, TimeoutError) as exc:
+            self.record_error(exc)
+            return []
+
+    def __config(
+        self, system_prompt: str, temperature: float, is_json: bool, samples: int
+    ) -> types.GenerateContentConfig:
+        logprobs = TOP_LOGPROBS if not is_json else 0
+        if not is_json:
+            return types.GenerateContentConfig(
+                system_instruction=system_prompt,
+                temperature=temperature,
+                candidate_count=samples,
+                response_logprobs=self.has_logprob,
+                logprobs=logprobs,
+                response_mime_type="text/plain",
+            )
+        return types.GenerateContentConfig(
+            system_instruction=system_prompt,
+            temperature=temperature,
+            candidate_count=samples,
+            response_logprobs=self.has_logprob,
+            logprobs=logprobs,
+            response_mime_type="application/json",
+            response_json_schema=CHOICES_SCHEMA,
+        )
+
+    @property
+    def has_batch_api(self) -> bool:
+        return True
+
+    def create_batch_backend(self) -> BatchBackend:
+        return Batches(self.__beta_client, self.computed_model_name)
+
+    def batch_line(self, request: BatchRequest) -> dict:
+        config = self.__config(
+            request.system_prompt, request.temperature, request.is_json, 1
+        )
+        return {
+            "key": request.id,
+            "request": {
+                "contents": [{"role": "user", "parts": [{"text": request.question}]}],
+                "system_instruction": {"parts": [{"text": request.system_prompt}]},
+                "generation_config": config.model_dump(
+                    mode="json", exclude_none=True, exclude={"system_instruction"}
+                ),
+            },
+        }
+
+    def parse_batch_line(self, line: dict) -> tuple[str, LLM.SimpleResponse]:
+        if "response" not in line:
+            return line["key"], EMPTY_ANSWER
+        responses = self.simple_responses(
+            types.GenerateContentResponse.model_validate(line["response"])
+        )
+        return line["key"], responses[0] if responses else EMPTY_ANSWER
 
     async def ask_for_open_list(
         self, system_prompt: str, question: str, temperature: float
@@ -138,20 +318,24 @@ class Model(LLM):
 
     # pylint: disable=broad-exception-caught
     async def ask_for_ranked_list(
-        self, system_prompt: str, question: str, temperature: float
+        self,
+        system_prompt: str,
+        question: str,
+        temperature: float,
+        until: Callable[[], StreamDecoder] | None = None,
     ) -> LLM.Response:
         result = await self.ask_generic_question(
-            system_prompt, question, temperature, is_json=True
+            system_prompt, question, temperature, True, until
         )
         try:
-            answers = self.parse_json_ranked_list(result.answer)
+            answers = self.ranked_list_answers(result.answer)
             return self.Response(
                 answers=answers,
                 input_tokens=result.input_tokens,
                 output_tokens=result.output_tokens,
             )
         except Exception as ex:
-            print("Error when parsing json response:", ex)
+            self.record_parse_failure(result.answer, ex)
             return EMPTY_LIST
 
     async def choice_from_pair(
@@ -165,7 +349,11 @@ class Model(LLM):
             system_prompt = CHOICE_SYS_PROMPT
 
         result = await self.ask_generic_question(
-            system_prompt, question, temperature, False
+            system_prompt,
+            question,
+            temperature,
+            False,
+            WordDecoder if self.streaming else None,
         )
         return LLM.Choice(
             answer=self.clean_reply(result.answer),
@@ -174,40 +362,132 @@ class Model(LLM):
             output_tokens=result.output_tokens,
         )
 
-    async def ask_generic_question_with_retries(
-        self,
-        system_prompt: str,
-        question: str,
-        temperature: float,
-        is_json: bool,
-        max_retries: int = 10,
-    ) -> LLM.SimpleResponse:
-        # Gemini SDK supports retry_options in config
-        # We can set retry limits at the client level
-        pass
+    def known_models(self) -> set[str]:
+        return {SUPPORTED_MODEL}
+
+    def report_models(self) -> list[str]:
+        return [SUPPORTED_MODEL]
 
     @staticmethod
-    def known_models() -> set[str]:
-        return {SUPPORTED_MODEL}
+    def error_status(exc: Exception) -> int | None:
+        if isinstance(exc, errors.APIError):
+            return exc.code
+        return None
 
     @staticmethod
-    def report_models() -> list[str]:
-        return [SUPPORTED_MODEL]
+    def retry_after(exc: Exception) -> float | None:
+        headers = getattr(getattr(exc, "response", None), "headers", None)
+        return parse_retry_after(headers.get("retry-after")) if headers else None
+
+    @staticmethod
+    def simple_responses(response: Any) -> list[LLM.SimpleResponse]:
+        # Usage is reported per request, so it is booked on the first sample.
+        # Stream chunks may come without it.
+        usage = response.usage_metadata
+        return [
+            LLM.SimpleResponse(
+                answer="".join(
+                    part.text for part in candidate.content.parts if part.text
+                ),
+                probability=Model.candidate_logprobs(candidate),
+                alternatives=Model.candidate_alternatives(candidate),
+                input_tokens=usage.prompt_token_count if usage and i == 0 else 0,
+                output_tokens=(usage.candidates_token_count if usage and i == 0 else 0),
+                # Prefix tokens served from Gemini's implicit cache
+                cached_tokens=(
+                    (usage.cached_content_token_count or 0) if usage and i == 0 else 0
+                ),
+            )
+            for i, candidate in enumerate(response.candidates or [])
+            if candidate.content and candidate.content.parts
+        ]
 
     @staticmethod
     def extract_logprobs(completion: Any) -> float | None:
+        if completion and completion.candidates:
+            return Model.candidate_logprobs(completion.candidates[0])
+        return None
+
+    @staticmethod
+    def candidate_logprobs(candidate: Any) -> float | None:
         if (
-            completion
-            and completion.candidates
-            and completion.candidates[0].logprobs_result
-            and completion.candidates[0].logprobs_result.chosen_candidates
-            and completion.candidates[0]
-            .logprobs_result.chosen_candidates[0]
-            .log_probability
+            candidate
+            and candidate.logprobs_result
+            and candidate.logprobs_result.chosen_candidates
+            and candidate.logprobs_result.chosen_candidates[0].log_probability
         ):
             return math.exp(
-                completion.candidates[0]
-                .logprobs_result.chosen_candidates[0]
-                .log_probability
+                candidate.logprobs_result.chosen_candidates[0].log_probability
             )
         return None
+
+    @staticmethod
+    def candidate_alternatives(candidate: Any) -> dict[str, float] | None:
+        if (
+            candidate
+            and candidate.logprobs_result
+            and candidate.logprobs_result.top_candidates
+            and candidate.logprobs_result.top_candidates[0].candidates
+        ):
+            return {
+                alternative.token: math.exp(alternative.log_probability)
+                for alternative in candidate.logprobs_result.top_candidates[
+                    0
+                ].candidates
+                if alternative.token is not None
+                and alternative.log_probability is not None
+            }
+        return None
+
+
+def pooled_client(limits: PoolLimits, api_version: str) -> tuple[genai.Client, Closer]:
+    # A custom transport makes the SDK use httpx (HTTP/2 capable) over aiohttp
+    transport = httpx_transport(limits)
+    client = genai.Client(
+        http_options=types.HttpOptions(
+            api_version=api_version,
+            async_client_args={"transport": transport},
+        )
+    )
+    return client, transport.aclose
+
+
+class Batches(BatchBackend):
+    def __init__(self, client: genai.Client, model: str) -> None:
+        self.__client = client
+        self.__model = model
+
+    async def submit(self, lines: list[dict]) -> str:
+        path = write_jsonl(lines)
+        try:
+            uploaded = await self.__client.aio.files.upload(
+                file=path, config=types.UploadFileConfig(mime_type="jsonl")
+            )
+        finally:
+            os.remove(path)
+        job = await self.__client.aio.batches.create(
+            model=self.__model, src=uploaded.name
+        )
+        return job.name
+
+    async def poll(self, job_id: str) -> str:
+        job = await self.__client.aio.batches.get(name=job_id)
+        match job.state:
+            case (
+                types.JobState.JOB_STATE_SUCCEEDED
+                | types.JobState.JOB_STATE_PARTIALLY_SUCCEEDED
+            ):
+                return BATCH_SUCCEEDED
+            case (
+                types.JobState.JOB_STATE_FAILED
+                | types.JobState.JOB_STATE_CANCELLED
+                | types.JobState.JOB_STATE_EXPIRED
+            ):
+                return BATCH_FAILED
+            case _:
+                return BATCH_RUNNING
+
+    async def results(self, job_id: str) -> list[dict]:
+        job = await self.__client.aio.batches.get(name=job_id)
+        content = await self.__client.aio.files.download(file=job.dest.file_name)
+        return read_jsonl(content.decode("utf-8"))
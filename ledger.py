@@ -0,0 +1,200 @@
+import functools
+from contextlib import contextmanager
+from contextvars import ContextVar
+from dataclasses import asdict, dataclass
+from typing import Any, Awaitable, Callable, Iterator
+
+UNTAGGED = "-"
+
+_method: ContextVar[str] = ContextVar("ledger_method", default=UNTAGGED)
+_job: ContextVar[str] = ContextVar("ledger_job", default=UNTAGGED)
+
+
+@dataclass(frozen=True)
+class Price:
+    # USD per million tokens
+    input_per_million: float = 0.0
+    output_per_million: float = 0.0
+    # Batch endpoints bill at a discount on both providers
+    batch_multiplier: float = 0.5
+    # Input tokens served from a context cache; None bills them as input
+    cached_input_per_million: float | None = None
+
+    def cost(
+        self,
+        input_tokens: int,
+        output_tokens: int,
+        batch: bool = False,
+        cached_tokens: int = 0,
+    ) -> float:
+        cached_price = (
+            self.input_per_million
+            if self.cached_input_per_million is None
+            else self.cached_input_per_million
+        )
+        cost = (
+            (input_tokens - cached_tokens) * self.input_per_million
+            + cached_tokens * cached_price
+            + output_tokens * self.output_per_million
+        ) / 1_000_000
+        return cost * self.batch_multiplier if batch else cost
+
+
+@dataclass
+class Usage:
+    requests: int = 0
+    input_tokens: int = 0
+    output_tokens: int = 0
+    cost: float = 0.0
+    # Subset of input_tokens served from a context cache
+    cached_tokens: int = 0
+
+    def merge(self, other: "Usage") -> None:
+        self.requests += other.requests
+        self.input_tokens += other.input_tokens
+        self.output_tokens += other.output_tokens
+        self.cost += other.cost
+        self.cached_tokens += other.cached_tokens
+
+    @property
+    def tokens(self) -> int:
+        return self.input_tokens + self.output_tokens
+
+
+@contextmanager
+def tagged(method: str | None = None, job: str | None = None) -> Iterator[None]:
+    # Tags follow the asyncio task context, so concurrent jobs stay separate
+    tokens = [
+        (var, var.set(value))
+        for var, value in ((_method, method), (_job, job))
+        if value is not None
+    ]
+    try:
+        yield
+    finally:
+        for var, token in reversed(tokens):
+            var.reset(token)
+
+
+def tags() -> tuple[str, str]:
+    return _method.get(), _job.get()
+
+
+@contextmanager
+def booked(method: str) -> Iterator[None]:
+    # Tags with `method` unless an outer call or tagged() already named one
+    with tagged(method=method if _method.get() == UNTAGGED else None):
+        yield
+
+
+def booked_as(
+    method: str,
+) -> Callable[[Callable[..., Awaitable[Any]]], Callable[..., Awaitable[Any]]]:
+    # For public model methods, so their requests are booked under `method`
+    def decorate(func: Callable[..., Awaitable[Any]]) -> Callable[..., Awaitable[Any]]:
+        @functools.wraps(func)
+        async def wrapper(*args: Any, **kwargs: Any) -> Any:
+            with booked(method):
+                return await func(*args, **kwargs)
+
+        return wrapper
+
+    return decorate
+
+
+class CostLedger:
+    DIMENSIONS = ("model", "method", "job")
+
+    def __init__(self) -> None:
+        self._entries: dict[tuple[str, str, str], Usage] = {}
+
+    def record(
+        self,
+        model: str,
+        price: Price,
+        input_tokens: int,
+        output_tokens: int,
+        requests: int = 1,
+        batch: bool = False,
+        cached_tokens: int = 0,
+    ) -> None:
+        key = (model, *tags())
+        usage = self._entries.setdefault(key, Usage())
+        usage.merge(
+            Usage(
+                requests=requests,
+                input_tokens=input_tokens,
+                output_tokens=output_tokens,
+                cost=price.cost(input_tokens, output_tokens, batch, cached_tokens),
+                cached_tokens=cached_tokens,
+            )
+        )
+
+    def total(
+        self,
+        model: str | None = None,
+        method: str | None = None,
+        job: str | None = None,
+    ) -> Usage:
+        total = Usage()
+        for key, usage in self._entries.items():
+            if all(v is None or v == k for k, v in zip(key, (model, method, job))):
+                total.merge(usage)
+        return total
+
+    def by(self, dimension: str) -> dict[str, Usage]:
+        i = self.DIMENSIONS.index(dimension)
+        totals: dict[str, Usage] = {}
+        for key, usage in self._entries.items():
+            totals.setdefault(key[i], Usage()).merge(usage)
+        return totals
+
+    def rows(self) -> list[list]:
+        return [
+            list(key)
+            + [
+                usage.requests,
+                usage.input_tokens,
+                usage.cached_tokens,
+                usage.output_tokens,
+                usage.cost,
+            ]
+            for key, usage in sorted(self._entries.items())
+        ]
+
+    def entries(self) -> Iterator[tuple[tuple[str, str, str], Usage]]:
+        yield from self._entries.items()
+
+    def add(self, key: tuple[str, str, str], usage: Usage) -> None:
+        # Books usage recorded elsewhere, e.g. by another process
+        self._entries.setdefault(key, Usage()).merge(usage)
+
+    def merge(self, other: "CostLedger") -> None:
+        for key, usage in other.entries():
+            self.add(key, usage)
+
+    def clear(self) -> None:
+        self._entries.clear()
+
+    def to_dict(self) -> dict:
+        return {
+            "entries": [
+                list(key) + [asdict(usage)] for key, usage in self._entries.items()
+            ]
+        }
+
+    @staticmethod
+    def from_dict(data: dict) -> "CostLedger":
+        restored = CostLedger()
+        for model, method, job, usage in data["entries"]:
+            restored.add((model, method, job), Usage(**usage))
+        return restored
+
+
+ROW_HEADERS = ["Model", "Method", "Job", "Requests", "Input", "Cached", "Output", "USD"]
+
+_ledger = CostLedger()
+
+
+def ledger() -> CostLedger:
+    return _ledger
@@ -1,23 +1,108 @@
-import json
-from abc import ABC, abstractmethod
+import asyncio
+import random
+from abc import ABCMeta, abstractmethod
 from dataclasses import dataclass, field
 from math import sqrt
-from typing import Any
+from typing import Any, Callable
 
+from batch_api import BatchBackend
+from batching import BatchingMixin
+from cache import ResponseCache
+from canonical import BrandCanonicalizer
+from clients import ClientRegistry, registry
+from concurrency import AdaptiveLimiter
+from dispatching import DispatchMixin
+from ledger import CostLedger, booked_as
+from parsing import ParsingMixin
+from pooling import PoolingMixin
+from rate_limit import Quota
+from retry import CircuitBreaker, RetryPolicy
+from retrying import RetryingMixin
+from streaming import StreamDecoder
+from telemetry import Telemetry
+
+# Public request methods and the ledger method they are booked under;
+# provider overrides are wrapped as they are defined
+LEDGER_METHODS = {
+    "choice_from_pair": "choice",
+    "choice_tally": "choice",
+    "ask_for_list": "list",
+    "ask_for_ranked_list": "ranked_list",
+    "ask_for_open_list": "open_list",
+    "ask_generic_question": "generic",
+    "ask_generic_question_samples": "generic",
+    "ask_generic_question_with_retries": "generic",
+    "conversation": "conversation",
+    "converse": "conversation",
+    "conversations": "conversation",
+    "ask_with_history": "conversation",
+}
+
+
+class LLM(
+    DispatchMixin,
+    PoolingMixin,
+    RetryingMixin,
+    BatchingMixin,
+    ParsingMixin,
+    metaclass=ABCMeta,
+):
+    def __init_subclass__(cls, **kwargs: Any) -> None:
+        super().__init_subclass__(**kwargs)
+        for name, method in LEDGER_METHODS.items():
+            if name in vars(cls):
+                setattr(cls, name, booked_as(method)(vars(cls)[name]))
+
+    def __init__(
+        self,
+        limiter: AdaptiveLimiter | None = None,
+        quota: Quota | None = None,
+        cache: ResponseCache | None = None,
+        canonicalizer: BrandCanonicalizer | None = None,
+        batch_backend: BatchBackend | None = None,
+        clients: ClientRegistry | None = None,
+        ledger: CostLedger | None = None,
+        telemetry: Telemetry | None = None,
+        retry: RetryPolicy | None = None,
+        breaker: CircuitBreaker | None = None,
+        stream: bool = False,
+    ) -> None:
+        self._clients = clients or registry()
+        self._clients.attach()
+        self._attached = True
+        super().__init__(
+            limiter=limiter,
+            quota=quota,
+            cache=cache,
+            ledger=ledger,
+            telemetry=telemetry,
+            stream=stream,
+            retry=retry,
+            breaker=breaker,
+            batch_backend=batch_backend,
+            canonicalizer=canonicalizer,
+        )
 
-class LLM(ABC):
     @dataclass
     class SimpleResponse:
         answer: str
         probability: float | None
         input_tokens: int
         output_tokens: int
+        # computed_model_name of the backend that answered, set by routers
+        model: str = ""
+        # Input tokens served from a provider context cache
+        cached_tokens: int = 0
+        # Probability of each top alternative for the first token, when the
+        # provider returns them
+        alternatives: dict[str, float] | None = None
 
     @dataclass
     class Response:
         answers: list[str]
         input_tokens: int
         output_tokens: int
+        model: str = ""
 
     @dataclass
     class Choice:
@@ -25,6 +110,60 @@ class LLM(ABC):
         probability: float
         input_tokens: int
         output_tokens: int
+        model: str = ""
+
+    @dataclass
+    class Tally:
+        counts: dict[str, int] = field(default_factory=dict[str, int])
+        probabilities: dict[str, list[float]] = field(
+            default_factory=dict[str, list[float]]
+        )
+        samples: int = 0
+        # Requests that returned answers, and all requests sent, failed or not
+        requests: int = 0
+        sent: int = 0
+        input_tokens: int = 0
+        output_tokens: int = 0
+
+        def add(self, choice: "LLM.Choice") -> None:
+            self.input_tokens += choice.input_tokens
+            self.output_tokens += choice.output_tokens
+            if not choice.answer:
+                return
+            self.samples += 1
+            self.counts[choice.answer] = self.counts.get(choice.answer, 0) + 1
+            if choice.probability is not None:
+                self.probabilities.setdefault(choice.answer, []).append(
+                    choice.probability
+                )
+
+        def merge(self, other: "LLM.Tally") -> None:
+            for answer, count in other.counts.items():
+                self.counts[answer] = self.counts.get(answer, 0) + count
+            for answer, probabilities in other.probabilities.items():
+                self.probabilities.setdefault(answer, []).extend(probabilities)
+            self.samples += other.samples
+            self.requests += other.requests
+            self.sent += other.sent
+            self.input_tokens += other.input_tokens
+            self.output_tokens += other.output_tokens
+
+        def share(self, answer: str) -> float:
+            if not self.samples:
+                return 0.0
+            return self.counts.get(answer, 0) / self.samples
+
+        def mean_probability(self, answer: str) -> float | None:
+            probabilities = self.probabilities.get(answer)
+            if not probabilities:
+                return None
+            return sum(probabilities) / len(probabilities)
+
+        def interval(self, answer: str) -> float:
+            return LLM.wald(self.share(answer), self.samples)
+
+        def ranked(self) -> list[tuple[str, int]]:
+            return sorted(self.counts.items(), key=lambda k: k[1], reverse=True)
 
     @dataclass
     class Conversation:
@@ -39,6 +178,9 @@ class LLM(ABC):
         conversation: dict[int, Answer] = field(default_factory=dict[int, Answer])
         input_tokens: int = 0
         output_tokens: int = 0
+        # False when a turn ran out of retries; earlier turns are kept
+        complete: bool = True
+        model: str = ""
 
         def add(self, answer: Answer) -> None:
             self.conversation[answer.ordinal] = answer
@@ -49,6 +191,23 @@ class LLM(ABC):
     def computed_model_name(self) -> str:
         pass
 
+    @property
+    def clients(self) -> ClientRegistry:
+        return self._clients
+
+    async def close(self) -> None:
+        # The registry is shared; it closes its clients once every model
+        # using them is closed
+        if self._attached:
+            self._attached = False
+            await self._clients.release()
+
+    async def __aenter__(self) -> "LLM":
+        return self
+
+    async def __aexit__(self, *exc_info) -> None:
+        await self.close()
+
     @abstractmethod
     async def ask_for_list(
         self,
@@ -65,6 +224,8 @@ class LLM(ABC):
     ) -> Conversation:
         pass
 
+    # With `until`, the reply is streamed and cut once the decoder has seen
+    # enough of it
     @abstractmethod
     async def ask_generic_question(
         self,
@@ -72,6 +233,7 @@ class LLM(ABC):
         question: str,
         temperature: float,
         is_json: bool,
+        until: Callable[[], StreamDecoder] | None = None,
     ) -> SimpleResponse:
         pass
 
@@ -83,19 +245,12 @@ class LLM(ABC):
 
     @abstractmethod
     async def ask_for_ranked_list(
-        self, system_prompt: str, question: str, temperature: float
-    ) -> Response:
-        pass
-
-    @abstractmethod
-    async def ask_generic_question_with_retries(
         self,
         system_prompt: str,
         question: str,
         temperature: float,
-        is_json: bool,
-        max_retries: int = 10,
-    ) -> SimpleResponse:
+        until: Callable[[], StreamDecoder] | None = None,
+    ) -> Response:
         pass
 
     @abstractmethod
@@ -108,51 +263,103 @@ class LLM(ABC):
     ) -> Choice:
         pass
 
-    @staticmethod
-    def clean_reply(text: str) -> str:
-        return text.strip(' ."1234567890\t\r\n*-:;•').strip("'")
+    @property
+    @abstractmethod
+    def choice_system_prompt(self) -> str:
+        pass
 
-    @staticmethod
-    def parse_list(text: str) -> list[str]:
-        splittered = text.split(",")
-        if len(splittered) == 1:
-            splittered = text.split("\n")
-        return [LLM.clean_reply(s) for s in splittered if len(s) > 0]
+    @property
+    @abstractmethod
+    def ranked_list_system_prompt(self) -> str:
+        pass
+
+    @abstractmethod
+    async def ask_with_history(
+        self,
+        system_prompt: str,
+        history: list[Conversation.Answer],
+        question: str,
+        temperature: float | None,
+    ) -> list[SimpleResponse]:
+        pass
+
+    @booked_as("conversation")
+    async def converse(
+        self,
+        questions: list[str],
+        temperature: float | None,
+        system_prompt: str = "",
+        retries: int = 3,
+        backoff: float = 1.0,
+    ) -> Conversation:
+        conversation = LLM.Conversation()
+        history: list[LLM.Conversation.Answer] = []
+        for i, question in enumerate(questions):
+            for attempt in range(0, retries + 1):
+                if attempt:
+                    # Throttling is handled by the limiter; this only spaces out
+                    # retries of one turn
+                    await asyncio.sleep(
+                        random.uniform(0, min(backoff * 2**attempt, 30))
+                    )
+                responses = await self.ask_with_history(
+                    system_prompt, history, question, temperature
+                )
+                if responses and responses[0].answer:
+                    break
+            else:
+                conversation.complete = False
+                return conversation
+            answer = LLM.Conversation.Answer(
+                ordinal=i,
+                question=question,
+                answers=[responses[0].answer],
+                input_tokens=responses[0].input_tokens,
+                output_tokens=responses[0].output_tokens,
+            )
+            conversation.add(answer)
+            history.append(answer)
+        return conversation
+
+    @booked_as("conversation")
+    async def conversations(
+        self,
+        batteries: list[list[str]],
+        temperature: float | None,
+        system_prompt: str = "",
+        retries: int = 3,
+        backoff: float = 1.0,
+    ) -> list[Conversation]:
+        # Sessions run concurrently; every turn still goes through dispatch, so
+        # the shared limiter and quota bound the total
+        return list(
+            await asyncio.gather(
+                *[
+                    self.converse(
+                        questions, temperature, system_prompt, retries, backoff
+                    )
+                    for questions in batteries
+                ]
+            )
+        )
 
     @staticmethod
-    def known_models() -> set[str]:
+    def history_text(history: list[Conversation.Answer], question: str) -> str:
+        return (
+            "".join(turn.question + "".join(turn.answers) for turn in history)
+            + question
+        )
+
+    def known_models(self) -> set[str]:
         return {"gpt-3.5-turbo", "gpt-4", "gemini-pro"}
 
-    @staticmethod
-    def report_models() -> list[str]:
+    def report_models(self) -> list[str]:
         return ["gpt-3.5-turbo", "gpt-4", "gemini-pro"]
 
-    @property
-    def parallelism(self) -> int:
-        return 1
-
     @property
     def has_logprob(self) -> bool:
         return True
 
-    @staticmethod
-    def parse_json_ranked_list(text: str) -> list[str]:
-        output = json.loads(text)
-        choices = list(output["choices"].items())
-        if (
-            (
-                not all(isinstance(c[0], str) for c in choices)
-                or not all(isinstance(c[1], int) for c in choices)
-            )
-            or not all(0 <= c[1] <= len(choices) for c in choices)
-            or any(c[0] in {str(i) for i in range(0, 20)} for c in choices)
-        ):
-            print(f"Ignoring answer from LLM: {text}")
-            return []
-
-        answers = [k for k, _ in sorted(choices, key=lambda k: k[1])]
-        return answers
-
     @staticmethod
     def wald(p: float, n: int) -> float:
         try:
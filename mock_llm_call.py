@@ -0,0 +1,366 @@
+import asyncio
+import json
+import math
+import random
+from dataclasses import asdict, dataclass, field
+from typing import Any, AsyncIterator, Callable
+
+from batch_api import BatchBackend, BatchRequest, LocalBatchEndpoint
+from constants import (
+    CHOICE_SYS_PROMPT,
+    EMPTY_ANSWER,
+    EMPTY_LIST,
+    NEW_RANKED_LIST_SYS_PROMPT,
+    CHOICES_SCHEMA,
+)
+from ledger import Price
+from llm_call import LLM
+from streaming import ChoicesDecoder, StreamDecoder, WordDecoder
+
+SUPPORTED_MODEL = "mock-llm"
+
+# Nominal price so cost reports can be exercised offline
+PRICES = {
+    SUPPORTED_MODEL: Price(input_per_million=0.10, output_per_million=0.40),
+}
+
+Latency = Callable[[random.Random], float]
+
+
+def constant(seconds: float) -> Latency:
+    return lambda rng: seconds
+
+
+def uniform(low: float, high: float) -> Latency:
+    return lambda rng: rng.uniform(low, high)
+
+
+def lognormal(median: float, sigma: float) -> Latency:
+    return lambda rng: rng.lognormvariate(math.log(median), sigma)
+
+
+class MockError(Exception):
+    def __init__(self, status: int) -> None:
+        super().__init__(f"Mock provider returned HTTP {status}")
+        self.status = status
+
+
+@dataclass
+class Behavior:
+    # One knob per simulated provider trait
+    # pylint: disable=too-many-instance-attributes
+    latency: Latency = field(default_factory=lambda: lognormal(0.05, 0.5))
+    error_rates: dict[int, float] = field(default_factory=dict[int, float])
+    # In-flight requests above capacity are rejected with 429
+    capacity: int | None = None
+    choices: dict[str, float] = field(
+        default_factory=lambda: {"Volvo": 0.6, "Saab": 0.4}
+    )
+    ranked_lists: list[tuple[list[str], float]] = field(
+        default_factory=lambda: [
+            (["Land Rover", "Mercedes-Benz", "BMW", "Porsche", "Audi"], 0.5),
+            (["Mercedes-Benz", "BMW", "Audi", "Porsche", "Lexus"], 0.3),
+            (["Range Rover", "Mercedes-Benz", "Cadillac", "Porsche", "Lexus"], 0.2),
+        ]
+    )
+    input_tokens: int = 40
+    choice_tokens: int = 2
+    list_tokens: int = 30
+    seed: int | None = None
+
+
+class Model(LLM):
+    # Overrides the provider hooks of the LLM interface
+    # pylint: disable=too-many-public-methods
+    def __init__(
+        self, behavior: Behavior | None = None, parallelism: int = 1000, **kwargs: Any
+    ) -> None:
+        self.behavior = behavior or Behavior()
+        self.__parallelism = parallelism
+        self.__rng = random.Random(self.behavior.seed)
+        self.__in_flight = 0
+        super().__init__(**kwargs)
+
+    @property
+    def computed_model_name(self) -> str:
+        return SUPPORTED_MODEL
+
+    @property
+    def max_parallelism(self) -> int:
+        return self.__parallelism
+
+    @property
+    def price(self) -> Price:
+        return PRICES.get(self.computed_model_name, Price())
+
+    @property
+    def max_samples_per_request(self) -> int:
+        return 8
+
+    @property
+    def choice_system_prompt(self) -> str:
+        return CHOICE_SYS_PROMPT
+
+    @property
+    def ranked_list_system_prompt(self) -> str:
+        return NEW_RANKED_LIST_SYS_PROMPT
+
+    async def ask_for_list(
+        self,
+        choices: int,
+        question: str,
+        safe_answer: str,
+        temperature: float | None,
+    ) -> LLM.Response:
+        result = await self.ask_for_ranked_list(
+            NEW_RANKED_LIST_SYS_PROMPT,
+            question,
+            temperature,
+            (lambda: ChoicesDecoder(choices)) if self.streaming else None,
+        )
+        result.answers = self.truncate(result.answers, choices)
+        return result
+
+    async def conversation(
+        self, questions: list[str], temperature: float | None
+    ) -> LLM.Conversation:
+        return await self.converse(questions, temperature)
+
+    async def ask_with_history(
+        self,
+        system_prompt: str,
+        history: list[LLM.Conversation.Answer],
+        question: str,
+        temperature: float | None,
+    ) -> list[LLM.SimpleResponse]:
+        async def send() -> list[LLM.SimpleResponse]:
+            await self.__serve()
+            return [self.__choice()]
+
+        try:
+            return await self.dispatch(
+                send,
+                self.estimate_tokens(
+                    system_prompt, self.history_text(history, question), False
+                ),
+            )
+        except MockError as exc:
+            self.record_error(exc)
+            return []
+
+    async def ask_generic_question(
+        self,
+        system_prompt: str,
+        question: str,
+        temperature: float,
+        is_json: bool,
+        until: Callable[[], StreamDecoder] | None = None,
+    ) -> LLM.SimpleResponse:
+        if until is None:
+            responses = await self.pooled_samples(
+                system_prompt, question, temperature, is_json
+            )
+        else:
+            responses = await self.__ask_streaming(
+                system_prompt, question, temperature, is_json, until
+            )
+        return responses[0] if responses else EMPTY_ANSWER
+
+    async def __ask_streaming(
+        self,
+        system_prompt: str,
+        question: str,
+        temperature: float,
+        is_json: bool,
+        until: Callable[[], StreamDecoder],
+    ) -> list[LLM.SimpleResponse]:
+        async def chunks() -> AsyncIterator[LLM.SimpleResponse]:
+            await self.__serve()
+            reply = self.__ranked_list() if is_json else self.__choice()
+            # Fixed-size pieces with usage growing in proportion, like a
+            # provider reporting running totals
+            size = 8
+            for start in range(0, len(reply.answer), size):
+                end = min(start + size, len(reply.answer))
+                yield LLM.SimpleResponse(
+                    answer=reply.answer[start:end],
+                    probability=reply.probability,
+                    alternatives=reply.alternatives,
+                    input_tokens=reply.input_tokens,
+                    output_tokens=math.ceil(
+                        reply.output_tokens * end / len(reply.answer)
+                    ),
+                )
+                await asyncio.sleep(0)
+
+        try:
+            return await self.dispatch(
+                self.streamed(chunks, until, system_prompt, question),
+                self.estimate_tokens(system_prompt, question, is_json),
+                self.cache_key(
+                    system_prompt,
+                    question,
+                    temperature,
+                    CHOICES_SCHEMA if is_json else None,
+                    until=until,
+                ),
+            )
+        except MockError as exc:
+            self.record_error(exc)
+            return []
+
+    async def ask_generic_question_samples(
+        self,
+        system_prompt: str,
+        question: str,
+        temperature: float,
+        is_json: bool,
+        samples: int,
+    ) -> list[LLM.SimpleResponse]:
+        async def send() -> list[LLM.SimpleResponse]:
+            await self.__serve()
+            return [
+                self.__ranked_list() if is_json else self.__choice()
+                for _ in range(0, samples)
+            ]
+
+        try:
+            return await self.dispatch(
+                send,
+                samples * self.estimate_tokens(system_prompt, question, is_json),
+                self.cache_key(
+                    system_prompt,
+                    question,
+                    temperature,
+                    CHOICES_SCHEMA if is_json else None,
+                    samples,
+                ),
+            )
+        except MockError as exc:
+            self.record_error(exc)
+            return []
+
+    @property
+    def has_batch_api(self) -> bool:
+        return True
+
+    def create_batch_backend(self) -> BatchBackend:
+        return LocalBatchEndpoint(self.__batch_respond)
+
+    def batch_line(self, request: BatchRequest) -> dict:
+        return asdict(request)
+
+    def parse_batch_line(self, line: dict) -> tuple[str, LLM.SimpleResponse]:
+        return line["id"], LLM.SimpleResponse(**line["response"])
+
+    async def ask_for_open_list(
+        self, system_prompt: str, question: str, temperature: float
+    ) -> LLM.Response:
+        return await self.ask_for_ranked_list(system_prompt, question, temperature)
+
+    # pylint: disable=broad-exception-caught
+    async def ask_for_ranked_list(
+        self,
+        system_prompt: str,
+        question: str,
+        temperature: float,
+        until: Callable[[], StreamDecoder] | None = None,
+    ) -> LLM.Response:
+        result = await self.ask_generic_question(
+            system_prompt, question, temperature, True, until
+        )
+        try:
+            return LLM.Response(
+                answers=self.ranked_list_answers(result.answer),
+                input_tokens=result.input_tokens,
+                output_tokens=result.output_tokens,
+            )
+        except Exception as ex:
+            self.record_parse_failure(result.answer, ex)
+            return EMPTY_LIST
+
+    async def choice_from_pair(
+        self,
+        question: str,
+        temperature: float,
+        max_iterations: int,
+        system_prompt=None,
+    ) -> LLM.Choice:
+        if not system_prompt:
+            system_prompt = CHOICE_SYS_PROMPT
+
+        result = await self.ask_generic_question(
+            system_prompt,
+            question,
+            temperature,
+            False,
+            WordDecoder if self.streaming else None,
+        )
+        return LLM.Choice(
+            answer=self.clean_reply(result.answer),
+            probability=result.probability,
+            input_tokens=result.input_tokens,
+            output_tokens=result.output_tokens,
+        )
+
+    def known_models(self) -> set[str]:
+        return {SUPPORTED_MODEL}
+
+    def report_models(self) -> list[str]:
+        return [SUPPORTED_MODEL]
+
+    @staticmethod
+    def error_status(exc: Exception) -> int | None:
+        if isinstance(exc, MockError):
+            return exc.status
+        return None
+
+    @staticmethod
+    def extract_logprobs(completion: Any) -> float | None:
+        if isinstance(completion, LLM.SimpleResponse):
+            return completion.probability
+        return None
+
+    async def __serve(self) -> None:
+        behavior = self.behavior
+        self.__in_flight += 1
+        try:
+            await asyncio.sleep(behavior.latency(self.__rng))
+            if behavior.capacity is not None and self.__in_flight > behavior.capacity:
+                raise MockError(429)
+            roll = self.__rng.random()
+            for status, rate in behavior.error_rates.items():
+                if roll < rate:
+                    raise MockError(status)
+                roll -= rate
+        finally:
+            self.__in_flight -= 1
+
+    def __choice(self) -> LLM.SimpleResponse:
+        choices = self.behavior.choices
+        answer = self.__rng.choices(list(choices), weights=list(choices.values()))[0]
+        total = sum(choices.values())
+        return LLM.SimpleResponse(
+            answer=answer,
+            probability=choices[answer] / total,
+            input_tokens=self.behavior.input_tokens,
+            output_tokens=self.behavior.choice_tokens,
+            # Every option is a single token here
+            alternatives={choice: weight / total for choice, weight in choices.items()},
+        )
+
+    def __ranked_list(self) -> LLM.SimpleResponse:
+        lists = self.behavior.ranked_lists
+        answers = self.__rng.choices(
+            [a for a, _ in lists], weights=[w for _, w in lists]
+        )[0]
+        return LLM.SimpleResponse(
+            answer=json.dumps({"choices": {a: i + 1 for i, a in enumerate(answers)}}),
+            probability=None,
+            input_tokens=self.behavior.input_tokens,
+            output_tokens=self.behavior.list_tokens,
+        )
+
+    async def __batch_respond(self, line: dict) -> dict:
+        response = self.__ranked_list() if line["is_json"] else self.__choice()
+        return {"id": line["id"], "response": asdict(response)}
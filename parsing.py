@@ -0,0 +1,86 @@
+from typing import Any
+
+from canonical import BrandCanonicalizer
+from telemetry import logger
+
+try:
+    from orjson import loads as json_loads
+
+    JSON_BACKEND = "orjson"
+except ImportError:
+    from json import loads as json_loads
+
+    JSON_BACKEND = "json"
+
+# Models sometimes echo the positions back as keys
+RESERVED_KEYS = frozenset(str(i) for i in range(0, 20))
+
+
+class ParsingMixin:
+    # Turns provider replies into answers: cleaning, list parsing,
+    # canonicalization and truncation
+    def __init__(
+        self, canonicalizer: BrandCanonicalizer | None = None, **kwargs: Any
+    ) -> None:
+        super().__init__(**kwargs)
+        self._canonicalizer = canonicalizer
+
+    @staticmethod
+    def clean_reply(text: str) -> str:
+        return text.strip(' ."1234567890\t\r\n*-:;•').strip("'")
+
+    @staticmethod
+    def parse_list(text: str) -> list[str]:
+        splittered = text.split(",")
+        if len(splittered) == 1:
+            splittered = text.split("\n")
+        return [ParsingMixin.clean_reply(s) for s in splittered if len(s) > 0]
+
+    @staticmethod
+    def parse_json_ranked_list(text: str) -> list[str]:
+        choices = json_loads(text)["choices"]
+        positions = len(choices)
+        # One pass; JSON object keys are always strings
+        for brand, position in choices.items():
+            if (
+                not isinstance(position, int)
+                or not 0 <= position <= positions
+                or brand in RESERVED_KEYS
+            ):
+                logger.debug("Ignoring answer from LLM: %s", text)
+                return []
+        return sorted(choices, key=choices.__getitem__)
+
+    @property
+    def canonicalizer(self) -> BrandCanonicalizer | None:
+        return self._canonicalizer
+
+    def canonicalize(self, answers: list[str]) -> list[str]:
+        if self._canonicalizer is None:
+            return answers
+        return self._canonicalizer.canonicalize(answers)
+
+    def ranked_list_answers(self, text: str) -> list[str]:
+        answers = self.canonicalize(self.parse_json_ranked_list(text))
+        if not answers:
+            self._telemetry.count(
+                "llm_empty_answers_total", model=self.computed_model_name, kind="list"
+            )
+        return answers
+
+    def truncate(self, answers: list[str], choices: int) -> list[str]:
+        if len(answers) > choices:
+            self._telemetry.count(
+                "llm_extra_choices_total",
+                len(answers) - choices,
+                model=self.computed_model_name,
+            )
+            logger.debug("Ignoring extra choices: %s", answers[choices:])
+            return answers[:choices]
+        return answers
+
+    def record_parse_failure(self, text: str, exc: Exception) -> None:
+        self._telemetry.count(
+            "llm_parse_failures_total", model=self.computed_model_name
+        )
+        logger.debug("Error when parsing json response %r: %s", text, exc)
@@ -0,0 +1,166 @@
+import asyncio
+from dataclasses import dataclass
+from typing import TYPE_CHECKING, Any, Awaitable, Callable
+
+from ledger import booked_as, tags
+from retrying import call_errors, captured_errors
+
+if TYPE_CHECKING:
+    from llm_call import LLM
+
+
+@dataclass
+class PoolEntry:
+    future: asyncio.Future[list["LLM.SimpleResponse"]]
+    # The caller's captured_errors() list, if any
+    errors: list[int | None] | None
+
+
+class PoolingMixin:
+    # Shares requests between callers: deterministic requests in flight are
+    # coalesced, identical stochastic ones are pooled into one multi-sample
+    # request
+    def __init__(self, **kwargs: Any) -> None:
+        super().__init__(**kwargs)
+        self._flights: dict[str, asyncio.Future[list["LLM.SimpleResponse"]]] = {}
+        self._pools: dict[tuple, list[PoolEntry]] = {}
+        self._pending_pools = 0
+        self._pool_tasks: set[asyncio.Future[None]] = set()
+
+    @property
+    def max_samples_per_request(self) -> int:
+        return 1
+
+    async def ask_generic_question_samples(
+        self,
+        system_prompt: str,
+        question: str,
+        temperature: float,
+        is_json: bool,
+        samples: int,
+    ) -> list["LLM.SimpleResponse"]:
+        return list(
+            await asyncio.gather(
+                *[
+                    self.ask_generic_question(
+                        system_prompt, question, temperature, is_json
+                    )
+                    for _ in range(0, samples)
+                ]
+            )
+        )
+
+    @booked_as("choice")
+    async def choice_tally(
+        self,
+        question: str,
+        temperature: float,
+        samples: int,
+        system_prompt=None,
+    ) -> "LLM.Tally":
+        if not system_prompt:
+            system_prompt = self.choice_system_prompt
+        per_request = self.max_samples_per_request
+        sizes = [per_request] * (samples // per_request)
+        if samples % per_request:
+            sizes.append(samples % per_request)
+
+        batches = await asyncio.gather(
+            *[
+                self.ask_generic_question_samples(
+                    system_prompt, question, temperature, False, size
+                )
+                for size in sizes
+            ]
+        )
+        # Failed requests come back empty and don't count as served
+        tally = self.Tally(
+            requests=sum(1 for responses in batches if responses), sent=len(batches)
+        )
+        for responses in batches:
+            for result in responses:
+                tally.add(
+                    self.Choice(
+                        answer=self.clean_reply(result.answer),
+                        probability=result.probability,
+                        input_tokens=result.input_tokens,
+                        output_tokens=result.output_tokens,
+                    )
+                )
+        return tally
+
+    async def pooled_samples(
+        self,
+        system_prompt: str,
+        question: str,
+        temperature: float,
+        is_json: bool,
+    ) -> list["LLM.SimpleResponse"]:
+        # Identical stochastic requests issued in the same loop iteration go
+        # out as one request for several samples, one per caller.
+        # Deterministic requests are coalesced by dispatch instead; None is
+        # the provider's default temperature, which is stochastic.
+        if temperature == 0 or self.max_samples_per_request == 1:
+            return await self.ask_generic_question_samples(
+                system_prompt, question, temperature, is_json, 1
+            )
+        # Pools don't mix ledger tags, so each job is still billed for its own
+        key = (system_prompt, question, temperature, is_json, tags())
+        pool = self._pools.get(key)
+        if pool is None or len(pool) >= self.max_samples_per_request:
+            pool = []
+            self._pools[key] = pool
+            self._pending_pools += 1
+            # Runs on the next loop iteration, after this one's callers joined.
+            # The loop only keeps weak references to tasks.
+            task = asyncio.ensure_future(self.flush_pool(key, pool))
+            self._pool_tasks.add(task)
+            task.add_done_callback(self._pool_tasks.discard)
+        future = asyncio.get_running_loop().create_future()
+        pool.append(PoolEntry(future, call_errors()))
+        return await future
+
+    # pylint: disable=broad-exception-caught
+    async def flush_pool(self, key: tuple, pool: list[PoolEntry]) -> None:
+        system_prompt, question, temperature, is_json, _ = key
+        self._pending_pools -= 1
+        if self._pools.get(key) is pool:
+            del self._pools[key]
+        if len(pool) > 1:
+            self._telemetry.count(
+                "llm_pooled_samples_total",
+                len(pool) - 1,
+                model=self.computed_model_name,
+            )
+        try:
+            with captured_errors() as errors:
+                responses = await self.ask_generic_question_samples(
+                    system_prompt, question, temperature, is_json, len(pool)
+                )
+        except Exception as exc:
+            for entry in pool:
+                if not entry.future.done():
+                    entry.future.set_exception(exc)
+            return
+        for i, entry in enumerate(pool):
+            if entry.errors is not None:
+                entry.errors.extend(errors)
+            if not entry.future.done():
+                entry.future.set_result(responses[i : i + 1])
+
+    async def coalesced(
+        self,
+        key: str | None,
+        call: Callable[[], Awaitable[list["LLM.SimpleResponse"]]],
+    ) -> list["LLM.SimpleResponse"]:
+        # Concurrent callers with the same key share one call and its result
+        if key is None:
+            return await call()
+        if (flight := self._flights.get(key)) is None:
+            flight = asyncio.ensure_future(call())
+            self._flights[key] = flight
+            flight.add_done_callback(lambda _: self._flights.pop(key, None))
+        else:
+            self._telemetry.count("llm_coalesced_total", model=self.computed_model_name)
+        # Shielded so one caller's cancellation doesn't fail the others
+        return list(await asyncio.shield(flight))
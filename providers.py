@@ -0,0 +1,20 @@
+import importlib
+from typing import Any
+
+from llm_call import LLM
+
+# Imported lazily so a missing SDK only matters for the provider that needs it
+PROVIDERS = {
+    "gemini": "gemini_llm_call",
+    "together": "together_llm_call",
+    "mock": "mock_llm_call",
+    "router": "router",
+}
+
+
+def load_model(provider: str, **kwargs: Any) -> LLM:
+    if provider not in PROVIDERS:
+        raise ValueError(
+            f"Unknown provider {provider}, expected one of {', '.join(PROVIDERS)}"
+        )
+    return importlib.import_module(PROVIDERS[provider]).Model(**kwargs)
@@ -0,0 +1,107 @@
+import asyncio
+import time
+from dataclasses import dataclass, replace
+from typing import Awaitable, Callable
+
+
+@dataclass(frozen=True)
+class Quota:
+    rpm: int | None = None
+    tpm: int | None = None
+    burst_seconds: float = 10.0
+
+    def split(self, shares: int) -> "Quota":
+        # One of `shares` equal parts, e.g. for each of several processes
+        # sending under the same project quota
+        return replace(
+            self,
+            rpm=max(1, self.rpm // shares) if self.rpm else self.rpm,
+            tpm=max(1, self.tpm // shares) if self.tpm else self.tpm,
+        )
+
+
+class TokenBucket:
+    def __init__(
+        self,
+        per_minute: int,
+        burst_seconds: float,
+        clock: Callable[[], float] = time.monotonic,
+    ) -> None:
+        self._rate = per_minute / 60.0
+        self._capacity = max(1.0, self._rate * burst_seconds)
+        self._tokens = self._capacity
+        self._clock = clock
+        self._updated = clock()
+
+    @property
+    def capacity(self) -> float:
+        return self._capacity
+
+    def delay(self, amount: float, ahead: float = 0.0) -> float:
+        self._refill()
+        # Oversized requests only need a full bucket, not more than capacity
+        missing = ahead + min(amount, self._capacity) - self._tokens
+        return max(0.0, missing / self._rate)
+
+    def take(self, amount: float) -> None:
+        self._refill()
+        self._tokens -= amount
+
+    def _refill(self) -> None:
+        now = self._clock()
+        self._tokens = min(
+            self._capacity, self._tokens + (now - self._updated) * self._rate
+        )
+        self._updated = now
+
+
+class QuotaLimiter:
+    def __init__(
+        self,
+        quota: Quota,
+        clock: Callable[[], float] = time.monotonic,
+        sleep: Callable[[float], Awaitable[None]] = asyncio.sleep,
+    ) -> None:
+        self._quota = quota
+        self._requests = (
+            TokenBucket(quota.rpm, quota.burst_seconds, clock) if quota.rpm else None
+        )
+        self._tokens = (
+            TokenBucket(quota.tpm, quota.burst_seconds, clock) if quota.tpm else None
+        )
+        self._sleep = sleep
+        self._lock = asyncio.Lock()
+
+    @property
+    def quota(self) -> Quota:
+        return self._quota
+
+    async def admit(self, tokens: int) -> None:
+        if self._requests is None and self._tokens is None:
+            return
+        # Callers are admitted in arrival order so a large request isn't starved
+        async with self._lock:
+            while (wait := self._delay(tokens)) > 0:
+                await self._sleep(wait)
+            if self._requests:
+                self._requests.take(1)
+            if self._tokens:
+                self._tokens.take(tokens)
+
+    def delay(self, tokens: int, ahead: int = 0) -> float:
+        # Seconds until a request of this size would be admitted behind
+        # `ahead` requests of the same size, ignoring callers already queued
+        return max(
+            self._requests.delay(1, ahead) if self._requests else 0.0,
+            self._tokens.delay(tokens, ahead * tokens) if self._tokens else 0.0,
+        )
+
+    def settle(self, estimated: int, actual: int) -> None:
+        if self._tokens:
+            self._tokens.take(actual - estimated)
+
+    def _delay(self, tokens: int) -> float:
+        return max(
+            self._requests.delay(1) if self._requests else 0.0,
+            self._tokens.delay(tokens) if self._tokens else 0.0,
+        )
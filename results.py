@@ -0,0 +1,360 @@
+import argparse
+import sqlite3
+import time
+from dataclasses import dataclass
+
+from tabulate import tabulate
+
+DEFAULT_RESULTS_PATH = "results.sqlite"
+
+# Text columns are stored as ids into the strings table, so a sample row is
+# a handful of integers and floats
+TEXT_COLUMNS = (
+    "model",
+    "system_prompt",
+    "template",
+    "category",
+    "kind",
+    "brand",
+    "job",
+)
+COLUMNS = (
+    "sample",
+    "job",
+    "iteration",
+    "attempt",
+    "model",
+    "system_prompt",
+    "template",
+    "category",
+    "kind",
+    "temperature",
+    "position",
+    "brand",
+    "probability",
+    "input_tokens",
+    "output_tokens",
+    "latency",
+    "created",
+)
+
+
+@dataclass
+class Sample:
+    # pylint: disable=too-many-instance-attributes
+    model: str
+    template: str
+    answers: list[str]
+    temperature: float | None = None
+    category: str = ""
+    kind: str = "list"
+    system_prompt: str = ""
+    probability: float | None = None
+    input_tokens: int = 0
+    output_tokens: int = 0
+    latency: float | None = None
+    # Set by BatchRunner: the job, its iteration and the run attempt. A
+    # resumed run keeps its attempt, so rows it writes again are ignored.
+    job: str | None = None
+    iteration: int | None = None
+    attempt: int | None = None
+
+
+class ResultStore:
+    # Append-only store of raw samples, one row per (sample, position) and a
+    # single row with no brand for an empty answer. Rows are buffered and
+    # written in batches; queries aggregate in SQLite, so tables can be
+    # rebuilt without re-running polls.
+    def __init__(self, path: str = DEFAULT_RESULTS_PATH, batch_size: int = 10_000):
+        self.batch_size = batch_size
+        self._db = sqlite3.connect(path, isolation_level=None)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute("PRAGMA synchronous=NORMAL")
+        self._db.execute(
+            """
+            CREATE TABLE IF NOT EXISTS strings (
+                id INTEGER PRIMARY KEY,
+                value TEXT UNIQUE NOT NULL
+            )
+            """
+        )
+        self._db.execute(
+            """
+            CREATE TABLE IF NOT EXISTS samples (
+                sample INTEGER NOT NULL,
+                job INTEGER,
+                iteration INTEGER,
+                attempt INTEGER,
+                model INTEGER,
+                system_prompt INTEGER,
+                template INTEGER,
+                category INTEGER,
+                kind INTEGER,
+                temperature REAL,
+                position INTEGER,
+                brand INTEGER,
+                probability REAL,
+                input_tokens INTEGER NOT NULL,
+                output_tokens INTEGER NOT NULL,
+                latency REAL,
+                created REAL NOT NULL
+            )
+            """
+        )
+        # Samples without a job are never duplicates: NULLs are distinct
+        self._db.execute(
+            """
+            CREATE UNIQUE INDEX IF NOT EXISTS samples_iteration
+            ON samples(job, iteration, attempt, position)
+            """
+        )
+        self._db.execute("CREATE INDEX IF NOT EXISTS samples_kind ON samples(kind)")
+        self._db.execute(
+            "CREATE INDEX IF NOT EXISTS samples_category ON samples(category)"
+        )
+        # Read-through cache of the strings table, both ways
+        self._ids: dict[str, int] = {}
+        self._values: dict[int, str] = {}
+        self._rows: list[tuple] = []
+        self._samples = 0
+
+    def __enter__(self) -> "ResultStore":
+        return self
+
+    def __exit__(self, *exc_info) -> None:
+        self.close()
+
+    def add(self, sample: Sample) -> None:
+        # Rows keep their text until flush, where ids are assigned inside
+        # the write transaction; shards can then share one store file
+        self._samples += 1
+        shared = (
+            self._samples,
+            sample.job,
+            sample.iteration,
+            sample.attempt,
+            sample.model,
+            sample.system_prompt,
+            sample.template,
+            sample.category,
+            sample.kind,
+            sample.temperature,
+        )
+        usage = (
+            sample.probability,
+            sample.input_tokens or 0,
+            sample.output_tokens or 0,
+            sample.latency,
+            time.time(),
+        )
+        if not sample.answers:
+            self._rows.append((*shared, None, None, *usage))
+        for position, brand in enumerate(sample.answers):
+            self._rows.append((*shared, position + 1, brand, *usage))
+        if len(self._rows) >= self.batch_size:
+            self.flush()
+
+    def flush(self) -> None:
+        if not self._rows:
+            return
+        text = [COLUMNS.index(c) for c in TEXT_COLUMNS]
+        self._db.execute("BEGIN IMMEDIATE")
+        try:
+            values = {row[i] for row in self._rows for i in text} - {None}
+            self._db.executemany(
+                "INSERT OR IGNORE INTO strings (value) VALUES (?)",
+                [(v,) for v in values - self._ids.keys()],
+            )
+            self._load(values - self._ids.keys())
+            (last,) = self._db.execute("SELECT MAX(sample) FROM samples").fetchone()
+            rows = []
+            for row in self._rows:
+                row = list(row)
+                row[0] += last or 0
+                for i in text:
+                    row[i] = self._ids.get(row[i])
+                rows.append(row)
+            self._db.executemany(
+                f"INSERT OR IGNORE INTO samples ({', '.join(COLUMNS)}) "
+                f"VALUES ({', '.join('?' * len(COLUMNS))})",
+                rows,
+            )
+            self._db.execute("COMMIT")
+        except BaseException:
+            self._db.execute("ROLLBACK")
+            raise
+        self._rows = []
+        self._samples = 0
+
+    def close(self) -> None:
+        self.flush()
+        self._db.close()
+
+    def samples(self, **filters) -> int:
+        where, params = self._where(filters)
+        (count,) = self._db.execute(
+            f"SELECT COUNT(DISTINCT sample) FROM samples WHERE {where}", params
+        ).fetchone()
+        return count
+
+    def table(self, positions: int | None = None, **filters) -> list[list]:
+        # Brand x position counts, ordered like VoteAggregator.table
+        where, params = self._where(filters)
+        counts: dict[str, dict[int, int]] = {}
+        for brand, position, count in self._db.execute(
+            f"""
+            SELECT s.value, position, COUNT(*) FROM samples JOIN strings s ON s.id = brand
+            WHERE {where} GROUP BY brand, position
+            """,
+            params,
+        ):
+            counts.setdefault(brand, {})[position] = count
+        width = positions or max(
+            (p for by_position in counts.values() for p in by_position), default=0
+        )
+        rows = [
+            [brand] + [by_position.get(p, 0) for p in range(1, width + 1)]
+            for brand, by_position in counts.items()
+        ]
+        rows.sort(key=lambda r: r[1:], reverse=True)
+        return rows
+
+    def compare(
+        self, column: str, position: int = 1, **filters
+    ) -> tuple[list, list[list]]:
+        # Share of samples naming each brand at `position`, per value of
+        # `column` (temperature, system_prompt, model, ...)
+        if column not in COLUMNS:
+            raise ValueError(f"Unknown column {column}")
+        where, params = self._where(filters)
+        totals = dict(
+            self._db.execute(
+                f"SELECT {column}, COUNT(DISTINCT sample) FROM samples WHERE {where} GROUP BY {column}",
+                params,
+            )
+        )
+        shares: dict[str, dict] = {}
+        for value, brand, count in self._db.execute(
+            f"""
+            SELECT {column}, s.value, COUNT(*) FROM samples JOIN strings s ON s.id = brand
+            WHERE {where} AND position = ? GROUP BY {column}, brand
+            """,
+            params + [position],
+        ):
+            shares.setdefault(brand, {})[value] = count / totals[value]
+        values = sorted(totals, key=lambda v: (v is None, v))
+        rows = [
+            [brand] + [by_value.get(v, 0.0) for v in values]
+            for brand, by_value in shares.items()
+        ]
+        rows.sort(key=lambda r: max(r[1:]), reverse=True)
+        if column in TEXT_COLUMNS:
+            values = [self._text(v) for v in values]
+        return values, rows
+
+    def diff(self, column: str, before, after, position: int = 1, **filters) -> list:
+        # Brands whose share at `position` moved the most between two values
+        # of `column`, e.g. two system prompts
+        values, rows = self.compare(column, position, **filters)
+        if before not in values or after not in values:
+            return []
+        b, a = values.index(before) + 1, values.index(after) + 1
+        diffs = [[row[0], row[b], row[a], row[a] - row[b]] for row in rows]
+        diffs.sort(key=lambda r: abs(r[3]), reverse=True)
+        return diffs
+
+    def export_parquet(self, path: str, **filters) -> None:
+        # Text columns are written as dictionary-encoded strings
+        try:
+            # pylint: disable=import-outside-toplevel,import-error
+            import pyarrow as pa
+            import pyarrow.parquet as pq
+        except ImportError as exc:
+            raise ImportError(
+                "export_parquet needs pyarrow: pip install pyarrow"
+            ) from exc
+
+        self.flush()
+        where, params = self._where(filters)
+        cursor = self._db.execute(
+            f"SELECT {', '.join(COLUMNS)} FROM samples WHERE {where}", params
+        )
+        columns = list(zip(*cursor.fetchall())) or [()] * len(COLUMNS)
+        arrays = {
+            name: (
+                pa.array([self._text(v) for v in values]).dictionary_encode()
+                if name in TEXT_COLUMNS
+                else pa.array(values)
+            )
+            for name, values in zip(COLUMNS, columns)
+        }
+        pq.write_table(pa.table(arrays), path)
+
+    def _load(self, values: set[str]) -> None:
+        for value in values:
+            row = self._db.execute(
+                "SELECT id FROM strings WHERE value = ?", (value,)
+            ).fetchone()
+            if row is not None:
+                self._ids[value] = row[0]
+                self._values[row[0]] = value
+
+    def _text(self, i: int | None) -> str | None:
+        if i is not None and i not in self._values:
+            (value,) = self._db.execute(
+                "SELECT value FROM strings WHERE id = ?", (i,)
+            ).fetchone()
+            self._ids[value] = i
+            self._values[i] = value
+        return None if i is None else self._values[i]
+
+    def _where(self, filters: dict) -> tuple[str, list]:
+        # Filters are column=value; text values are matched by id
+        self.flush()
+        clauses, params = ["1"], []
+        for column, value in filters.items():
+            if column not in COLUMNS:
+                raise ValueError(f"Unknown column {column}")
+            if column in TEXT_COLUMNS:
+                self._load({value} - self._ids.keys())
+                value = self._ids.get(value, -1)
+            clauses.append(f"{column} IS ?")
+            params.append(value)
+        return " AND ".join(clauses), params
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Query stored poll samples")
+    parser.add_argument("store", nargs="?", default=DEFAULT_RESULTS_PATH)
+    parser.add_argument("--model")
+    parser.add_argument("--category")
+    parser.add_argument("--temperature", type=float)
+    parser.add_argument("--compare", help="Column to compare, e.g. temperature")
+    parser.add_argument("--position", type=int, default=1)
+    args = parser.parse_args()
+
+    filters = {
+        column: value
+        for column, value in (
+            ("model", args.model),
+            ("category", args.category),
+            ("temperature", args.temperature),
+        )
+        if value is not None
+    }
+    with ResultStore(args.store) as store:
+        print(f"{store.samples(**filters)} samples")
+        if args.compare:
+            values, rows = store.compare(args.compare, args.position, **filters)
+            headers = ["Brand"] + [str(v)[:40] for v in values]
+            print(tabulate(rows, headers=headers, tablefmt="github", floatfmt=".3f"))
+        else:
+            rows = store.table(**filters)
+            headers = ["Brand"] + [
+                f"#{i}" for i in range(1, len(rows[0]) if rows else 1)
+            ]
+            print(tabulate(rows, headers=headers, tablefmt="github"))
+
+
+if __name__ == "__main__":
+    main()
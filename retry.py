@@ -0,0 +1,107 @@
+import random
+import time
+from dataclasses import dataclass
+from email.utils import parsedate_to_datetime
+
+RETRY_STATUSES = frozenset({408, 429, 500, 502, 503, 504})
+
+CLOSED = "closed"
+OPEN = "open"
+HALF_OPEN = "half-open"
+
+
+class CircuitOpenError(Exception):
+    def __init__(self, name: str, retry_in: float) -> None:
+        super().__init__(f"Circuit for {name} is open, retry in {retry_in:.1f}s")
+        self.retry_in = retry_in
+
+
+@dataclass(frozen=True)
+class RetryPolicy:
+    max_attempts: int = 10
+    # Decorrelated jitter bounds, in seconds
+    base: float = 0.5
+    cap: float = 30.0
+    # Total budget across attempts and waits; None waits as long as it takes
+    deadline: float | None = None
+    # Send a duplicate if the first attempt is still pending after this long
+    hedge_after: float | None = None
+    retry_statuses: frozenset[int] = RETRY_STATUSES
+
+
+def decorrelated_jitter(
+    previous: float, base: float, cap: float, rng: random.Random | None = None
+) -> float:
+    # Exponential-ish growth without synchronized retry waves
+    return min(cap, (rng or random).uniform(base, max(base, previous * 3)))
+
+
+def parse_retry_after(value: str | None) -> float | None:
+    if not value:
+        return None
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        pass
+    try:
+        return max(0.0, parsedate_to_datetime(value).timestamp() - time.time())
+    except (TypeError, ValueError):
+        return None
+
+
+class CircuitBreaker:
+    # Opens after `failure_threshold` consecutive retryable failures and
+    # rejects calls for `reset_timeout` seconds; then one trial call is let
+    # through and its outcome closes or re-opens the circuit.
+    def __init__(
+        self, name: str, failure_threshold: int = 50, reset_timeout: float = 30.0
+    ) -> None:
+        self.name = name
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self._failures = 0
+        self._opened_at: float | None = None
+        self._trial = False
+
+    @property
+    def state(self) -> str:
+        if self._opened_at is None:
+            return CLOSED
+        if time.monotonic() - self._opened_at >= self.reset_timeout:
+            return HALF_OPEN
+        return OPEN
+
+    def check(self) -> bool:
+        # True when this call is the trial and must settle the circuit
+        state = self.state
+        if state == OPEN:
+            raise CircuitOpenError(
+                self.name, self.reset_timeout - (time.monotonic() - self._opened_at)
+            )
+        if state == HALF_OPEN:
+            if self._trial:
+                raise CircuitOpenError(self.name, 0.0)
+            self._trial = True
+            return True
+        return False
+
+    def record_success(self) -> None:
+        self._failures = 0
+        self._opened_at = None
+        self._trial = False
+
+    def record_failure(self) -> None:
+        self._failures += 1
+        if self._trial or self._failures >= self.failure_threshold:
+            self._opened_at = time.monotonic()
+            self._trial = False
+
+
+_breakers: dict[str, CircuitBreaker] = {}
+
+
+def circuit_breaker(name: str) -> CircuitBreaker:
+    # One breaker per provider model, shared by every Model instance
+    if name not in _breakers:
+        _breakers[name] = CircuitBreaker(name)
+    return _breakers[name]
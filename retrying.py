@@ -0,0 +1,204 @@
+import asyncio
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from dataclasses import replace
+from typing import TYPE_CHECKING, Any, Awaitable, Callable, Iterator
+
+from ledger import booked_as
+from retry import CircuitBreaker, RetryPolicy, circuit_breaker, decorrelated_jitter
+from telemetry import logger
+
+if TYPE_CHECKING:
+    from llm_call import LLM
+
+# Per-call override of the model's retry policy
+_retry_override: ContextVar[RetryPolicy | None] = ContextVar(
+    "retry_override", default=None
+)
+
+# Statuses of the provider errors swallowed into empty answers during the
+# current call, for callers that break failures down by status
+_call_errors: ContextVar[list[int | None] | None] = ContextVar(
+    "call_errors", default=None
+)
+
+
+@contextmanager
+def captured_errors() -> Iterator[list[int | None]]:
+    errors: list[int | None] = []
+    token = _call_errors.set(errors)
+    try:
+        yield errors
+    finally:
+        _call_errors.reset(token)
+
+
+def call_errors() -> list[int | None] | None:
+    # The innermost captured_errors() list, if any
+    return _call_errors.get()
+
+
+class RetryingMixin:
+    # Retries, hedging and the circuit breaker around LLM.send_request
+    def __init__(
+        self,
+        retry: RetryPolicy | None = None,
+        breaker: CircuitBreaker | None = None,
+        **kwargs: Any,
+    ) -> None:
+        super().__init__(**kwargs)
+        self._retry = retry or RetryPolicy()
+        self._breaker = breaker or circuit_breaker(self.computed_model_name)
+
+    @property
+    def retry_policy(self) -> RetryPolicy:
+        return _retry_override.get() or self._retry
+
+    @property
+    def breaker(self) -> CircuitBreaker:
+        return self._breaker
+
+    def is_retryable(self, exc: Exception) -> bool:
+        return self.error_status(exc) in self.retry_policy.retry_statuses
+
+    @booked_as("generic")
+    async def ask_generic_question_with_retries(
+        self,
+        system_prompt: str,
+        question: str,
+        temperature: float,
+        is_json: bool,
+        max_retries: int = 10,
+    ) -> "LLM.SimpleResponse":
+        token = _retry_override.set(
+            replace(self.retry_policy, max_attempts=max_retries + 1)
+        )
+        try:
+            return await self.ask_generic_question(
+                system_prompt, question, temperature, is_json
+            )
+        finally:
+            _retry_override.reset(token)
+
+    async def dispatch_with_retries(
+        self,
+        send: Callable[[], Awaitable[list["LLM.SimpleResponse"]]],
+        estimated_tokens: int = 0,
+        key: str | None = None,
+    ) -> list["LLM.SimpleResponse"]:
+        # The retry policy is read here, where the caller's override is set
+        policy = self.retry_policy
+        return await self.coalesced(
+            key,
+            lambda: self.send_with_retries(send, estimated_tokens, key, policy),
+        )
+
+    # pylint: disable=broad-exception-caught
+    async def send_with_retries(
+        self,
+        send: Callable[[], Awaitable[list["LLM.SimpleResponse"]]],
+        estimated_tokens: int,
+        key: str | None,
+        policy: RetryPolicy,
+    ) -> list["LLM.SimpleResponse"]:
+        model = self.computed_model_name
+        started = time.monotonic()
+        delay = policy.base
+        async with asyncio.timeout(policy.deadline):
+            for attempt in range(0, policy.max_attempts):
+                trial = self._breaker.check()
+                try:
+                    result = await self.hedged(send, estimated_tokens, key)
+                except Exception as exc:
+                    # The provider answered, so the circuit stays healthy;
+                    # throttling is left to the limiter
+                    if not self.is_retryable(exc) or self.error_status(exc) == 429:
+                        self._breaker.record_success()
+                    else:
+                        self._breaker.record_failure()
+                    if not self.is_retryable(exc):
+                        raise
+                    delay = decorrelated_jitter(delay, policy.base, policy.cap)
+                    wait = max(delay, self.retry_after(exc) or 0.0)
+                    out_of_time = (
+                        policy.deadline is not None
+                        and time.monotonic() - started + wait > policy.deadline
+                    )
+                    if attempt + 1 == policy.max_attempts or out_of_time:
+                        raise
+                    self._telemetry.count(
+                        "llm_retries_total",
+                        model=model,
+                        status=str(self.error_status(exc)),
+                    )
+                    logger.debug(
+                        "%s %s: retrying in %.2fs, attempt %s",
+                        model,
+                        self.error_status(exc),
+                        wait,
+                        attempt + 1,
+                    )
+                    await asyncio.sleep(wait)
+                except BaseException:
+                    # Cancelled or out of time: an unsettled trial would
+                    # keep the circuit half-open for good
+                    if trial:
+                        self._breaker.record_failure()
+                    raise
+                else:
+                    self._breaker.record_success()
+                    return result
+        return []
+
+    async def hedged(
+        self,
+        send: Callable[[], Awaitable[list["LLM.SimpleResponse"]]],
+        estimated_tokens: int = 0,
+        key: str | None = None,
+    ) -> list["LLM.SimpleResponse"]:
+        hedge_after = self.retry_policy.hedge_after
+        if hedge_after is None:
+            return await self.send_request(send, estimated_tokens, key)
+
+        # Both copies go through send_request, so hedges respect limiter and quota
+        tasks = [asyncio.create_task(self.send_request(send, estimated_tokens, key))]
+        try:
+            done, _ = await asyncio.wait(tasks, timeout=hedge_after)
+            if not done:
+                self._telemetry.count(
+                    "llm_hedges_total", model=self.computed_model_name
+                )
+                tasks.append(
+                    asyncio.create_task(self.send_request(send, estimated_tokens, key))
+                )
+            error: Exception | None = None
+            for next_done in asyncio.as_completed(tasks):
+                try:
+                    return await next_done
+                except Exception as exc:
+                    error = exc
+            raise error
+        finally:
+            for task in tasks:
+                task.cancel()
+
+    def record_error(self, exc: Exception) -> None:
+        if (errors := _call_errors.get()) is not None:
+            errors.append(self.error_status(exc))
+        self._telemetry.count(
+            "llm_errors_total",
+            model=self.computed_model_name,
+            type=type(exc).__name__,
+        )
+        logger.debug("Error in %s: %s", self.computed_model_name, exc)
+
+    # pylint: disable=unused-argument
+    @staticmethod
+    def error_status(exc: Exception) -> int | None:
+        return None
+
+    # pylint: disable=unused-argument
+    @staticmethod
+    def retry_after(exc: Exception) -> float | None:
+        return None
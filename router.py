@@ -0,0 +1,240 @@
+import math
+from contextlib import asynccontextmanager
+from dataclasses import replace
+from typing import Any, AsyncIterator, Callable
+
+from llm_call import LLM
+from providers import load_model
+from retry import OPEN
+from streaming import StreamDecoder
+from telemetry import Telemetry
+
+DEFAULT_PROVIDERS = ("gemini", "together")
+
+
+class Model(LLM):
+    # Spreads requests over several backends, each keeping its own limiter,
+    # quota, retries and breaker, so throughput adds up across providers.
+    # Every request goes to the backend with the lowest expected completion
+    # time; results carry that backend's computed_model_name.
+    # It overrides the provider hooks of the LLM interface; batches go
+    # through run_online, so the batch line hooks are left unimplemented.
+    # pylint: disable=too-many-public-methods,abstract-method
+    def __init__(
+        self,
+        backends: list[LLM] | None = None,
+        providers: tuple[str, ...] = DEFAULT_PROVIDERS,
+        telemetry: Telemetry | None = None,
+        **backend_kwargs: Any,
+    ) -> None:
+        # Extra arguments (canonicalizer, cache, ...) go to every backend
+        self.__backends = backends or [
+            load_model(p, **backend_kwargs) for p in providers
+        ]
+        self.__assigned = [0] * len(self.__backends)
+        super().__init__(telemetry=telemetry)
+
+    @property
+    def backends(self) -> list[LLM]:
+        return self.__backends
+
+    @property
+    def computed_model_name(self) -> str:
+        return f"router({','.join(b.computed_model_name for b in self.__backends)})"
+
+    def known_models(self) -> set[str]:
+        return set().union(*(b.known_models() for b in self.__backends))
+
+    def report_models(self) -> list[str]:
+        return [m for b in self.__backends for m in b.report_models()]
+
+    @property
+    def max_parallelism(self) -> int:
+        return sum(b.max_parallelism for b in self.__backends)
+
+    def split_limits(self, shares: int) -> None:
+        # Admission happens in the backends
+        super().split_limits(shares)
+        for backend in self.__backends:
+            backend.split_limits(shares)
+
+    @property
+    def parallelism(self) -> int:
+        return sum(b.parallelism for b in self.__backends)
+
+    @property
+    def observed_rpm(self) -> float:
+        return sum(b.observed_rpm for b in self.__backends)
+
+    @property
+    def max_samples_per_request(self) -> int:
+        return min(b.max_samples_per_request for b in self.__backends)
+
+    @property
+    def choice_system_prompt(self) -> str:
+        return self.__backends[0].choice_system_prompt
+
+    @property
+    def ranked_list_system_prompt(self) -> str:
+        return self.__backends[0].ranked_list_system_prompt
+
+    @property
+    def has_logprob(self) -> bool:
+        return all(b.has_logprob for b in self.__backends)
+
+    def expected_seconds(self, i: int, tokens: int) -> float:
+        backend = self.__backends[i]
+        if backend.breaker.state == OPEN:
+            return math.inf
+        # Unmeasured backends look free, so each gets traffic to measure
+        latency = backend.limiter.latency or 0.0
+        queued = self.__assigned[i] / max(1, backend.parallelism)
+        return backend.admission_delay(tokens) + latency * (1 + queued)
+
+    @asynccontextmanager
+    async def route(self, tokens: int) -> AsyncIterator[LLM]:
+        i = min(
+            range(0, len(self.__backends)),
+            key=lambda i: (self.expected_seconds(i, tokens), self.__assigned[i]),
+        )
+        backend = self.__backends[i]
+        self.telemetry.count("llm_routed_total", model=backend.computed_model_name)
+        self.__assigned[i] += 1
+        try:
+            yield backend
+        finally:
+            self.__assigned[i] -= 1
+
+    async def ask_for_list(
+        self,
+        choices: int,
+        question: str,
+        safe_answer: str,
+        temperature: float | None,
+    ) -> LLM.Response:
+        tokens = self.estimate_tokens(self.ranked_list_system_prompt, question, True)
+        async with self.route(tokens) as backend:
+            result = await backend.ask_for_list(
+                choices, question, safe_answer, temperature
+            )
+            return replace(result, model=backend.computed_model_name)
+
+    async def ask_for_open_list(
+        self, system_prompt: str, question: str, temperature: float
+    ) -> LLM.Response:
+        tokens = self.estimate_tokens(system_prompt, question, True)
+        async with self.route(tokens) as backend:
+            result = await backend.ask_for_open_list(
+                system_prompt, question, temperature
+            )
+            return replace(result, model=backend.computed_model_name)
+
+    async def ask_for_ranked_list(
+        self,
+        system_prompt: str,
+        question: str,
+        temperature: float,
+        until: Callable[[], StreamDecoder] | None = None,
+    ) -> LLM.Response:
+        tokens = self.estimate_tokens(system_prompt, question, True)
+        async with self.route(tokens) as backend:
+            result = await backend.ask_for_ranked_list(
+                system_prompt, question, temperature, until
+            )
+            return replace(result, model=backend.computed_model_name)
+
+    async def choice_from_pair(
+        self,
+        question: str,
+        temperature: float,
+        max_iterations: int,
+        system_prompt=None,
+    ) -> LLM.Choice:
+        tokens = self.estimate_tokens(system_prompt or "", question, False)
+        async with self.route(tokens) as backend:
+            result = await backend.choice_from_pair(
+                question, temperature, max_iterations, system_prompt
+            )
+            return replace(result, model=backend.computed_model_name)
+
+    async def ask_generic_question(
+        self,
+        system_prompt: str,
+        question: str,
+        temperature: float,
+        is_json: bool,
+        until: Callable[[], StreamDecoder] | None = None,
+    ) -> LLM.SimpleResponse:
+        tokens = self.estimate_tokens(system_prompt, question, is_json)
+        async with self.route(tokens) as backend:
+            result = await backend.ask_generic_question(
+                system_prompt, question, temperature, is_json, until
+            )
+            return replace(result, model=backend.computed_model_name)
+
+    async def ask_generic_question_samples(
+        self,
+        system_prompt: str,
+        question: str,
+        temperature: float,
+        is_json: bool,
+        samples: int,
+    ) -> list[LLM.SimpleResponse]:
+        tokens = samples * self.estimate_tokens(system_prompt, question, is_json)
+        async with self.route(tokens) as backend:
+            results = await backend.ask_generic_question_samples(
+                system_prompt, question, temperature, is_json, samples
+            )
+            return [replace(r, model=backend.computed_model_name) for r in results]
+
+    async def conversation(
+        self, questions: list[str], temperature: float | None
+    ) -> LLM.Conversation:
+        return await self.converse(questions, temperature)
+
+    async def converse(
+        self,
+        questions: list[str],
+        temperature: float | None,
+        system_prompt: str = "",
+        retries: int = 3,
+        backoff: float = 1.0,
+    ) -> LLM.Conversation:
+        # A session stays on one backend so its history is that model's own
+        tokens = self.estimate_tokens(system_prompt, "".join(questions), False)
+        async with self.route(tokens) as backend:
+            conversation = await backend.converse(
+                questions, temperature, system_prompt, retries, backoff
+            )
+            return replace(conversation, model=backend.computed_model_name)
+
+    async def ask_with_history(
+        self,
+        system_prompt: str,
+        history: list[LLM.Conversation.Answer],
+        question: str,
+        temperature: float | None,
+    ) -> list[LLM.SimpleResponse]:
+        # Single turns; whole sessions go through converse() to stay on one
+        # backend
+        tokens = self.estimate_tokens(
+            system_prompt, self.history_text(history, question), False
+        )
+        async with self.route(tokens) as backend:
+            results = await backend.ask_with_history(
+                system_prompt, history, question, temperature
+            )
+            return [replace(r, model=backend.computed_model_name) for r in results]
+
+    async def close(self) -> None:
+        for backend in self.__backends:
+            await backend.close()
+        await super().close()
+
+    @staticmethod
+    def extract_logprobs(completion: Any) -> float | None:
+        # Provider completions never reach the router; what it gets back are
+        # SimpleResponses whose probability the serving backend extracted
+        if isinstance(completion, LLM.SimpleResponse):
+            return completion.probability
+        return None
@@ -0,0 +1,200 @@
+import asyncio
+from dataclasses import dataclass
+
+from llm_call import LLM
+
+LOGPROBS = "logprobs"
+SAMPLING = "sampling"
+
+
+@dataclass
+class Distribution:
+    probabilities: dict[str, float]
+    # LOGPROBS when read off one reply's first token, SAMPLING otherwise
+    method: str
+    samples: int = 0
+    requests: int = 0
+    input_tokens: int = 0
+    output_tokens: int = 0
+    # First-token probability mass that fell on the options
+    coverage: float = 1.0
+
+    def interval(self, answer: str) -> float:
+        # Logprobs are the model's own probabilities, not a sample estimate
+        if self.method == LOGPROBS:
+            return 0.0
+        return LLM.wald(self.probabilities.get(answer, 0.0), self.samples)
+
+    def ranked(self) -> list[tuple[str, float]]:
+        return sorted(self.probabilities.items(), key=lambda k: k[1], reverse=True)
+
+
+def option_probabilities(
+    alternatives: dict[str, float], options: list[str] | None = None
+) -> tuple[dict[str, float], float]:
+    # Each first-token alternative counts towards the option it starts. A
+    # token that could start several options is ambiguous and dropped.
+    # Without options every alternative is its own answer.
+    matched: dict[str, float] = {}
+    for token, probability in alternatives.items():
+        cleaned = LLM.clean_reply(token)
+        if not cleaned:
+            continue
+        if options is None:
+            candidates = [cleaned]
+        else:
+            candidates = [o for o in options if o.lower().startswith(cleaned.lower())]
+        if len(candidates) == 1:
+            matched[candidates[0]] = matched.get(candidates[0], 0.0) + probability
+    mass = sum(matched.values())
+    if not mass:
+        return {}, 0.0
+    return {option: p / mass for option, p in matched.items()}, mass
+
+
+@dataclass
+class Estimate:
+    tally: LLM.Tally
+    stop_reason: str
+
+    @property
+    def leader(self) -> str | None:
+        ranked = self.tally.ranked()
+        return ranked[0][0] if ranked else None
+
+
+class SequentialSampler:
+    # Runs votes in waves and stops once the Wald interval of the leading
+    # answer separates from the runner-up or is narrow enough. The budget
+    # counts requests sent, including failed ones.
+    def __init__(
+        self,
+        model: LLM,
+        wave_size: int = 100,
+        budget: int = 10000,
+        target_width: float = 0.05,
+        min_samples: int = 30,
+        max_failed_waves: int = 3,
+    ) -> None:
+        self.model = model
+        self.wave_size = wave_size
+        self.budget = budget
+        self.target_width = target_width
+        self.min_samples = min_samples
+        self.max_failed_waves = max_failed_waves
+
+    async def choice(
+        self, question: str, temperature: float, system_prompt=None
+    ) -> Estimate:
+        tally = LLM.Tally()
+        failed_waves = 0
+        while (reason := self.stop_reason(tally, failed_waves)) is None:
+            samples = min(
+                self.wave_size,
+                (self.budget - tally.sent) * self.model.max_samples_per_request,
+            )
+            wave = await self.model.choice_tally(
+                question, temperature, samples, system_prompt
+            )
+            failed_waves = 0 if wave.requests else failed_waves + 1
+            tally.merge(wave)
+        return Estimate(tally=tally, stop_reason=reason)
+
+    async def distribution(
+        self,
+        question: str,
+        temperature: float,
+        options: list[str] | None = None,
+        system_prompt=None,
+    ) -> Distribution:
+        # One request when the first answer token comes with top-k
+        # alternatives; sequential sampling when it doesn't
+        model = self.model
+        requests = input_tokens = output_tokens = 0
+        if model.has_logprob:
+            result = await model.ask_generic_question(
+                system_prompt or model.choice_system_prompt,
+                question,
+                temperature,
+                False,
+            )
+            probabilities, coverage = option_probabilities(
+                result.alternatives or {}, options
+            )
+            if probabilities:
+                return Distribution(
+                    probabilities=probabilities,
+                    method=LOGPROBS,
+                    requests=1,
+                    input_tokens=result.input_tokens,
+                    output_tokens=result.output_tokens,
+                    coverage=coverage,
+                )
+            requests = 1
+            input_tokens = result.input_tokens
+            output_tokens = result.output_tokens
+        tally = (await self.choice(question, temperature, system_prompt)).tally
+        return Distribution(
+            probabilities={answer: tally.share(answer) for answer, _ in tally.ranked()},
+            method=SAMPLING,
+            samples=tally.samples,
+            requests=requests + tally.requests,
+            input_tokens=input_tokens + tally.input_tokens,
+            output_tokens=output_tokens + tally.output_tokens,
+        )
+
+    async def ranked_list(
+        self,
+        choices: int,
+        question: str,
+        temperature: float,
+        position: int = 0,
+        safe_answer: str = "",
+    ) -> Estimate:
+        tally = LLM.Tally()
+        failed_waves = 0
+        while (reason := self.stop_reason(tally, failed_waves)) is None:
+            calls = min(self.wave_size, self.budget - tally.sent)
+            results = await asyncio.gather(
+                *[
+                    self.model.ask_for_list(choices, question, safe_answer, temperature)
+                    for _ in range(0, calls)
+                ]
+            )
+            # Failed requests come back without answers, as in choice_tally
+            served = sum(1 for result in results if result.answers)
+            failed_waves = 0 if served else failed_waves + 1
+            tally.sent += calls
+            tally.requests += served
+            for result in results:
+                tally.add(
+                    LLM.Choice(
+                        answer=(
+                            result.answers[position]
+                            if len(result.answers) > position
+                            else ""
+                        ),
+                        probability=None,
+                        input_tokens=result.input_tokens,
+                        output_tokens=result.output_tokens,
+                    )
+                )
+        return Estimate(tally=tally, stop_reason=reason)
+
+    def stop_reason(self, tally: LLM.Tally, failed_waves: int = 0) -> str | None:
+        if tally.sent >= self.budget:
+            return "budget"
+        if failed_waves >= self.max_failed_waves:
+            return "failed"
+        if tally.samples < self.min_samples:
+            return None
+        ranked = tally.ranked()
+        leader = ranked[0][0]
+        low = tally.share(leader) - tally.interval(leader)
+        if len(ranked) == 1 or low > tally.share(ranked[1][0]) + tally.interval(
+            ranked[1][0]
+        ):
+            return "separated"
+        if 2 * tally.interval(leader) <= self.target_width:
+            return "precise"
+        return None
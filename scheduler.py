@@ -0,0 +1,215 @@
+import asyncio
+import heapq
+import itertools
+import time
+from dataclasses import dataclass, field
+from typing import Awaitable, Callable, TypeVar
+
+from llm_call import LLM
+
+T = TypeVar("T")
+
+# Priority classes; lower runs first
+INTERACTIVE = 0
+NORMAL = 1
+BULK = 2
+
+DEFAULT_TENANT = "default"
+
+
+@dataclass
+class Ticket:
+    priority: int
+    tenant: str
+    start: float
+    finish: float
+    future: asyncio.Future[None]
+    queued_at: float = field(default_factory=time.perf_counter)
+
+
+class Scheduler:
+    # Admits calls into a model in priority order. Within a class, tenants
+    # share capacity by weighted fair queuing: each call is stamped with a
+    # virtual finish time of start + cost / weight, and the smallest stamp
+    # goes next. Capacity follows the model's adaptive limit, so calls
+    # queue here, in order, rather than in the limiter and quota, which are
+    # FIFO. A `reserve` share of it is kept free for INTERACTIVE calls.
+    # Per-class queues, the virtual clock and per-tenant bookkeeping.
+    # pylint: disable=too-many-instance-attributes
+    def __init__(
+        self,
+        model: LLM,
+        weights: dict[str, float] | None = None,
+        capacity: int | None = None,
+        reserve: float = 0.1,
+    ) -> None:
+        self.model = model
+        self.weights = weights or {}
+        self._capacity = capacity
+        self.reserve = reserve
+        self._in_flight = 0
+        self._queues: dict[int, list[tuple[float, int, Ticket]]] = {}
+        self._sequence = itertools.count()
+        self._virtual = 0.0
+        self._finish: dict[str, float] = {}
+        self._running: dict[str, set[asyncio.Task]] = {}
+
+    @property
+    def capacity(self) -> int:
+        return self._capacity or self.model.parallelism
+
+    @property
+    def in_flight(self) -> int:
+        return self._in_flight
+
+    def queued(self, priority: int | None = None) -> int:
+        return sum(
+            1
+            for p, queue in self._queues.items()
+            if priority is None or p == priority
+            for _, _, ticket in queue
+            if not ticket.future.done()
+        )
+
+    async def run(
+        self,
+        call: Callable[[], Awaitable[T]],
+        priority: int = NORMAL,
+        tenant: str = DEFAULT_TENANT,
+        cost: float = 1.0,
+        deadline: float | None = None,
+    ) -> T:
+        # `deadline` is in seconds from now and covers queueing and the call;
+        # TimeoutError when it passes
+        async with asyncio.timeout(deadline):
+            await self._acquire(priority, tenant, cost)
+            # The call runs in its own task so cancel() stops only the call,
+            # never the caller awaiting it
+            task = asyncio.ensure_future(call())
+            running = self._running.setdefault(tenant, set())
+            running.add(task)
+            try:
+                return await task
+            finally:
+                running.discard(task)
+                task.cancel()
+                self._release()
+
+    def cancel(self, tenant: str) -> int:
+        # Cancels a tenant's queued and running calls; their callers get
+        # CancelledError
+        cancelled = 0
+        for queue in self._queues.values():
+            for _, _, ticket in queue:
+                if ticket.tenant == tenant and ticket.future.cancel():
+                    cancelled += 1
+        for task in list(self._running.get(tenant, ())):
+            if task.cancel():
+                cancelled += 1
+        return cancelled
+
+    async def choice_from_pair(
+        self,
+        question: str,
+        temperature: float,
+        max_iterations: int = 1,
+        system_prompt=None,
+        priority: int = INTERACTIVE,
+        tenant: str = DEFAULT_TENANT,
+        deadline: float | None = None,
+    ) -> LLM.Choice:
+        return await self.run(
+            lambda: self.model.choice_from_pair(
+                question, temperature, max_iterations, system_prompt
+            ),
+            priority,
+            tenant,
+            deadline=deadline,
+        )
+
+    async def ask_for_list(
+        self,
+        choices: int,
+        question: str,
+        safe_answer: str,
+        temperature: float | None,
+        priority: int = NORMAL,
+        tenant: str = DEFAULT_TENANT,
+        deadline: float | None = None,
+    ) -> LLM.Response:
+        return await self.run(
+            lambda: self.model.ask_for_list(
+                choices, question, safe_answer, temperature
+            ),
+            priority,
+            tenant,
+            deadline=deadline,
+        )
+
+    def _available(self, priority: int) -> bool:
+        capacity = self.capacity
+        if priority > INTERACTIVE:
+            capacity -= int(capacity * self.reserve)
+        return self._in_flight < max(1, capacity)
+
+    def _ticket(self, priority: int, tenant: str, cost: float) -> Ticket:
+        start = max(self._virtual, self._finish.get(tenant, 0.0))
+        finish = start + cost / self.weights.get(tenant, 1.0)
+        self._finish[tenant] = finish
+        return Ticket(
+            priority,
+            tenant,
+            start,
+            finish,
+            asyncio.get_running_loop().create_future(),
+        )
+
+    async def _acquire(self, priority: int, tenant: str, cost: float) -> None:
+        ticket = self._ticket(priority, tenant, cost)
+        if self._available(priority) and not any(
+            self._head(p) for p in self._queues if p <= priority
+        ):
+            self._grant(ticket)
+            return
+        queue = self._queues.setdefault(priority, [])
+        heapq.heappush(queue, (ticket.finish, next(self._sequence), ticket))
+        try:
+            await ticket.future
+        except asyncio.CancelledError:
+            # The slot may have been handed over right before cancellation
+            if ticket.future.done() and not ticket.future.cancelled():
+                self._release()
+            raise
+
+    def _grant(self, ticket: Ticket) -> None:
+        self._in_flight += 1
+        self._virtual = max(self._virtual, ticket.start)
+        telemetry = self.model.telemetry
+        priority = str(ticket.priority)
+        telemetry.count("llm_scheduled_total", priority=priority)
+        telemetry.observe(
+            "llm_queue_seconds",
+            time.perf_counter() - ticket.queued_at,
+            priority=priority,
+        )
+
+    def _release(self) -> None:
+        self._in_flight -= 1
+        self._wake()
+
+    def _head(self, priority: int) -> Ticket | None:
+        # Drops tickets whose callers gave up
+        queue = self._queues[priority]
+        while queue and queue[0][2].future.done():
+            heapq.heappop(queue)
+        return queue[0][2] if queue else None
+
+    def _wake(self) -> None:
+        for priority in sorted(self._queues):
+            while (ticket := self._head(priority)) is not None:
+                if not self._available(priority):
+                    # Lower classes have less capacity, so they can't run either
+                    return
+                heapq.heappop(self._queues[priority])
+                self._grant(ticket)
+                ticket.future.set_result(None)
@@ -0,0 +1,154 @@
+import json
+from abc import ABC, abstractmethod
+
+# Characters that end a one-word reply; spaces don't, since some choices
+# are two words ("Land Rover")
+WORD_TERMINATORS = frozenset(".,;:!?\n")
+
+
+class StreamDecoder(ABC):
+    # Consumes a reply as it streams in and decides when enough has arrived.
+    # Once feed() returns True the rest of the stream can be dropped and
+    # text() stands in for the full reply.
+    @abstractmethod
+    def feed(self, chunk: str) -> bool:
+        pass
+
+    @abstractmethod
+    def text(self) -> str:
+        pass
+
+    @property
+    @abstractmethod
+    def tag(self) -> str:
+        # Distinguishes cut replies from full ones in the response cache
+        pass
+
+
+class WordDecoder(StreamDecoder):
+    # Done at the first terminator after a letter, so list markers such as
+    # "1." don't end the reply
+    def __init__(self) -> None:
+        self._chunks: list[str] = []
+        self._started = False
+        self._done = False
+
+    def feed(self, chunk: str) -> bool:
+        if self._done:
+            return True
+        for i, char in enumerate(chunk):
+            if self._started and char in WORD_TERMINATORS:
+                self._chunks.append(chunk[:i])
+                self._done = True
+                return True
+            self._started = self._started or char.isalpha()
+        self._chunks.append(chunk)
+        return False
+
+    def text(self) -> str:
+        return "".join(self._chunks)
+
+    @property
+    def tag(self) -> str:
+        return "word"
+
+
+class ChoicesDecoder(StreamDecoder):
+    # Incremental decoder for the Choices shape, {"choices": {brand: position}}.
+    # An entry counts once its value is terminated by "," or "}". Decoding is
+    # done once positions 1..limit (or 0..limit-1) have all arrived, so no
+    # later entry can outrank them. The attributes are the scanner's state.
+    # pylint: disable=too-many-instance-attributes
+    def __init__(self, limit: int) -> None:
+        self.limit = limit
+        self.entries: dict[str, int | float | str | None] = {}
+        self.finished = False
+        self._chunks: list[str] = []
+        self._depth = 0
+        self._in_string = False
+        self._escaped = False
+        self._token: list[str] = []
+        self._key: str | None = None
+        self._section: str | None = None
+        self._after_colon = False
+        self._value: list[str] = []
+        self._done = False
+
+    def feed(self, chunk: str) -> bool:
+        if self._done:
+            return True
+        self._chunks.append(chunk)
+        for char in chunk:
+            self._consume(char)
+        self._done = self.finished or self._ready()
+        return self._done
+
+    def text(self) -> str:
+        if self.finished:
+            return "".join(self._chunks)
+        # A cut reply is closed off so the regular parser can read it
+        return json.dumps({"choices": self.entries})
+
+    @property
+    def tag(self) -> str:
+        return f"choices:{self.limit}"
+
+    def _ready(self) -> bool:
+        positions = sorted(p for p in self.entries.values() if isinstance(p, int))
+        if len(positions) < self.limit or positions[0] not in (0, 1):
+            return False
+        first = positions[0]
+        return positions[: self.limit] == list(range(first, first + self.limit))
+
+    def _consume(self, char: str) -> None:
+        if self._in_string:
+            if self._escaped:
+                self._escaped = False
+            elif char == "\\":
+                self._escaped = True
+            elif char == '"':
+                self._in_string = False
+                self._string(json.loads('"' + "".join(self._token) + '"'))
+                return
+            self._token.append(char)
+            return
+        match char:
+            case '"':
+                self._in_string = True
+                self._token = []
+            case "{":
+                self._depth += 1
+                if self._depth == 2:
+                    self._section = self._key
+                self._key = None
+                self._after_colon = False
+            case "}":
+                self._end_value()
+                self._depth -= 1
+                if self._depth == 0:
+                    self.finished = True
+            case ",":
+                self._end_value()
+            case ":":
+                self._after_colon = True
+            case _ if not char.isspace():
+                self._value.append(char)
+
+    def _string(self, value: str) -> None:
+        if not self._after_colon:
+            self._key = value
+        elif self._depth == 2 and self._section == "choices":
+            # Not a position; kept so validation rejects the reply
+            self.entries[self._key] = value
+            self._key = None
+            self._after_colon = False
+
+    def _end_value(self) -> None:
+        if self._depth == 2 and self._section == "choices" and self._value:
+            try:
+                self.entries[self._key] = json.loads("".join(self._value))
+            except ValueError:
+                self.entries[self._key] = None
+        self._value = []
+        self._key = None
+        self._after_colon = False
@@ -0,0 +1,147 @@
+import bisect
+import logging
+import re
+import time
+from contextlib import AbstractContextManager, contextmanager, nullcontext
+from typing import Iterator
+
+logger = logging.getLogger("llm")
+
+DEFAULT_BUCKETS = (0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+
+_NO_SPAN = nullcontext()
+
+Labels = tuple[tuple[str, str], ...]
+
+
+class Telemetry:
+    # No-op default: instrumented hot paths pay one empty call per metric.
+    # Metric names follow Prometheus conventions (llm_requests_total, ...).
+    # pylint: disable=unused-argument
+    def count(self, name: str, value: float = 1, **labels: str) -> None:
+        pass
+
+    def observe(self, name: str, value: float, **labels: str) -> None:
+        pass
+
+    def span(self, name: str, **attributes: str) -> AbstractContextManager:
+        return _NO_SPAN
+
+
+class PrometheusTelemetry(Telemetry):
+    # In-process counters and histograms rendered in the Prometheus text
+    # exposition format; spans are timed into <name>_seconds histograms.
+    def __init__(self, buckets: tuple[float, ...] = DEFAULT_BUCKETS) -> None:
+        self.buckets = buckets
+        self._counters: dict[str, dict[Labels, float]] = {}
+        self._histograms: dict[str, dict[Labels, list[float]]] = {}
+
+    def count(self, name: str, value: float = 1, **labels: str) -> None:
+        series = self._counters.setdefault(name, {})
+        key = tuple(sorted(labels.items()))
+        series[key] = series.get(key, 0) + value
+
+    def observe(self, name: str, value: float, **labels: str) -> None:
+        series = self._histograms.setdefault(name, {})
+        key = tuple(sorted(labels.items()))
+        # One slot per bucket, then +Inf, sum and count
+        if (state := series.get(key)) is None:
+            state = series[key] = [0.0] * (len(self.buckets) + 3)
+        state[bisect.bisect_left(self.buckets, value)] += 1
+        state[-2] += value
+        state[-1] += 1
+
+    @contextmanager
+    def span(self, name: str, **attributes: str) -> Iterator[None]:
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(
+                f"{re.sub(r'[^a-zA-Z0-9_]', '_', name)}_seconds",
+                time.perf_counter() - start,
+                **attributes,
+            )
+
+    def value(self, name: str, **labels: str) -> float:
+        return self._counters.get(name, {}).get(tuple(sorted(labels.items())), 0)
+
+    def histogram_count(self, name: str, **labels: str) -> int:
+        state = self._histograms.get(name, {}).get(tuple(sorted(labels.items())))
+        return int(state[-1]) if state else 0
+
+    def render(self) -> str:
+        lines = []
+        for name, series in sorted(self._counters.items()):
+            lines.append(f"# TYPE {name} counter")
+            for labels, value in sorted(series.items()):
+                lines.append(f"{name}{_format(labels)} {value:g}")
+        for name, series in sorted(self._histograms.items()):
+            lines.append(f"# TYPE {name} histogram")
+            for labels, state in sorted(series.items()):
+                cumulative = 0.0
+                bounds = [f"{b:g}" for b in self.buckets] + ["+Inf"]
+                for bound, count in zip(bounds, state):
+                    cumulative += count
+                    lines.append(
+                        f"{name}_bucket{_format(labels + (('le', bound),))} {cumulative:g}"
+                    )
+                lines.append(f"{name}_sum{_format(labels)} {state[-2]:g}")
+                lines.append(f"{name}_count{_format(labels)} {state[-1]:g}")
+        return "\n".join(lines) + "\n"
+
+
+class OpenTelemetryTelemetry(Telemetry):
+    # Forwards to whatever MeterProvider / TracerProvider the process has
+    # configured, so the usual OTLP or Prometheus exporters apply.
+    def __init__(self, name: str = "llm") -> None:
+        try:
+            # pylint: disable=import-outside-toplevel,import-error
+            from opentelemetry import metrics, trace
+        except ImportError as exc:
+            raise ImportError(
+                "OpenTelemetryTelemetry needs opentelemetry-api: "
+                "pip install opentelemetry-api"
+            ) from exc
+
+        self._meter = metrics.get_meter(name)
+        self._tracer = trace.get_tracer(name)
+        self._counters: dict = {}
+        self._histograms: dict = {}
+
+    def count(self, name: str, value: float = 1, **labels: str) -> None:
+        if (counter := self._counters.get(name)) is None:
+            counter = self._counters[name] = self._meter.create_counter(name)
+        counter.add(value, labels)
+
+    def observe(self, name: str, value: float, **labels: str) -> None:
+        if (histogram := self._histograms.get(name)) is None:
+            histogram = self._histograms[name] = self._meter.create_histogram(name)
+        histogram.record(value, labels)
+
+    def span(self, name: str, **attributes: str) -> AbstractContextManager:
+        return self._tracer.start_as_current_span(name, attributes=attributes)
+
+
+def _format(labels: Labels) -> str:
+    if not labels:
+        return ""
+    escaped = (
+        (k, v.replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n"))
+        for k, v in labels
+    )
+    return "{" + ",".join(f'{k}="{v}"' for k, v in escaped) + "}"
+
+
+_telemetry = Telemetry()
+
+
+def telemetry() -> Telemetry:
+    return _telemetry
+
+
+def install(instance: Telemetry) -> Telemetry:
+    # pylint: disable=global-statement
+    global _telemetry
+    _telemetry = instance
+    return _telemetry
@@ -0,0 +1,34 @@
+import json
+
+import pytest
+
+
+@pytest.fixture(name="job_file")
+def fixture_job_file(tmp_path):
+    path = tmp_path / "jobs.jsonl"
+    path.write_text(
+        "\n".join(
+            json.dumps(job)
+            for job in [
+                {
+                    "id": "suv",
+                    "kind": "list",
+                    "templates": [
+                        "Which [insert written number] brands stand out to you the most in [insert product category]?",
+                        "Think of [insert product category]. What are the first [insert written number] brands that you think of?",
+                    ],
+                    "category": "Luxury SUVs",
+                    "number": 3,
+                    "iterations": 40,
+                    "temperature": 0.1,
+                },
+                {
+                    "id": "vintage",
+                    "kind": "choice",
+                    "template": "Which vintage car is the best - Volvo or Saab?",
+                    "iterations": 30,
+                },
+            ]
+        )
+    )
+    return str(path)
@@ -0,0 +1,67 @@
+from aggregate import CountMinSketch, VoteAggregator
+
+
+def test_counts_by_position():
+    stats = VoteAggregator(positions=3)
+    stats.add(["Land Rover", "BMW", "Audi"])
+    stats.add(["BMW", "Land Rover", "Audi", "Lexus"])
+    stats.add(["Audi"])
+    stats.add([])
+    assert stats.samples == 3
+    assert stats.empty == 1
+    assert stats.counts("BMW") == [1, 1, 0]
+    assert stats.counts("Lexus") == [0, 0, 0]
+    assert stats.table()[0] == ["Land Rover", 1, 1, 0]
+    assert stats.table()[2] == ["Audi", 1, 0, 2]
+    assert stats.top(1) == [("Audi", 3, 0)]
+
+
+def test_grows_past_initial_rows():
+    stats = VoteAggregator(positions=1)
+    for i in range(0, 500):
+        stats.add([f"brand {i}"])
+    assert len(stats) == 500
+    assert stats.counts("brand 499") == [1]
+
+
+def test_space_saving_keeps_heavy_hitters():
+    stats = VoteAggregator(positions=1, capacity=10)
+    for i in range(0, 1000):
+        stats.add(["Mercedes-Benz"] if i % 2 else [f"variant {i}"])
+    assert len(stats) == 10
+    brand, total, error = stats.top(1)[0]
+    assert brand == "Mercedes-Benz"
+    assert total - error <= 500 <= total
+
+
+def test_merge():
+    first = VoteAggregator(positions=2)
+    second = VoteAggregator(positions=2)
+    first.add(["BMW", "Audi"])
+    second.add(["Audi", "BMW"])
+    second.add(["Audi", "Porsche"])
+    first.merge(second)
+    assert first.samples == 3
+    assert first.counts("Audi") == [2, 1]
+    assert first.estimate("Porsche") == 1
+
+
+def test_count_min_sketch():
+    sketch = CountMinSketch(width=64, depth=4)
+    for i in range(0, 200):
+        sketch.add(f"brand {i % 20}")
+    assert all(sketch.estimate(f"brand {i}") >= 10 for i in range(0, 20))
+    assert sketch.estimate("unseen") <= 200
+
+
+def test_round_trip():
+    stats = VoteAggregator(positions=2, capacity=3)
+    for answers in [["BMW", "Audi"], ["Audi", "Lexus"], ["Porsche", "BMW"], []]:
+        stats.add(answers)
+    restored = VoteAggregator.from_dict(stats.to_dict())
+    assert restored.table() == stats.table()
+    assert restored.top() == stats.top()
+    assert restored.empty == 1
+    assert restored.estimate("Lexus") == stats.estimate("Lexus")
+    restored.add(["Volvo"])
+    assert len(restored) == 3
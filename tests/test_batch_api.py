@@ -0,0 +1,101 @@
+import json
+
+import pytest
+
+from batch_api import BATCH_RUNNING, BatchError, LocalBatchEndpoint
+from mock_llm_call import Behavior, Model as Mock, constant
+from router import Model as Router
+
+
+@pytest.mark.asyncio
+async def test_choice_from_pair_batch():
+    model = Mock(Behavior(seed=1))
+    questions = [f"Volvo or Saab? ({i})" for i in range(0, 50)]
+    seen = set()
+    async for i, choice in model.choice_from_pair_batch(
+        questions, 1.0, poll_interval=0
+    ):
+        assert choice.answer in {"Volvo", "Saab"}
+        seen.add(i)
+    assert seen == set(range(0, 50))
+    # Batches never touch the live request path
+    assert model.observed_rpm == 0
+
+
+@pytest.mark.asyncio
+async def test_ask_for_list_batch():
+    model = Mock(Behavior(seed=1))
+    results = [
+        response
+        async for _, response in model.ask_for_list_batch(
+            3, ["Top luxury SUV brands?"] * 20, 0.1, poll_interval=0
+        )
+    ]
+    assert len(results) == 20
+    assert all(len(r.answers) == 3 for r in results)
+
+
+@pytest.mark.asyncio
+async def test_online_fallback_without_batch_api():
+    # The router has no batch endpoint, so requests go out one by one
+    backend = Mock(Behavior(seed=1, latency=constant(0.0)))
+    router = Router([backend])
+    assert not router.has_batch_api
+    seen = set()
+    async for i, choice in router.choice_from_pair_batch(
+        [f"Volvo or Saab? ({i})" for i in range(0, 10)], 1.0, poll_interval=0
+    ):
+        assert choice.answer in {"Volvo", "Saab"}
+        seen.add(i)
+    assert seen == set(range(0, 10))
+    assert backend.observed_rpm > 0
+
+
+@pytest.mark.asyncio
+async def test_local_endpoint_polls_until_done(tmp_path):
+    async def respond(line):
+        return {"echo": line["n"]}
+
+    endpoint = LocalBatchEndpoint(respond, str(tmp_path), polls_until_done=2)
+    job_id = await endpoint.submit([{"n": 1}, {"n": 2}])
+    assert await endpoint.poll(job_id) == BATCH_RUNNING
+    assert await endpoint.poll(job_id) == BATCH_RUNNING
+    assert await endpoint.poll(job_id) != BATCH_RUNNING
+    assert await endpoint.results(job_id) == [{"echo": 1}, {"echo": 2}]
+    with pytest.raises(BatchError):
+        await endpoint.poll("missing")
+
+
+@pytest.mark.asyncio
+async def test_gemini_batch_lines(monkeypatch):
+    monkeypatch.setenv("GOOGLE_API_KEY", "test")
+    # pylint: disable=import-outside-toplevel
+    from gemini_llm_call import Model as Gemini
+
+    async def respond(line):
+        answer = "Volvo" if "Volvo" in json.dumps(line["request"]) else "{}"
+        return {
+            "key": line["key"],
+            "response": {
+                "candidates": [
+                    {
+                        "content": {"role": "model", "parts": [{"text": answer}]},
+                        "logprobsResult": {
+                            "chosenCandidates": [{"logProbability": -0.5}]
+                        },
+                    }
+                ],
+                "usageMetadata": {"promptTokenCount": 12, "candidatesTokenCount": 1},
+            },
+        }
+
+    model = Gemini(batch_backend=LocalBatchEndpoint(respond))
+    choices = [
+        choice
+        async for _, choice in model.choice_from_pair_batch(
+            ["Volvo or Saab?"], 1.0, poll_interval=0
+        )
+    ]
+    assert choices[0].answer == "Volvo"
+    assert choices[0].input_tokens == 12
+    assert 0.6 < choices[0].probability < 0.61
@@ -0,0 +1,149 @@
+import asyncio
+import json
+
+import pytest
+
+from batch_runner import (
+    BatchRunner,
+    ShardedRunner,
+    from_ranges,
+    load_jobs,
+    to_ranges,
+)
+from mock_llm_call import Behavior, Model as Mock, constant
+from rate_limit import Quota
+from scheduler import Scheduler
+
+
+def test_ranges():
+    assert to_ranges({0, 1, 2, 5, 7, 8}) == [[0, 3], [5, 6], [7, 9]]
+    assert from_ranges([[0, 3], [5, 6]]) == {0, 1, 2, 5}
+
+
+def test_load_jobs(job_file):
+    jobs = load_jobs(job_file)
+    assert len(jobs) == 2
+    suv, vintage = jobs[0], jobs[1]
+    assert suv.question(1).startswith("Think of Luxury SUVs. What are the first 3")
+    assert vintage.templates == ["Which vintage car is the best - Volvo or Saab?"]
+    assert vintage.positions == 1
+
+
+@pytest.mark.asyncio
+async def test_run(job_file, tmp_path):
+    model = Mock(Behavior(seed=1, latency=constant(0.0)), parallelism=8)
+    checkpoint = str(tmp_path / "checkpoint.json")
+    results = await BatchRunner(model, load_jobs(job_file), checkpoint).run()
+    assert results["suv"].samples == 40
+    assert (
+        sum(results["vintage"].counts("Volvo") + results["vintage"].counts("Saab"))
+        == 30
+    )
+    with open(checkpoint, encoding="utf-8") as f:
+        assert json.load(f)["jobs"]["suv"]["completed"] == [[0, 40]]
+
+
+@pytest.mark.asyncio
+async def test_resume(job_file, tmp_path):
+    model = Mock(Behavior(seed=1, latency=constant(0.0)), parallelism=8)
+    checkpoint = str(tmp_path / "checkpoint.json")
+    jobs = load_jobs(job_file)
+    interrupted = BatchRunner(model, jobs, checkpoint)
+    for job, i in list(interrupted.pending())[:25]:
+        await interrupted.run_one(job, i)
+    interrupted.checkpoint()
+
+    resumed = BatchRunner(model, jobs, checkpoint)
+    assert len(list(resumed.pending())) == 70 - 25
+    results = await resumed.run()
+    assert results["suv"].samples == 40
+    assert not list(resumed.pending())
+
+
+@pytest.mark.asyncio
+async def test_failed_iterations_stay_pending(job_file, tmp_path):
+    checkpoint = str(tmp_path / "checkpoint.json")
+    jobs = load_jobs(job_file)
+    flaky = Mock(
+        Behavior(seed=1, latency=constant(0.0), error_rates={503: 0.3}),
+        parallelism=8,
+    )
+    first = BatchRunner(flaky, jobs, checkpoint)
+    results = await first.run()
+    failed = sum(first.failures.values())
+    assert failed > 0
+    assert results["suv"].empty == 0
+    assert len(list(first.pending())) == failed
+
+    resumed = BatchRunner(
+        Mock(Behavior(seed=1, latency=constant(0.0)), parallelism=8), jobs, checkpoint
+    )
+    assert resumed.failures == first.failures
+    results = await resumed.run()
+    assert results["suv"].samples == 40
+    assert not list(resumed.pending())
+
+
+def test_shards_partition_iterations(job_file, tmp_path):
+    model = Mock(Behavior(seed=1))
+    jobs = load_jobs(job_file)
+
+    def pending(**shard):
+        runner = BatchRunner(model, jobs, str(tmp_path / "checkpoint.json"), **shard)
+        return [(job.id, i) for job, i in runner.pending()]
+
+    shards = [pending(shard=s, shards=3) for s in range(0, 3)]
+    assert sorted(sum(shards, [])) == sorted(pending())
+    assert [i for job_id, i in shards[1] if job_id == "vintage"][:3] == [1, 4, 7]
+
+
+@pytest.mark.asyncio
+async def test_sharded_run_merges_tallies_and_costs(job_file, tmp_path):
+    checkpoint = str(tmp_path / "checkpoint.json")
+    runner = ShardedRunner("mock", load_jobs(job_file), checkpoint, shards=2)
+    results = await runner.run()
+    assert results["suv"].samples == 40
+    assert (
+        sum(results["vintage"].counts("Volvo") + results["vintage"].counts("Saab"))
+        == 30
+    )
+    # Identical questions are pooled into multi-sample requests
+    assert 0 < runner.ledger.total().requests < 70
+    assert runner.ledger.total(job="suv").input_tokens > 0
+    with open(runner.shard_checkpoint(1), encoding="utf-8") as f:
+        assert json.load(f)["jobs"]["vintage"]["completed"] == [
+            [i, i + 1] for i in range(1, 30, 2)
+        ]
+
+
+def test_shard_limits_split_quota_and_concurrency():
+    model = Mock(Behavior(seed=1), parallelism=100, quota=Quota(rpm=1000, tpm=90_000))
+    model.split_limits(4)
+    assert model.quota == Quota(rpm=250, tpm=22_500)
+    assert model.parallelism == 2
+
+
+@pytest.mark.asyncio
+async def test_run_through_scheduler(job_file, tmp_path):
+    model = Mock(Behavior(seed=1, latency=constant(0.0)), parallelism=8)
+    scheduler = Scheduler(model, capacity=4)
+    checkpoint = str(tmp_path / "checkpoint.json")
+    runner = BatchRunner(model, load_jobs(job_file), checkpoint, scheduler=scheduler)
+    results = await runner.run()
+    assert results["suv"].samples == 40
+    assert scheduler.in_flight == 0
+
+
+@pytest.mark.asyncio
+async def test_cancelled_job_leaves_others_running(job_file, tmp_path):
+    model = Mock(Behavior(seed=1, latency=constant(0.01)), parallelism=8)
+    scheduler = Scheduler(model, capacity=4)
+    checkpoint = str(tmp_path / "checkpoint.json")
+    runner = BatchRunner(model, load_jobs(job_file), checkpoint, scheduler=scheduler)
+    run = asyncio.create_task(runner.run())
+    await asyncio.sleep(0.02)
+    assert scheduler.cancel("suv") > 0
+    results = await run
+    assert runner.cancelled == {"suv"}
+    assert results["suv"].samples < 40
+    assert results["vintage"].samples == 30
@@ -0,0 +1,28 @@
+import pytest
+
+from benchmark import report, run_level
+from mock_llm_call import Behavior, Model as Mock, constant
+
+
+@pytest.mark.asyncio
+async def test_run_level():
+    model = Mock(
+        Behavior(seed=1, latency=constant(0.001), error_rates={503: 0.1, 429: 0.05})
+    )
+    result = await run_level(model, "choice", 20, 200)
+    assert result.requests == 200
+    assert 0 < result.p50 <= result.p95 <= result.p99
+    # Swallowed HTTP errors are reported by status, not as empty answers
+    assert result.errors.get("http_503", 0) > 0
+    assert result.errors.get("http_429", 0) > 0
+    assert "empty" not in result.errors
+    assert result.error_rate == sum(result.errors.values()) / 200
+    assert result.cpu_per_request_ms > 0
+    print(f"\n{report([result])}")
+
+
+@pytest.mark.asyncio
+async def test_run_level_list():
+    model = Mock(Behavior(seed=1, latency=constant(0.001)))
+    result = await run_level(model, "list", 10, 50)
+    assert result.errors == {}
@@ -0,0 +1,69 @@
+import time
+
+import pytest
+
+from cache import ResponseCache
+from ledger import CostLedger
+from mock_llm_call import Behavior, Model as Mock, constant
+
+
+@pytest.mark.asyncio
+async def test_cache(tmp_path):
+    model = Mock(
+        Behavior(seed=1, latency=constant(0.0)),
+        cache=ResponseCache(str(tmp_path / "cache.sqlite")),
+        ledger=CostLedger(),
+    )
+    first = await model.ask_generic_question("", "Volvo or Saab?", 0.0, False)
+    assert first.input_tokens > 0
+    for _ in range(0, 10):
+        again = await model.ask_generic_question("", "Volvo or Saab?", 0.0, False)
+        assert again.answer == first.answer
+        # Hits cost nothing
+        assert again.input_tokens == again.output_tokens == 0
+    assert model.observed_rpm == 1
+    assert model.ledger.total().requests == 1
+
+
+def test_default_temperature_bypasses_cache(tmp_path):
+    cache = ResponseCache(str(tmp_path / "cache.sqlite"))
+    assert not cache.bypass(0.0)
+    assert cache.bypass(None)
+    assert cache.bypass(0.7)
+
+
+def test_expired_entries_are_dropped(tmp_path):
+    cache = ResponseCache(str(tmp_path / "cache.sqlite"), ttl=0.05)
+    cache.put("old", ["a"])
+    time.sleep(0.1)
+    cache.put("new", ["b"])
+    assert cache.get("old") is None
+    assert cache.get("new") == ["b"]
+    cache.evict()
+    assert cache.get("new") == ["b"]
+
+
+def test_least_recently_used_are_evicted_first(tmp_path):
+    cache = ResponseCache(str(tmp_path / "cache.sqlite"), max_entries=3)
+    for key in ["a", "b", "c"]:
+        cache.put(key, [key])
+        time.sleep(0.001)
+    # Reading "a" makes "b" the least recently used
+    assert cache.get("a") == ["a"]
+    time.sleep(0.001)
+    cache.put("d", ["d"])
+    assert cache.get("b") is None
+    assert [cache.get(key) for key in ["a", "c", "d"]] == [["a"], ["c"], ["d"]]
+
+
+def test_size_cap_holds_on_every_put(tmp_path):
+    path = str(tmp_path / "cache.sqlite")
+    cache = ResponseCache(path, max_entries=10)
+    for i in range(0, 99):
+        cache.put(f"k{i}", [i])
+        # Overwriting a key doesn't add a row
+        cache.put(f"k{i}", [i])
+    cache.close()
+    cache = ResponseCache(path, max_entries=10)
+    assert sum(cache.get(f"k{i}") is not None for i in range(0, 99)) == 10
+    assert cache.get("k98") == [98]
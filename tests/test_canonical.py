@@ -0,0 +1,52 @@
+import pytest
+
+from canonical import BrandCanonicalizer
+from mock_llm_call import Behavior, Model as Mock, constant
+
+
+@pytest.mark.parametrize(
+    "answer, brand",
+    [
+        ("Land Rover", "Land Rover"),
+        ("Range Rover", "Land Rover"),
+        ("Land Rover (Range Rover)", "Land Rover"),
+        ("Land Rover/Range Rover", "Land Rover"),
+        ("Land Rover (Range Rover SV)", "Land Rover"),
+        ("Mercedes-Benz G-Class (G-Wagen)", "Mercedes-Benz"),
+        ("Mercedes-Benz (G-Wagen/GLS)", "Mercedes-Benz"),
+        ("Mercedes-Maybach", "Mercedes-Benz"),
+        ("BMW (X5/X7)", "BMW"),
+        ("BMW X-Series", "BMW"),
+        ("Cadillac (Escalade)", "Cadillac"),
+        ("Rolls-Royce Cullinan", "Rolls-Royce"),
+        ("Porshe", "Porsche"),
+        ("Tesla", "Tesla"),
+        ("Tesla (Model X)", "Tesla"),
+    ],
+)
+def test_canonical(answer, brand):
+    assert BrandCanonicalizer().canonical(answer) == brand
+
+
+def test_canonicalize_merges_duplicates_in_order():
+    canonicalizer = BrandCanonicalizer()
+    assert canonicalizer.canonicalize(
+        ["Land Rover", "Range Rover", "Mercedes-Benz", "BMW X7", "Lexus"]
+    ) == ["Land Rover", "Mercedes-Benz", "BMW", "Lexus"]
+
+
+def test_custom_aliases():
+    canonicalizer = BrandCanonicalizer({"Volvo": ["Polestar"]})
+    assert canonicalizer.canonical("Polestar 2") == "Volvo"
+    assert canonicalizer.canonical("Range Rover") == "Range Rover"
+
+
+@pytest.mark.asyncio
+async def test_canonical_list():
+    model = Mock(
+        Behavior(seed=1, latency=constant(0.0)), canonicalizer=BrandCanonicalizer()
+    )
+    for _ in range(0, 20):
+        answers = await model.ask_for_list(5, "Top luxury SUV brands?", "", 0.1)
+        assert "Range Rover" not in answers.answers
+        assert len(answers.answers) == len(set(answers.answers))
@@ -0,0 +1,77 @@
+import asyncio
+
+import pytest
+
+from clients import ClientRegistry, PoolLimits, httpx_transport
+from mock_llm_call import Model as Mock
+
+
+def closing(closed: list[str], name: str):
+    async def close():
+        closed.append(name)
+
+    return lambda limits: (object(), close)
+
+
+@pytest.mark.asyncio
+async def test_clients_are_shared_until_closed():
+    closed = []
+    async with ClientRegistry() as clients:
+        first = clients.get("a", closing(closed, "a"))
+        assert clients.get("a", closing(closed, "a")) is first
+        assert "a" in clients and "b" not in clients
+        await clients.close()
+        assert closed == ["a"]
+        assert clients.get("a", closing(closed, "a")) is not first
+    assert closed == ["a", "a"]
+
+
+def test_clients_are_per_event_loop():
+    clients = ClientRegistry()
+
+    async def get():
+        return clients.get("a", closing([], "a"))
+
+    assert asyncio.run(get()) is not asyncio.run(get())
+
+
+@pytest.mark.asyncio
+async def test_model_closes_registry():
+    closed = []
+    clients = ClientRegistry(PoolLimits(max_connections=10))
+    async with Mock(clients=clients) as model:
+        model.clients.get("mock", closing(closed, "mock"))
+    assert closed == ["mock"]
+
+
+@pytest.mark.asyncio
+async def test_closing_one_model_keeps_shared_clients_open():
+    closed = []
+    clients = ClientRegistry()
+    first, second = Mock(clients=clients), Mock(clients=clients)
+    client = first.clients.get("mock", closing(closed, "mock"))
+    await first.close()
+    await first.close()
+    assert not closed
+    assert second.clients.get("mock", closing(closed, "mock")) is client
+    await second.close()
+    assert closed == ["mock"]
+
+
+@pytest.mark.asyncio
+async def test_gemini_models_share_pool(monkeypatch):
+    monkeypatch.setenv("GOOGLE_API_KEY", "test")
+    # pylint: disable=import-outside-toplevel
+    from gemini_llm_call import pooled_client
+
+    clients = ClientRegistry()
+    first = clients.get("gemini", lambda limits: pooled_client(limits, "v1"))
+    second = clients.get("gemini", lambda limits: pooled_client(limits, "v1"))
+    assert first is second
+    await clients.close()
+
+
+@pytest.mark.asyncio
+async def test_httpx_transport_limits():
+    transport = httpx_transport(PoolLimits(max_connections=5, http2=False))
+    await transport.aclose()
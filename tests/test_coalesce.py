@@ -0,0 +1,66 @@
+import asyncio
+
+import pytest
+
+from ledger import CostLedger
+from mock_llm_call import Behavior, Model as Mock, constant
+
+
+@pytest.mark.asyncio
+async def test_identical_deterministic_requests_share_one_call():
+    ledger = CostLedger()
+    model = Mock(Behavior(seed=1, latency=constant(0.01)), ledger=ledger)
+    answers = await asyncio.gather(
+        *[
+            model.ask_generic_question("", "Volvo or Saab?", 0.0, False)
+            for _ in range(0, 50)
+        ]
+    )
+    assert ledger.total().requests == 1
+    assert len({a.answer for a in answers}) == 1
+
+
+@pytest.mark.asyncio
+async def test_cancelled_caller_leaves_shared_call_running():
+    model = Mock(Behavior(seed=1, latency=constant(0.02)))
+    first = asyncio.create_task(
+        model.ask_generic_question("", "Volvo or Saab?", 0.0, False)
+    )
+    second = asyncio.create_task(
+        model.ask_generic_question("", "Volvo or Saab?", 0.0, False)
+    )
+    await asyncio.sleep(0.005)
+    first.cancel()
+    assert (await second).answer in {"Volvo", "Saab"}
+
+
+@pytest.mark.asyncio
+async def test_identical_stochastic_requests_are_pooled():
+    ledger = CostLedger()
+    model = Mock(Behavior(seed=1, latency=constant(0.0)), ledger=ledger)
+    choices = await asyncio.gather(
+        *[model.choice_from_pair("Volvo or Saab?", 1.0, 1) for _ in range(0, 20)]
+    )
+    assert all(c.answer in {"Volvo", "Saab"} for c in choices)
+    # 8 samples per request
+    assert ledger.total().requests == 3
+
+    distinct = await asyncio.gather(
+        *[model.choice_from_pair(f"Volvo or Saab? #{i}", 1.0, 1) for i in range(0, 5)]
+    )
+    assert len(distinct) == 5
+    assert ledger.total().requests == 3 + 5
+
+
+@pytest.mark.asyncio
+async def test_default_temperature_is_stochastic():
+    # None leaves the provider's default temperature, so each caller still
+    # gets its own sample rather than a copy of one shared answer
+    ledger = CostLedger()
+    model = Mock(Behavior(seed=1, latency=constant(0.0)), ledger=ledger)
+    assert model.cache_key("", "Volvo or Saab?", None, None) is None
+    choices = await asyncio.gather(
+        *[model.choice_from_pair("Volvo or Saab?", None, 1) for _ in range(0, 20)]
+    )
+    assert len({c.answer for c in choices}) == 2
+    assert ledger.total().requests == 3
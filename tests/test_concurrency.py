@@ -0,0 +1,83 @@
+import asyncio
+
+import pytest
+
+from concurrency import AdaptiveLimiter
+from mock_llm_call import Behavior, Model as Mock, constant
+
+
+def model(limiter: AdaptiveLimiter, **behavior) -> Mock:
+    return Mock(Behavior(seed=1, latency=constant(0.0), **behavior), limiter=limiter)
+
+
+async def ask(m: Mock, times: int = 1) -> None:
+    for _ in range(0, times):
+        await m.choice_from_pair("Volvo or Saab?", 1.0, 1)
+
+
+@pytest.mark.asyncio
+async def test_slow_start_grows_by_one_per_success():
+    limiter = AdaptiveLimiter(initial_limit=2, max_limit=100)
+    await ask(model(limiter), 5)
+    assert limiter.limit == 7
+
+
+@pytest.mark.asyncio
+async def test_limit_capped_at_max():
+    limiter = AdaptiveLimiter(initial_limit=2, max_limit=4)
+    await ask(model(limiter), 10)
+    assert limiter.limit == 4
+
+
+@pytest.mark.asyncio
+async def test_throttle_cuts_multiplicatively_down_to_floor():
+    limiter = AdaptiveLimiter(initial_limit=16, min_limit=3, backoff=0.5)
+    m = model(limiter, error_rates={429: 1.0})
+    await ask(m)
+    assert limiter.limit == 8
+    await ask(m)
+    assert limiter.limit == 4
+    await ask(m, 3)
+    assert limiter.limit == 3
+
+
+@pytest.mark.asyncio
+async def test_one_backoff_per_burst():
+    # Requests already in flight when the limit is cut don't cut it again
+    limiter = AdaptiveLimiter(initial_limit=8, backoff=0.5)
+    m = model(limiter, error_rates={429: 1.0})
+    await asyncio.gather(*(ask(m) for _ in range(0, 8)))
+    assert limiter.limit == 4
+
+
+@pytest.mark.asyncio
+async def test_additive_increase_after_throttle():
+    limiter = AdaptiveLimiter(initial_limit=10, backoff=0.5)
+    m = model(limiter, error_rates={429: 1.0})
+    await ask(m)
+    assert limiter.limit == 5
+    # Out of slow start: +1/limit per success, so one step per ~limit calls
+    m.behavior.error_rates = {}
+    await ask(m, 4)
+    assert limiter.limit == 5
+    await ask(m, 2)
+    assert limiter.limit == 6
+
+
+@pytest.mark.asyncio
+async def test_in_flight_never_exceeds_limit():
+    limiter = AdaptiveLimiter(initial_limit=3, max_limit=3)
+    m = Mock(Behavior(seed=1, latency=constant(0.01)), limiter=limiter)
+    peak = 0
+
+    async def watch():
+        nonlocal peak
+        while True:
+            peak = max(peak, limiter.in_flight)
+            await asyncio.sleep(0)
+
+    watcher = asyncio.create_task(watch())
+    await asyncio.gather(*(m.ask_for_list(3, f"q{i}", "", 1.0) for i in range(20)))
+    watcher.cancel()
+    assert 0 < peak <= 3
+    assert limiter.in_flight == 0
@@ -0,0 +1,59 @@
+import pytest
+
+from concurrency import AdaptiveLimiter
+from mock_llm_call import Behavior, Model as Mock, constant
+
+QUESTIONS = [
+    "Which car is the best - Volvo or Saab?",
+    "Why?",
+    "And which is safer?",
+]
+
+
+@pytest.mark.asyncio
+async def test_conversation_keeps_turns_in_order():
+    model = Mock(Behavior(seed=1, latency=constant(0.001)))
+    conversation = await model.conversation(QUESTIONS, 1.0)
+    assert conversation.complete
+    assert [a.question for a in conversation.conversation.values()] == QUESTIONS
+    assert conversation.input_tokens == 3 * model.behavior.input_tokens
+
+
+@pytest.mark.asyncio
+async def test_turn_retries_do_not_lose_history():
+    model = Mock(Behavior(seed=3, latency=constant(0.001), error_rates={503: 0.3}))
+    conversations = await model.conversations(
+        [QUESTIONS] * 20, 1.0, retries=10, backoff=0.001
+    )
+    assert all(c.complete for c in conversations)
+    assert all(len(c.conversation) == 3 for c in conversations)
+
+
+class FailsAfterFirstTurn(Mock):
+    async def ask_with_history(self, system_prompt, history, question, temperature):
+        responses = await super().ask_with_history(
+            system_prompt, history, question, temperature
+        )
+        self.behavior.error_rates = {500: 1.0}
+        return responses
+
+
+@pytest.mark.asyncio
+async def test_exhausted_turn_keeps_earlier_turns():
+    model = FailsAfterFirstTurn(Behavior(seed=1, latency=constant(0.001)))
+    conversation = await model.converse(QUESTIONS, 1.0, retries=0)
+    assert not conversation.complete
+    assert [a.question for a in conversation.conversation.values()] == QUESTIONS[:1]
+    assert conversation.conversation[0].answers[0] in {"Volvo", "Saab"}
+    assert conversation.input_tokens == model.behavior.input_tokens
+
+
+@pytest.mark.asyncio
+async def test_sessions_share_the_limiter():
+    # Anything above 4 in flight would be rejected with 429 and, with no
+    # retries, leave a conversation incomplete
+    limiter = AdaptiveLimiter(initial_limit=4, min_limit=4, max_limit=4)
+    model = Mock(Behavior(seed=1, latency=constant(0.002), capacity=4), limiter=limiter)
+    conversations = await model.conversations([QUESTIONS] * 50, 1.0, retries=0)
+    assert all(c.complete for c in conversations)
+    assert limiter.in_flight == 0
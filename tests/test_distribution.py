@@ -0,0 +1,96 @@
+import math
+
+import pytest
+from together.types import ChatCompletionResponse
+
+from mock_llm_call import Behavior, Model as Mock, constant
+from sampler import LOGPROBS, SAMPLING, SequentialSampler, option_probabilities
+from together_llm_call import Model as TLlama
+
+
+class NoLogprobs(Mock):
+    @property
+    def has_logprob(self) -> bool:
+        return False
+
+
+def test_option_probabilities():
+    probabilities, coverage = option_probabilities(
+        {"Vol": 0.6, " Sa": 0.3, "S": 0.05, "The": 0.05}, ["Volvo", "Saab", "Subaru"]
+    )
+    assert probabilities == pytest.approx({"Volvo": 0.6 / 0.9, "Saab": 0.3 / 0.9})
+    assert coverage == pytest.approx(0.9)
+    assert option_probabilities({"**": 1.0}) == ({}, 0.0)
+
+
+@pytest.mark.asyncio
+async def test_distribution_from_one_request():
+    model = Mock(Behavior(seed=1, latency=constant(0.0)))
+    distribution = await SequentialSampler(model).distribution(
+        "Volvo or Saab?", 1.0, ["Volvo", "Saab"]
+    )
+    assert distribution.method == LOGPROBS
+    assert distribution.requests == 1
+    assert distribution.probabilities == pytest.approx({"Volvo": 0.6, "Saab": 0.4})
+    assert distribution.interval("Volvo") == 0.0
+
+
+@pytest.mark.asyncio
+async def test_distribution_falls_back_to_sampling():
+    model = NoLogprobs(Behavior(seed=1, latency=constant(0.0)))
+    distribution = await SequentialSampler(model, budget=500).distribution(
+        "Volvo or Saab?", 1.0
+    )
+    assert distribution.method == SAMPLING
+    assert distribution.samples >= 30
+    assert distribution.ranked()[0][0] == "Volvo"
+    assert distribution.interval("Volvo") > 0
+
+
+def test_gemini_alternatives(monkeypatch):
+    monkeypatch.setenv("GOOGLE_API_KEY", "test")
+    # pylint: disable=import-outside-toplevel
+    from google.genai import types
+
+    from gemini_llm_call import Model as Gemini
+
+    candidate = types.Candidate.model_validate(
+        {
+            "content": {"parts": [{"text": "Volvo"}]},
+            "logprobsResult": {
+                "chosenCandidates": [{"token": "Vol", "logProbability": -0.5}],
+                "topCandidates": [
+                    {
+                        "candidates": [
+                            {"token": "Vol", "logProbability": -0.5},
+                            {"token": "Sa", "logProbability": -1.0},
+                        ]
+                    }
+                ],
+            },
+        }
+    )
+    assert Gemini.candidate_alternatives(candidate) == pytest.approx(
+        {"Vol": math.exp(-0.5), "Sa": math.exp(-1.0)}
+    )
+
+
+def test_together_alternatives():
+    response = ChatCompletionResponse.model_validate(
+        {
+            "choices": [
+                {
+                    "message": {"role": "assistant", "content": "Volvo"},
+                    "logprobs": {
+                        "tokens": ["Vol", "vo"],
+                        "token_logprobs": [-0.5, -0.01],
+                        "top_logprobs": [{"Vol": -0.5, "Sa": -1.0}, {"vo": -0.01}],
+                    },
+                }
+            ]
+        }
+    )
+    (result,) = TLlama.simple_responses(response)
+    assert result.alternatives == pytest.approx(
+        {"Vol": math.exp(-0.5), "Sa": math.exp(-1.0)}
+    )
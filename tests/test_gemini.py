@@ -4,7 +4,9 @@ import time
 import pytest
 from tabulate import tabulate
 
+from aggregate import VoteAggregator
 from gemini_llm_call import Model as Gemini
+from sampler import SequentialSampler
 
 
 @pytest.mark.asyncio
@@ -16,10 +18,39 @@ async def test_choice():
     print(f"\n{answer}")
 
 
+@pytest.mark.asyncio
+async def test_choice_tally():
+    model = Gemini()
+    tally = await model.choice_tally(
+        "In one word, which vintage car is the best - Volvo or Saab? Must choose one. Do not include any explanations",
+        1.0,
+        100,
+    )
+    print(f"\n{tally.samples} samples in {tally.requests} requests")
+    for answer, count in tally.ranked():
+        print(
+            f"{answer}: {count} ({tally.share(answer):.3f} ± {tally.interval(answer):.3f}), mean p={tally.mean_probability(answer)}"
+        )
+
+
+@pytest.mark.asyncio
+async def test_choice_until_confident():
+    model = Gemini()
+    estimate = await SequentialSampler(model, budget=model.max_parallelism).choice(
+        "In one word, which vintage car is the best - Volvo or Saab? Must choose one. Do not include any explanations",
+        1.0,
+    )
+    tally = estimate.tally
+    print(
+        f"\nstopped ({estimate.stop_reason}) after {tally.samples} samples in {tally.requests} requests"
+    )
+    print("\n".join(f"{s}: {n}" for (s, n) in tally.ranked()))
+
+
 @pytest.mark.asyncio
 async def test_choices_at_scale():
     model = Gemini()
-    iterations = model.parallelism * 2
+    iterations = model.max_parallelism * 2
     counter = [0]
     stats = {"Bad": 0}
 
@@ -41,20 +72,23 @@ async def test_choices_at_scale():
                 stats[answer] = stats[answer] + 1
 
     start_time = time.perf_counter()
-    await asyncio.gather(*[run_calls(i) for i in range(0, model.parallelism)])
+    await asyncio.gather(*[run_calls(i) for i in range(0, model.max_parallelism)])
     results = sorted(list(stats.items()), key=lambda k: k[1], reverse=True)
     elapsed_time = time.perf_counter() - start_time
     print(
         f"\nfinished {iterations} -> {len(results)} calls in {elapsed_time:.2f} seconds"
     )
     print(f"Requests per Minute: {iterations / (elapsed_time / 60):.2f}")
+    print(
+        f"Live parallelism: {model.parallelism}, observed RPM: {model.observed_rpm:.2f}"
+    )
     print("\n".join(f"{s}: {n}" for (s, n) in results))
 
 
 @pytest.mark.asyncio
 async def test_list_stats():
     model = Gemini()
-    iterations = model.parallelism
+    iterations = model.max_parallelism
     questions = [
         "Which [insert written number] brands stand out to you the most in [insert product category]?",
         "When you hear [insert product category], which [insert written number] brands immediately come to your mind?",
@@ -64,7 +98,7 @@ async def test_list_stats():
     number = 5
     category = "Luxury SUVs"
     total_rounds = [iterations * len(questions)]
-    stats = {}
+    stats = VoteAggregator(positions=number)
     bad_responses = [0]
 
     async def run_calls(_):
@@ -78,15 +112,11 @@ async def test_list_stats():
             answers = await model.ask_for_list(number, qq, "", 0.1)
             if not answers.answers:
                 bad_responses[0] += 1
-            for i, answer in enumerate(answers.answers):
-                assert i < number
-                stats.setdefault(answer, [0 for _ in range(0, number)])
-                stat = stats[answer]
-                stat[i] += 1
-                stats[answer] = stat
+            assert len(answers.answers) <= number
+            stats.add_response(answers)
 
     start_time = time.perf_counter()
-    await asyncio.gather(*[run_calls(i) for i in range(0, model.parallelism)])
+    await asyncio.gather(*[run_calls(i) for i in range(0, model.max_parallelism)])
     elapsed_time = time.perf_counter() - start_time
     print(
         f"\nfinished {iterations} -> {iterations*len(questions)} calls in {elapsed_time:.2f} seconds"
@@ -95,12 +125,7 @@ async def test_list_stats():
     print(f"Bad responses: {bad_responses[0]}")
     print(
         tabulate(
-            [
-                [s] + n
-                for s, n in sorted(
-                    list(stats.items()), key=lambda k: k[1], reverse=True
-                )
-            ],
+            stats.table(),
             headers=["Brand"] + [f"#{i + 1}" for i in range(0, number)],
             tablefmt="github",  # Changed to `github` for README
         )
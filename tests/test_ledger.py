@@ -0,0 +1,108 @@
+import asyncio
+
+import pytest
+from together.types import ChatCompletionResponse
+
+from ledger import UNTAGGED, CostLedger, Price, tagged
+from mock_llm_call import Behavior, Model as Mock, constant
+from together_llm_call import Model as TLlama
+
+
+def test_price_cost():
+    price = Price(input_per_million=1.0, output_per_million=4.0)
+    assert price.cost(1_000_000, 250_000) == pytest.approx(2.0)
+    assert price.cost(1_000_000, 250_000, batch=True) == pytest.approx(1.0)
+
+
+def test_ledger_dimensions_and_round_trip():
+    ledger = CostLedger()
+    price = Price(1.0, 1.0)
+    with tagged(method="list", job="suv"):
+        ledger.record("m1", price, 100, 50)
+        with tagged(job="sedan"):
+            ledger.record("m1", price, 10, 5)
+    ledger.record("m2", price, 1, 1)
+    assert ledger.total().tokens == 167
+    assert ledger.total(job="suv").requests == 1
+    assert ledger.by("method")["list"].input_tokens == 110
+    assert set(ledger.by("model")) == {"m1", "m2"}
+
+    restored = CostLedger.from_dict(ledger.to_dict())
+    restored.merge(ledger)
+    assert restored.total().tokens == 2 * 167
+    assert restored.total().cost == pytest.approx(2 * ledger.total().cost)
+
+
+@pytest.mark.asyncio
+async def test_model_records_tokens_per_job():
+    ledger = CostLedger()
+    model = Mock(Behavior(seed=1, input_tokens=40, choice_tokens=2), ledger=ledger)
+
+    async def job(name: str, calls: int):
+        with tagged(method="choice", job=name):
+            for _ in range(0, calls):
+                await model.choice_from_pair("Volvo or Saab?", 1.0, 1)
+
+    await asyncio.gather(job("a", 3), job("b", 2))
+    assert ledger.total(job="a").requests == 3
+    assert ledger.total(job="b").input_tokens == 80
+    assert ledger.total(model="mock-llm").cost > 0
+
+
+@pytest.mark.asyncio
+async def test_methods_book_under_their_own_name():
+    ledger = CostLedger()
+    model = Mock(Behavior(seed=1, latency=constant(0.0)), ledger=ledger)
+    await model.choice_from_pair("Volvo or Saab?", 1.0, 1)
+    await model.ask_for_list(3, "Top luxury SUV brands?", "", 1.0)
+    with tagged(method="custom"):
+        await model.ask_for_list(3, "Top luxury SUV brands?", "", 1.0)
+    assert ledger.total(method="choice").requests == 1
+    # The outermost method wins over the ones it calls
+    assert ledger.total(method="list").requests == 1
+    assert ledger.total(method="custom").requests == 1
+    assert ledger.total(method=UNTAGGED).requests == 0
+
+
+def test_together_usage_is_reported():
+    response = {
+        "id": "x",
+        "choices": [
+            {"index": 0, "message": {"role": "assistant", "content": "Volvo"}},
+            {"index": 1, "message": {"role": "assistant", "content": "Saab"}},
+        ],
+        "usage": {"prompt_tokens": 30, "completion_tokens": 4, "total_tokens": 34},
+    }
+    results = TLlama.simple_responses(ChatCompletionResponse.model_validate(response))
+    assert [r.input_tokens for r in results] == [30, 0]
+    assert [r.output_tokens for r in results] == [4, 0]
+
+
+def test_cached_tokens_billed_at_cached_rate():
+    ledger = CostLedger()
+    price = Price(1.0, 1.0, cached_input_per_million=0.1)
+    ledger.record("m", price, 1_000_000, 0, cached_tokens=500_000)
+    assert ledger.total().cached_tokens == 500_000
+    assert ledger.total().cost == pytest.approx(0.55)
+
+
+def test_gemini_reports_cached_tokens(monkeypatch):
+    monkeypatch.setenv("GOOGLE_API_KEY", "test")
+    # pylint: disable=import-outside-toplevel
+    from google.genai import types
+
+    from gemini_llm_call import Model as Gemini
+
+    response = types.GenerateContentResponse(
+        candidates=[
+            types.Candidate(content=types.Content(parts=[types.Part(text="a")])),
+            types.Candidate(content=types.Content(parts=[types.Part(text="b")])),
+        ],
+        usage_metadata=types.GenerateContentResponseUsageMetadata(
+            prompt_token_count=2000,
+            candidates_token_count=2,
+            cached_content_token_count=1500,
+        ),
+    )
+    responses = Gemini.simple_responses(response)
+    assert [r.cached_tokens for r in responses] == [1500, 0]
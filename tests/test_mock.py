@@ -0,0 +1,58 @@
+import asyncio
+import time
+
+import pytest
+
+from mock_llm_call import Behavior, Model as Mock, constant
+
+
+@pytest.mark.asyncio
+async def test_choice():
+    model = Mock(Behavior(seed=1))
+    answer = await model.choice_from_pair(
+        "Which car is the best - Volvo or Saab?", 1.0, 10
+    )
+    assert answer.answer in {"Volvo", "Saab"}
+    assert answer.probability is not None
+
+
+@pytest.mark.asyncio
+async def test_list():
+    model = Mock(Behavior(seed=1))
+    answers = await model.ask_for_list(3, "Top luxury SUV brands?", "", 0.1)
+    assert len(answers.answers) == 3
+    assert answers.output_tokens > 0
+
+
+@pytest.mark.asyncio
+async def test_errors_are_empty_answers():
+    model = Mock(Behavior(seed=1, latency=constant(0.0), error_rates={503: 1.0}))
+    answer = await model.choice_from_pair("Volvo or Saab?", 1.0, 10)
+    assert answer.answer == ""
+
+
+@pytest.mark.asyncio
+async def test_choices_at_scale():
+    model = Mock(Behavior(seed=1, latency=constant(0.01), capacity=200))
+    iterations = model.max_parallelism * 2
+    counter = [0]
+    stats = {"Bad": 0}
+
+    async def run_calls(_):
+        while counter[0] < iterations:
+            counter[0] += 1
+            choice = await model.choice_from_pair("Volvo or Saab?", 1.0, 10)
+            if choice.answer not in {"Volvo", "Saab"}:
+                stats["Bad"] += 1
+                counter[0] -= 1
+            else:
+                stats[choice.answer] = stats.get(choice.answer, 0) + 1
+
+    start_time = time.perf_counter()
+    await asyncio.gather(*[run_calls(i) for i in range(0, model.max_parallelism)])
+    elapsed_time = time.perf_counter() - start_time
+    assert stats["Volvo"] + stats["Saab"] >= iterations
+    assert model.parallelism < model.max_parallelism
+    print(
+        f"\nfinished {iterations} calls in {elapsed_time:.2f} seconds, live parallelism {model.parallelism}"
+    )
@@ -0,0 +1,40 @@
+import json
+
+import pytest
+
+from benchmark import PARSE_PAYLOADS, parse_cost
+from llm_call import LLM
+
+
+def ranked(choices: dict) -> list[str]:
+    return LLM.parse_json_ranked_list(json.dumps({"choices": choices}))
+
+
+def test_orders_by_position():
+    assert ranked({"BMW": 2, "Audi": 3, "Land Rover": 1}) == [
+        "Land Rover",
+        "BMW",
+        "Audi",
+    ]
+    # Ties keep reply order
+    assert ranked({"BMW": 1, "Audi": 1}) == ["BMW", "Audi"]
+
+
+def test_rejects_invalid_lists():
+    assert ranked({"1": 1, "BMW": 2}) == []
+    assert ranked({"BMW": 5, "Audi": 1}) == []
+    assert ranked({"BMW": "1"}) == []
+    assert ranked({"BMW": 1.0}) == []
+
+
+def test_malformed_json_raises():
+    with pytest.raises(ValueError):
+        LLM.parse_json_ranked_list('{"choices": {"BMW"')
+    with pytest.raises(KeyError):
+        LLM.parse_json_ranked_list('{"brands": {}}')
+
+
+def test_parse_cost():
+    costs = parse_cost(10)
+    assert set(costs) == set(PARSE_PAYLOADS)
+    assert all(cost > 0 for cost in costs.values())
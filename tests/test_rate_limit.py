@@ -0,0 +1,101 @@
+import pytest
+
+from rate_limit import Quota, QuotaLimiter, TokenBucket
+
+
+class FakeClock:
+    def __init__(self) -> None:
+        self.now = 0.0
+        self.sleeps: list[float] = []
+
+    def monotonic(self) -> float:
+        return self.now
+
+    async def sleep(self, seconds: float) -> None:
+        self.sleeps.append(seconds)
+        self.now += seconds
+
+
+@pytest.fixture(name="clock")
+def fixture_clock():
+    return FakeClock()
+
+
+def test_bucket_starts_full_with_burst_capacity(clock):
+    bucket = TokenBucket(per_minute=60, burst_seconds=10.0, clock=clock.monotonic)
+    assert bucket.capacity == 10.0
+    for _ in range(0, 10):
+        assert bucket.delay(1) == 0.0
+        bucket.take(1)
+    assert bucket.delay(1) == pytest.approx(1.0)
+    assert clock.now == 0.0
+
+
+def test_bucket_refills_at_rate_up_to_capacity(clock):
+    bucket = TokenBucket(per_minute=120, burst_seconds=5.0, clock=clock.monotonic)
+    bucket.take(10)
+    assert bucket.delay(4) == pytest.approx(2.0)
+    clock.now += 1.0
+    assert bucket.delay(4) == pytest.approx(1.0)
+    # Idle time never fills past capacity
+    clock.now += 600.0
+    assert bucket.delay(10) == 0.0
+    assert bucket.delay(11) == 0.0
+    bucket.take(10)
+    assert bucket.delay(1) == pytest.approx(0.5)
+
+
+def test_bucket_delay_behind_queued_requests(clock):
+    bucket = TokenBucket(per_minute=60, burst_seconds=2.0, clock=clock.monotonic)
+    assert bucket.delay(1, ahead=1) == 0.0
+    assert bucket.delay(1, ahead=3) == pytest.approx(2.0)
+    assert clock.now == 0.0
+
+
+@pytest.mark.asyncio
+async def test_rpm_admits_burst_then_paces(clock):
+    limiter = QuotaLimiter(
+        Quota(rpm=60, burst_seconds=3.0), clock.monotonic, clock.sleep
+    )
+    for _ in range(0, 3):
+        await limiter.admit(0)
+    assert clock.now == 0.0
+    await limiter.admit(0)
+    await limiter.admit(0)
+    assert clock.now == pytest.approx(2.0)
+
+
+@pytest.mark.asyncio
+async def test_tpm_waits_for_tokens(clock):
+    limiter = QuotaLimiter(
+        Quota(tpm=6000, burst_seconds=1.0), clock.monotonic, clock.sleep
+    )
+    await limiter.admit(100)
+    assert clock.now == 0.0
+    await limiter.admit(50)
+    assert clock.now == pytest.approx(0.5)
+
+
+@pytest.mark.asyncio
+async def test_settle_reconciles_estimate_with_actual_usage(clock):
+    limiter = QuotaLimiter(
+        Quota(tpm=6000, burst_seconds=1.0), clock.monotonic, clock.sleep
+    )
+    await limiter.admit(100)
+    # The request used 40 tokens fewer than estimated; they are given back
+    limiter.settle(100, 60)
+    assert limiter.delay(40) == 0.0
+    await limiter.admit(40)
+    # And overruns are charged, pushing the next request back
+    limiter.settle(40, 100)
+    assert limiter.delay(10) == pytest.approx(0.7)
+    assert clock.now == 0.0
+
+
+@pytest.mark.asyncio
+async def test_unlimited_quota_never_waits(clock):
+    limiter = QuotaLimiter(Quota(), clock.monotonic, clock.sleep)
+    for _ in range(0, 100):
+        await limiter.admit(1_000_000)
+    assert limiter.delay(1_000_000, ahead=10) == 0.0
+    assert not clock.sleeps
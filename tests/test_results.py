@@ -0,0 +1,134 @@
+import json
+import sys
+
+import pytest
+
+from batch_runner import BatchRunner, ShardedRunner, load_jobs
+from mock_llm_call import Behavior, Model as Mock, constant
+from results import ResultStore, Sample
+
+
+def sample(answers, **fields):
+    return Sample(
+        **{"model": "m", "template": "t", "answers": answers, "temperature": 0.0}
+        | fields
+    )
+
+
+def test_table_counts_brands_by_position(tmp_path):
+    with ResultStore(str(tmp_path / "results.sqlite"), batch_size=4) as store:
+        store.add(sample(["Audi", "BMW"]))
+        store.add(sample(["BMW", "Audi"]))
+        store.add(sample(["Audi", "Volvo"]))
+        store.add(sample([]))
+        assert store.samples() == 4
+        assert store.table() == [
+            ["Audi", 2, 1],
+            ["BMW", 1, 1],
+            ["Volvo", 0, 1],
+        ]
+        assert store.table(positions=1, model="other") == []
+
+
+def test_rows_survive_reopen(tmp_path):
+    path = str(tmp_path / "results.sqlite")
+    with ResultStore(path) as store:
+        store.add(sample(["Audi"], latency=0.5, input_tokens=10))
+    with ResultStore(path) as store:
+        store.add(sample(["Audi"]))
+        assert store.samples() == 2
+        assert store.table() == [["Audi", 2]]
+
+
+def test_compare_and_diff(tmp_path):
+    with ResultStore(str(tmp_path / "results.sqlite")) as store:
+        for _ in range(3):
+            store.add(sample(["Audi"], temperature=0.0, system_prompt="a"))
+        store.add(sample(["BMW"], temperature=1.0, system_prompt="b"))
+        store.add(sample(["Audi"], temperature=1.0, system_prompt="b"))
+
+        values, rows = store.compare("temperature")
+        assert values == [0.0, 1.0]
+        assert rows == [["Audi", 1.0, 0.5], ["BMW", 0.0, 0.5]]
+
+        assert store.diff("system_prompt", "a", "b") == [
+            ["Audi", 1.0, 0.5, -0.5],
+            ["BMW", 0.0, 0.5, 0.5],
+        ]
+        assert store.diff("system_prompt", "a", "missing") == []
+        with pytest.raises(ValueError):
+            store.compare("nonsense")
+
+
+def test_parquet_export_needs_pyarrow(tmp_path, monkeypatch):
+    monkeypatch.setitem(sys.modules, "pyarrow", None)
+    with ResultStore(str(tmp_path / "results.sqlite")) as store:
+        with pytest.raises(ImportError, match="pip install pyarrow"):
+            store.export_parquet(str(tmp_path / "samples.parquet"))
+
+
+@pytest.mark.asyncio
+async def test_batch_runner_records_samples(job_file, tmp_path):
+    model = Mock(Behavior(seed=1, latency=constant(0.0)), parallelism=8)
+    store = ResultStore(str(tmp_path / "results.sqlite"))
+    jobs = load_jobs(job_file)
+    runner = BatchRunner(model, jobs, str(tmp_path / "checkpoint.json"), store=store)
+    results = await runner.run()
+
+    assert store.samples(category="Luxury SUVs") == 40
+    assert store.samples(kind="choice") == 30
+    assert sorted(store.table(positions=3, kind="list")) == sorted(
+        results["suv"].table()
+    )
+    suv = jobs[0]
+    assert store.samples(template=suv.templates[1], kind="list") == 20
+    store.close()
+
+
+@pytest.mark.asyncio
+async def test_resumed_run_does_not_repeat_samples(job_file, tmp_path):
+    path = str(tmp_path / "results.sqlite")
+    checkpoint = str(tmp_path / "checkpoint.json")
+    model = Mock(Behavior(seed=1, latency=constant(0.0)), parallelism=8)
+    with ResultStore(path) as store:
+        await BatchRunner(model, load_jobs(job_file), checkpoint, store=store).run()
+    # As if the run had died after writing samples but before checkpointing
+    with open(checkpoint, encoding="utf-8") as f:
+        saved = json.load(f)
+    saved["jobs"]["suv"]["completed"] = []
+    with open(checkpoint, "w", encoding="utf-8") as f:
+        json.dump(saved, f)
+    with ResultStore(path) as store:
+        await BatchRunner(model, load_jobs(job_file), checkpoint, store=store).run()
+        assert store.samples(job="suv") == 40
+        assert store.samples() == 70
+
+
+@pytest.mark.asyncio
+async def test_failed_attempts_are_not_stored(job_file, tmp_path):
+    model = Mock(
+        Behavior(seed=1, latency=constant(0.0), error_rates={503: 0.3}),
+        parallelism=8,
+    )
+    with ResultStore(str(tmp_path / "results.sqlite")) as store:
+        runner = BatchRunner(
+            model, load_jobs(job_file), str(tmp_path / "checkpoint.json"), store=store
+        )
+        results = await runner.run()
+        assert sum(runner.failures.values()) > 0
+        assert store.samples() == sum(a.samples for a in results.values())
+
+
+@pytest.mark.asyncio
+async def test_shards_share_one_store(job_file, tmp_path):
+    path = str(tmp_path / "results.sqlite")
+    sharded = ShardedRunner(
+        "mock",
+        load_jobs(job_file),
+        str(tmp_path / "checkpoint.json"),
+        shards=2,
+        store_path=path,
+    )
+    await sharded.run()
+    with ResultStore(path) as store:
+        assert store.samples() == 70
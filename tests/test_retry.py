@@ -0,0 +1,153 @@
+import asyncio
+import random
+import time
+
+import pytest
+
+from llm_call import LLM
+from mock_llm_call import Behavior, MockError, Model as Mock
+from retry import (
+    CLOSED,
+    HALF_OPEN,
+    OPEN,
+    CircuitBreaker,
+    CircuitOpenError,
+    RetryPolicy,
+    decorrelated_jitter,
+    parse_retry_after,
+)
+
+OK = [LLM.SimpleResponse("Volvo", None, 1, 1)]
+
+
+def flaky(failures: list[int], delay: float = 0.0):
+    # Fails with the given statuses in order, then succeeds
+    async def send():
+        await asyncio.sleep(delay)
+        if failures:
+            raise MockError(failures.pop(0))
+        return OK
+
+    return send
+
+
+def model(threshold: int = 3, **policy) -> Mock:
+    return Mock(
+        Behavior(seed=1),
+        retry=RetryPolicy(base=0.001, cap=0.01, **policy),
+        breaker=CircuitBreaker("test", threshold, reset_timeout=0.05),
+    )
+
+
+def test_decorrelated_jitter_bounds():
+    rng = random.Random(1)
+    delay = 0.5
+    for _ in range(0, 100):
+        delay = decorrelated_jitter(delay, 0.5, 10.0, rng)
+        assert 0.5 <= delay <= 10.0
+
+
+def test_parse_retry_after():
+    assert parse_retry_after("3") == 3.0
+    assert parse_retry_after(None) is None
+    assert parse_retry_after("soon") is None
+    assert parse_retry_after("Wed, 21 Oct 2015 07:28:00 GMT") == 0.0
+
+
+@pytest.mark.asyncio
+async def test_retries_then_succeeds():
+    m = model()
+    assert await m.dispatch_with_retries(flaky([503, 429])) == OK
+    assert m.breaker.state == CLOSED
+
+
+@pytest.mark.asyncio
+async def test_non_retryable_raises_immediately():
+    failures = [400, 503]
+    with pytest.raises(MockError):
+        await model().dispatch_with_retries(flaky(failures))
+    assert failures == [503]
+
+
+@pytest.mark.asyncio
+async def test_max_retries_override():
+    m = model()
+    seen = []
+
+    async def ask_generic_question(*_):
+        seen.append(m.retry_policy.max_attempts)
+        return OK[0]
+
+    m.ask_generic_question = ask_generic_question
+    assert await m.ask_generic_question_with_retries("", "?", 1.0, False, 2) == OK[0]
+    assert seen == [3]
+    assert m.retry_policy.max_attempts == RetryPolicy().max_attempts
+
+
+@pytest.mark.asyncio
+async def test_deadline_budget():
+    m = model(threshold=1000, deadline=0.05)
+    start = time.monotonic()
+    with pytest.raises((MockError, TimeoutError)):
+        await m.dispatch_with_retries(flaky([503] * 1000, delay=0.01))
+    assert time.monotonic() - start < 0.2
+
+
+@pytest.mark.asyncio
+async def test_hedge_cuts_tail_latency():
+    m = model(hedge_after=0.01)
+    calls = [0]
+
+    async def send():
+        calls[0] += 1
+        # Only the first copy is slow
+        await asyncio.sleep(1.0 if calls[0] == 1 else 0.001)
+        return OK
+
+    start = time.monotonic()
+    assert await m.dispatch_with_retries(send) == OK
+    assert time.monotonic() - start < 0.5
+    assert calls[0] == 2
+    await asyncio.sleep(0)
+    assert m.limiter.in_flight == 0
+
+
+@pytest.mark.asyncio
+async def test_circuit_breaker_opens_and_recovers():
+    m = model(max_attempts=3)
+    with pytest.raises(MockError):
+        await m.dispatch_with_retries(flaky([503] * 3))
+    assert m.breaker.state == OPEN
+    with pytest.raises(CircuitOpenError):
+        await m.dispatch_with_retries(flaky([]))
+    await asyncio.sleep(0.06)
+    assert m.breaker.state == HALF_OPEN
+    assert await m.dispatch_with_retries(flaky([])) == OK
+    assert m.breaker.state == CLOSED
+
+
+@pytest.mark.asyncio
+async def test_cancelled_trial_reopens_circuit():
+    m = model(max_attempts=3)
+    with pytest.raises(MockError):
+        await m.dispatch_with_retries(flaky([503] * 3))
+    await asyncio.sleep(0.06)
+    trial = asyncio.create_task(m.dispatch_with_retries(flaky([], delay=1.0)))
+    await asyncio.sleep(0.01)
+    trial.cancel()
+    with pytest.raises(asyncio.CancelledError):
+        await trial
+    # The abandoned trial counts as failed instead of blocking the circuit
+    assert m.breaker.state == OPEN
+    await asyncio.sleep(0.06)
+    assert await m.dispatch_with_retries(flaky([])) == OK
+    assert m.breaker.state == CLOSED
+
+
+@pytest.mark.asyncio
+async def test_throttling_does_not_open_circuit():
+    m = model(max_attempts=10)
+    assert await m.dispatch_with_retries(flaky([429] * 5)) == OK
+    with pytest.raises(MockError):
+        await m.dispatch_with_retries(flaky([429] * 10))
+    assert m.breaker.state == CLOSED
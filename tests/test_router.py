@@ -0,0 +1,85 @@
+import asyncio
+from collections import Counter
+
+import pytest
+
+from ledger import CostLedger
+from mock_llm_call import Behavior, Model as Mock, constant
+from rate_limit import Quota
+from router import Model as Router
+
+
+class Named(Mock):
+    def __init__(self, name: str, **kwargs) -> None:
+        self.name = name
+        super().__init__(**kwargs)
+
+    @property
+    def computed_model_name(self) -> str:
+        return self.name
+
+
+@pytest.mark.asyncio
+async def test_router_prefers_fast_backend_and_tags_results():
+    fast = Named("fast", behavior=Behavior(seed=1, latency=constant(0.002)))
+    slow = Named("slow", behavior=Behavior(seed=2, latency=constant(0.05)))
+    router = Router([fast, slow])
+    assert router.max_parallelism == fast.max_parallelism + slow.max_parallelism
+
+    # Warm up latency estimates, then send a burst
+    await asyncio.gather(
+        *[router.choice_from_pair("Volvo or Saab?", 1.0, 1) for _ in range(0, 4)]
+    )
+    results = await asyncio.gather(
+        *[router.choice_from_pair("Volvo or Saab?", 1.0, 1) for _ in range(0, 400)]
+    )
+    models = Counter(r.model for r in results)
+    assert set(models) <= {"fast", "slow"}
+    assert models["fast"] > models["slow"]
+
+
+@pytest.mark.asyncio
+async def test_router_spills_over_when_quota_is_exhausted():
+    ledger = CostLedger()
+    small = Named(
+        "small",
+        behavior=Behavior(seed=1, latency=constant(0.001)),
+        quota=Quota(rpm=60, burst_seconds=5),
+        ledger=ledger,
+    )
+    large = Named(
+        "large", behavior=Behavior(seed=2, latency=constant(0.01)), ledger=ledger
+    )
+    router = Router([small, large])
+    responses = await asyncio.gather(
+        *[router.ask_for_list(5, "Top SUV brands?", "", 0.1) for _ in range(0, 100)]
+    )
+    models = Counter(r.model for r in responses)
+    # small's bucket holds 5 requests; everything else must spill to large.
+    # Identical calls share multi-sample requests, so count requests.
+    assert ledger.total(model="small").requests <= 6
+    assert models["large"] >= 100 - 6 * small.max_samples_per_request
+    assert ledger.total(model="large").requests < models["large"]
+
+
+@pytest.mark.asyncio
+async def test_router_conversation_stays_on_one_backend():
+    router = Router(
+        [Named("a", behavior=Behavior(seed=1)), Named("b", behavior=Behavior(seed=2))]
+    )
+    conversation = await router.conversation(["Volvo or Saab?", "Why?"], 1.0)
+    assert conversation.model in {"a", "b"}
+    assert len(conversation.conversation) == 2
+    tally = await router.choice_tally("Volvo or Saab?", 1.0, 20)
+    assert tally.samples == 20
+
+
+@pytest.mark.asyncio
+async def test_router_reports_backend_models_and_probabilities():
+    router = Router([Mock(Behavior(seed=1, latency=constant(0.0)))])
+    assert router.known_models() == {"mock-llm"}
+    assert router.report_models() == ["mock-llm"]
+    assert router.has_logprob
+    result = await router.ask_generic_question("", "Volvo or Saab?", 1.0, False)
+    assert result.probability is not None
+    assert router.extract_logprobs(result) == result.probability
@@ -0,0 +1,76 @@
+import asyncio
+
+import pytest
+
+from mock_llm_call import Behavior, Model as Mock, constant
+from sampler import SequentialSampler
+
+
+@pytest.mark.asyncio
+async def test_choice_tally():
+    model = Mock(Behavior(seed=1, latency=constant(0.0)))
+    tally = await model.choice_tally("Volvo or Saab?", 1.0, 100)
+    assert tally.samples == 100
+    assert tally.requests == 13
+    assert set(tally.counts) == {"Volvo", "Saab"}
+    assert tally.interval("Volvo") > 0
+
+
+@pytest.mark.asyncio
+async def test_failed_requests_not_counted_in_tally():
+    model = Mock(Behavior(seed=1, latency=constant(0.0), error_rates={503: 0.5}))
+    tally = await model.choice_tally("Volvo or Saab?", 1.0, 80)
+    assert 0 < tally.requests < 10
+    assert tally.samples == 8 * tally.requests
+
+
+@pytest.mark.asyncio
+async def test_choice_until_confident():
+    model = Mock(Behavior(seed=1, latency=constant(0.0)))
+    estimate = await SequentialSampler(model, budget=500).choice("Volvo or Saab?", 1.0)
+    assert estimate.leader == "Volvo"
+    assert estimate.stop_reason == "separated"
+    assert estimate.tally.requests < 500
+
+
+@pytest.mark.asyncio
+async def test_choice_stops_at_budget():
+    model = Mock(Behavior(seed=1, latency=constant(0.0)))
+    sampler = SequentialSampler(model, wave_size=8, budget=3, min_samples=1000)
+    estimate = await sampler.choice("Volvo or Saab?", 1.0)
+    assert estimate.stop_reason == "budget"
+    assert estimate.tally.sent == 3
+    assert estimate.tally.samples == 24
+
+
+@pytest.mark.asyncio
+async def test_choice_stops_when_every_request_fails():
+    model = Mock(Behavior(seed=1, latency=constant(0.0), error_rates={500: 1.0}))
+    sampler = SequentialSampler(model, wave_size=8, budget=50)
+    estimate = await asyncio.wait_for(sampler.choice("Volvo or Saab?", 1.0), 3.0)
+    assert estimate.stop_reason == "failed"
+    assert estimate.leader is None
+    assert estimate.tally.requests == 0
+    assert estimate.tally.sent == 3
+
+
+@pytest.mark.asyncio
+async def test_ranked_list_counts_requests_like_choice():
+    model = Mock(Behavior(seed=1, latency=constant(0.0), error_rates={503: 0.5}))
+    sampler = SequentialSampler(model, wave_size=10, budget=30, min_samples=1000)
+    estimate = await sampler.ranked_list(3, "Top luxury SUV brands?", 1.0)
+    assert estimate.stop_reason == "budget"
+    assert estimate.tally.sent == 30
+    assert 0 < estimate.tally.requests < 30
+    assert estimate.tally.samples == estimate.tally.requests
+
+
+@pytest.mark.asyncio
+async def test_ranked_list_stops_when_every_request_fails():
+    model = Mock(Behavior(seed=1, latency=constant(0.0), error_rates={500: 1.0}))
+    sampler = SequentialSampler(model, wave_size=5, budget=1000)
+    estimate = await asyncio.wait_for(
+        sampler.ranked_list(3, "Top luxury SUV brands?", 1.0), 3.0
+    )
+    assert estimate.stop_reason == "failed"
+    assert estimate.tally.sent == 15
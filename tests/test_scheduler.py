@@ -0,0 +1,130 @@
+import asyncio
+
+import pytest
+
+from mock_llm_call import Behavior, Model as Mock, constant
+from scheduler import BULK, INTERACTIVE, NORMAL, Scheduler
+
+
+def recorder(order, name, gate=None):
+    async def call():
+        order.append(name)
+        if gate is not None:
+            await gate.wait()
+        return name
+
+    return call
+
+
+async def blocked(scheduler):
+    # Holds the only slot until the returned event is set
+    gate = asyncio.Event()
+    task = asyncio.create_task(scheduler.run(recorder([], "blocker", gate)))
+    await asyncio.sleep(0)
+    return gate, task
+
+
+@pytest.mark.asyncio
+async def test_priority_classes_run_in_order():
+    scheduler = Scheduler(Mock(), capacity=1)
+    gate, blocker = await blocked(scheduler)
+    order = []
+    tasks = [
+        asyncio.create_task(scheduler.run(recorder(order, name), priority))
+        for name, priority in [
+            ("bulk", BULK),
+            ("normal", NORMAL),
+            ("chat", INTERACTIVE),
+        ]
+    ]
+    await asyncio.sleep(0)
+    assert scheduler.queued() == 3
+    gate.set()
+    await asyncio.gather(blocker, *tasks)
+    assert order == ["chat", "normal", "bulk"]
+
+
+@pytest.mark.asyncio
+async def test_tenants_share_by_weight():
+    scheduler = Scheduler(Mock(), weights={"a": 3.0, "b": 1.0}, capacity=1)
+    gate, blocker = await blocked(scheduler)
+    order = []
+    tasks = [
+        asyncio.create_task(scheduler.run(recorder(order, tenant), tenant=tenant))
+        for tenant in ["a"] * 12 + ["b"] * 12
+    ]
+    await asyncio.sleep(0)
+    gate.set()
+    await asyncio.gather(blocker, *tasks)
+    assert order[:8].count("a") == 6
+    assert order[-8:] == ["b"] * 8
+
+
+@pytest.mark.asyncio
+async def test_deadline_and_cancellation():
+    scheduler = Scheduler(Mock(), capacity=1)
+    gate, blocker = await blocked(scheduler)
+    with pytest.raises(TimeoutError):
+        await scheduler.run(recorder([], "late"), deadline=0.01)
+
+    order = []
+    doomed = [
+        asyncio.create_task(scheduler.run(recorder(order, "x"), tenant="x"))
+        for _ in range(0, 3)
+    ]
+    kept = asyncio.create_task(scheduler.run(recorder(order, "y"), tenant="y"))
+    await asyncio.sleep(0)
+    assert scheduler.cancel("x") == 3
+    gate.set()
+    await asyncio.gather(blocker, kept)
+    assert all(task.cancelled() for task in doomed)
+    assert order == ["y"]
+    assert scheduler.in_flight == 0
+
+
+@pytest.mark.asyncio
+async def test_reserve_keeps_slots_for_interactive():
+    scheduler = Scheduler(Mock(), capacity=10, reserve=0.2)
+    gate = asyncio.Event()
+    order = []
+    bulk = [
+        asyncio.create_task(scheduler.run(recorder(order, "bulk", gate), BULK))
+        for _ in range(0, 10)
+    ]
+    await asyncio.sleep(0)
+    assert scheduler.in_flight == 8
+    chat = await scheduler.run(recorder(order, "chat"), INTERACTIVE)
+    assert chat == "chat"
+    gate.set()
+    await asyncio.gather(*bulk)
+
+
+@pytest.mark.asyncio
+async def test_model_calls():
+    model = Mock(Behavior(seed=1, latency=constant(0.0)))
+    scheduler = Scheduler(model)
+    choice = await scheduler.choice_from_pair("Volvo or Saab?", 1.0, tenant="ui")
+    answers = await scheduler.ask_for_list(3, "SUVs?", "", 1.0, priority=BULK)
+    assert choice.answer in {"Volvo", "Saab"}
+    assert len(answers.answers) == 3
+
+
+@pytest.mark.asyncio
+async def test_cancel_stops_calls_not_callers():
+    scheduler = Scheduler(Mock(), capacity=2)
+    gate = asyncio.Event()
+    order = []
+
+    async def caller(tenant):
+        try:
+            return await scheduler.run(recorder(order, tenant, gate), tenant=tenant)
+        except asyncio.CancelledError:
+            return "stopped"
+
+    tasks = [asyncio.create_task(caller(tenant)) for tenant in ["a", "b", "a"]]
+    await asyncio.sleep(0)
+    assert scheduler.cancel("a") == 2
+    gate.set()
+    assert await asyncio.gather(*tasks) == ["stopped", "b", "stopped"]
+    assert not any(task.cancelled() for task in tasks)
+    assert scheduler.in_flight == 0
@@ -0,0 +1,74 @@
+import json
+
+import pytest
+
+from mock_llm_call import Behavior, Model as Mock, constant
+from streaming import ChoicesDecoder, WordDecoder
+
+REPLY = json.dumps(
+    {"choices": {"Land Rover": 1, 'Mercedes "Benz"': 2, "BMW": 3, "Audi": 4}}
+)
+
+
+def feed(decoder, text, size=3):
+    for start in range(0, len(text), size):
+        if decoder.feed(text[start : start + size]):
+            return start + size
+    return None
+
+
+def test_choices_decoder_cuts_after_limit():
+    decoder = ChoicesDecoder(3)
+    assert feed(decoder, REPLY) < len(REPLY)
+    assert json.loads(decoder.text()) == {
+        "choices": {"Land Rover": 1, 'Mercedes "Benz"': 2, "BMW": 3}
+    }
+
+
+def test_choices_decoder_waits_for_missing_positions():
+    decoder = ChoicesDecoder(2)
+    reply = '{"choices": {"BMW": 3, "Audi": 2, "Porsche": 1}}'
+    feed(decoder, reply)
+    assert decoder.entries == {"BMW": 3, "Audi": 2, "Porsche": 1}
+
+
+def test_choices_decoder_keeps_complete_reply():
+    decoder = ChoicesDecoder(10)
+    assert feed(decoder, REPLY) is not None
+    assert decoder.finished
+    assert decoder.text() == REPLY
+
+
+def test_choices_decoder_rejects_bad_positions():
+    decoder = ChoicesDecoder(3)
+    feed(decoder, '{"choices": {"BMW": "first", "Audi": 1.5}}')
+    assert Mock.parse_json_ranked_list(decoder.text()) == []
+
+
+def test_word_decoder():
+    decoder = WordDecoder()
+    assert feed(decoder, "1. Volvo. It is safer.", size=4) is not None
+    assert Mock.clean_reply(decoder.text()) == "Volvo"
+
+    decoder = WordDecoder()
+    assert feed(decoder, "Land Rover") is None
+    assert decoder.text() == "Land Rover"
+
+
+@pytest.mark.asyncio
+async def test_streamed_list_spends_fewer_tokens():
+    behavior = Behavior(seed=1, latency=constant(0.0), list_tokens=30)
+    full = await Mock(behavior).ask_for_list(3, "SUVs?", "", 1.0)
+    streamed = await Mock(behavior, stream=True).ask_for_list(3, "SUVs?", "", 1.0)
+    assert streamed.answers == full.answers
+    assert streamed.output_tokens < full.output_tokens
+
+
+@pytest.mark.asyncio
+async def test_streamed_choice():
+    behavior = Behavior(
+        seed=1, latency=constant(0.0), choices={"Volvo. Because it is safer": 1.0}
+    )
+    choice = await Mock(behavior, stream=True).choice_from_pair("Volvo?", 1.0, 1)
+    assert choice.answer == "Volvo"
+    assert choice.probability == 1.0
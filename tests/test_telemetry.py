@@ -0,0 +1,63 @@
+import sys
+
+import pytest
+
+from mock_llm_call import Behavior, Model as Mock
+from telemetry import OpenTelemetryTelemetry, PrometheusTelemetry, Telemetry
+
+
+def test_noop_span_is_reusable():
+    telemetry = Telemetry()
+    with telemetry.span("a"):
+        with telemetry.span("b"):
+            telemetry.count("x", model="m")
+
+
+def test_prometheus_render():
+    telemetry = PrometheusTelemetry(buckets=(0.1, 1.0))
+    telemetry.count("llm_requests_total", model="m", status="ok")
+    telemetry.count("llm_requests_total", 2, model="m", status="ok")
+    telemetry.observe("llm_request_seconds", 0.05, model="m")
+    telemetry.observe("llm_request_seconds", 5.0, model="m")
+    text = telemetry.render()
+    assert "# TYPE llm_requests_total counter" in text
+    assert 'llm_requests_total{model="m",status="ok"} 3' in text
+    assert 'llm_request_seconds_bucket{model="m",le="0.1"} 1' in text
+    assert 'llm_request_seconds_bucket{model="m",le="1"} 1' in text
+    assert 'llm_request_seconds_bucket{model="m",le="+Inf"} 2' in text
+    assert 'llm_request_seconds_count{model="m"} 2' in text
+
+
+@pytest.mark.asyncio
+async def test_model_reports_requests_errors_and_truncation():
+    telemetry = PrometheusTelemetry()
+    model = Mock(Behavior(seed=1, error_rates={503: 0.5}), telemetry=telemetry)
+    for _ in range(0, 40):
+        await model.choice_from_pair("Volvo or Saab?", 1.0, 1)
+    ok = telemetry.value("llm_requests_total", model="mock-llm", status="ok")
+    failed = telemetry.value("llm_requests_total", model="mock-llm", status="503")
+    assert ok + failed == 40 and failed > 0
+    assert (
+        telemetry.value("llm_errors_total", model="mock-llm", type="MockError")
+        == failed
+    )
+    assert telemetry.histogram_count("llm_request_seconds", model="mock-llm") == ok
+    assert telemetry.histogram_count("llm_send_seconds", model="mock-llm") == 40
+
+    await model.ask_for_list(3, "Top luxury SUV brands?", "", 0.1)
+    assert telemetry.value("llm_extra_choices_total", model="mock-llm") == 2
+
+
+def test_rejected_ranked_list_counts_empty():
+    telemetry = PrometheusTelemetry()
+    model = Mock(telemetry=telemetry)
+    assert model.ranked_list_answers('{"choices": {"1": 1}}') == []
+    assert (
+        telemetry.value("llm_empty_answers_total", model="mock-llm", kind="list") == 1
+    )
+
+
+def test_opentelemetry_is_optional(monkeypatch):
+    monkeypatch.setitem(sys.modules, "opentelemetry", None)
+    with pytest.raises(ImportError, match="opentelemetry-api"):
+        OpenTelemetryTelemetry()
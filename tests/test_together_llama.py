@@ -4,6 +4,7 @@ import time
 import pytest
 from tabulate import tabulate
 
+from aggregate import VoteAggregator
 from together_llm_call import Model as TLlama
 
 
@@ -16,10 +17,25 @@ async def test_choice():
     print(answer)
 
 
+@pytest.mark.asyncio
+async def test_choice_tally():
+    model = TLlama()
+    tally = await model.choice_tally(
+        "In one word, which vintage car is the best - Volvo or Saab? Must choose one. Do not include any explanations",
+        1.0,
+        100,
+    )
+    print(f"\n{tally.samples} samples in {tally.requests} requests")
+    for answer, count in tally.ranked():
+        print(
+            f"{answer}: {count} ({tally.share(answer):.3f} ± {tally.interval(answer):.3f}), mean p={tally.mean_probability(answer)}"
+        )
+
+
 @pytest.mark.asyncio
 async def test_choices_at_scale():
     model = TLlama()
-    iterations = model.parallelism * 2
+    iterations = model.max_parallelism * 2
     start_time = time.perf_counter()
     counter = [0]
     stats = {"Bad": 0}
@@ -41,12 +57,15 @@ async def test_choices_at_scale():
             else:
                 stats[answer] = stats[answer] + 1
 
-    await asyncio.gather(*[run_calls(i) for i in range(0, model.parallelism)])
+    await asyncio.gather(*[run_calls(i) for i in range(0, model.max_parallelism)])
     results = sorted(list(stats.items()), key=lambda k: k[1], reverse=True)
     elapsed_time = time.perf_counter() - start_time
     print(
         f"\nfinished {iterations} -> {len(results)} calls in {elapsed_time:.2f} seconds"
     )
+    print(
+        f"Live parallelism: {model.parallelism}, observed RPM: {model.observed_rpm:.2f}"
+    )
     print("\n".join(f"{s}: {n}" for (s, n) in results))
 
 
@@ -63,7 +82,7 @@ async def test_list_stats():
     category = "Luxury SUVs"
     total_rounds = [iterations * len(questions)]
     model = TLlama()
-    stats = {}
+    stats = VoteAggregator(positions=number)
 
     async def run_calls(_):
         while total_rounds[0] > 0:
@@ -74,27 +93,18 @@ async def test_list_stats():
             )
             total_rounds[0] -= 1
             answers = await model.ask_for_list(number, qq, "", 0.9)
-            for i, answer in enumerate(answers.answers):
-                assert i < number
-                stats.setdefault(answer, [0 for _ in range(0, number)])
-                stat = stats[answer]
-                stat[i] += 1
-                stats[answer] = stat
+            assert len(answers.answers) <= number
+            stats.add_response(answers)
 
     start_time = time.perf_counter()
-    await asyncio.gather(*[run_calls(i) for i in range(0, model.parallelism)])
+    await asyncio.gather(*[run_calls(i) for i in range(0, model.max_parallelism)])
     elapsed_time = time.perf_counter() - start_time
     print(
         f"\nfinished {iterations} -> {iterations*len(questions)} calls in {elapsed_time:.2f} seconds"
     )
     print(
         tabulate(
-            [
-                [s] + n
-                for s, n in sorted(
-                    list(stats.items()), key=lambda k: k[1], reverse=True
-                )
-            ],
+            stats.table(),
             headers=["Brand"] + [f"#{i + 1}" for i in range(0, number)],
             tablefmt="presto",
         )
@@ -1,10 +1,13 @@
 import asyncio
+import functools
 import math
-import random
-from typing import Any
+import os
+from typing import Any, AsyncIterator, Callable
 
+import aiohttp
 import together
-from together import AsyncTogether
+from together import AsyncTogether, Together
+from together.types import BatchJobStatus, ChatCompletionResponse
 from dotenv import dotenv_values
 
 from constants import (
@@ -12,20 +15,66 @@ from constants import (
     EMPTY_LIST,
     CHOICE_SYS_PROMPT,
     RANKED_LIST_SYS_PROMPT,
-    Choices,
+    CHOICES_SCHEMA,
+    TOP_LOGPROBS,
 )
+from batch_api import (
+    BATCH_FAILED,
+    BATCH_RUNNING,
+    BATCH_SUCCEEDED,
+    BatchBackend,
+    BatchRequest,
+    read_jsonl,
+    write_jsonl,
+)
+from clients import Closer, PoolLimits, aiohttp_session
+from ledger import Price
 from llm_call import LLM
+from rate_limit import Quota
+from retry import parse_retry_after
+from streaming import ChoicesDecoder, StreamDecoder, WordDecoder
 
 SUPPORTED_MODEL = "meta-llama/Meta-Llama-3.1-70B-Instruct-Turbo"
 SUPPORTED_MODEL_INTERNAL_NAME = "llama-3.1-70B"
 SUPPORTED_MODEL_DISPLAY_NAME = "Llama-3.1"
 
+# Project quota tier; override per deployment with Model(quota=...)
+QUOTAS = {
+    SUPPORTED_MODEL_INTERNAL_NAME: Quota(rpm=600, tpm=180_000),
+}
+
+# Published list prices, USD per million tokens
+PRICES = {
+    SUPPORTED_MODEL_INTERNAL_NAME: Price(
+        input_per_million=0.88, output_per_million=0.88
+    ),
+}
+
+
+@functools.cache
+def api_key() -> str:
+    return dotenv_values("./tests/.secrets")["TOGETHER_API_KEY"]
+
+
+def pooled_session(limits: PoolLimits) -> tuple[aiohttp.ClientSession, Closer]:
+    session = aiohttp_session(limits)
+    return session, session.close
+
+
+def pooled_client(_limits: PoolLimits) -> tuple[AsyncTogether, Closer]:
+    # Holds no connections itself; requests go out on the pooled session
+    async def close() -> None:
+        pass
+
+    return AsyncTogether(api_key=api_key()), close
+
 
 class Model(LLM):
-    def __init__(self):
-        self.__client = AsyncTogether(
-            api_key=dotenv_values("./tests/.secrets")["TOGETHER_API_KEY"]
-        )
+    # Overrides the provider hooks of the LLM interface
+    # pylint: disable=too-many-public-methods
+    @property
+    def __client(self) -> AsyncTogether:
+        return self.clients.get("together-client", pooled_client)
 
     @staticmethod
     def list_models() -> list[str]:
@@ -35,96 +84,225 @@ class Model(LLM):
     def computed_model_name(self):
         return SUPPORTED_MODEL_INTERNAL_NAME
 
-    @staticmethod
-    def known_models() -> set[str]:
+    def known_models(self) -> set[str]:
         return {SUPPORTED_MODEL_INTERNAL_NAME}
 
     @property
-    def parallelism(self):
+    def max_parallelism(self):
         return 100
 
+    @property
+    def default_quota(self) -> Quota:
+        return QUOTAS.get(self.computed_model_name, Quota())
+
+    @property
+    def price(self) -> Price:
+        return PRICES.get(self.computed_model_name, Price())
+
+    @property
+    def max_samples_per_request(self) -> int:
+        return 32
+
+    @property
+    def choice_system_prompt(self) -> str:
+        return CHOICE_SYS_PROMPT
+
+    @property
+    def ranked_list_system_prompt(self) -> str:
+        return RANKED_LIST_SYS_PROMPT
+
     @property
     def has_logprob(self):
         return True
 
-    # pylint: disable=broad-exception-caught
     async def ask_generic_question(
         self,
         system_prompt: str,
         question: str,
         temperature: float,
         is_json: bool,
+        until: Callable[[], StreamDecoder] | None = None,
     ) -> LLM.SimpleResponse:
-        logprobs = 1 if not is_json else 0
-        for retry in range(0, 10):
+        if until is None:
+            responses = await self.pooled_samples(
+                system_prompt, question, temperature, is_json
+            )
+        else:
+            responses = await self.__ask_streaming(
+                system_prompt, question, temperature, is_json, until
+            )
+        return responses[0] if responses else EMPTY_ANSWER
+
+    # pylint: disable=broad-exception-caught
+    async def __ask_streaming(
+        self,
+        system_prompt: str,
+        question: str,
+        temperature: float,
+        is_json: bool,
+        until: Callable[[], StreamDecoder],
+    ) -> list[LLM.SimpleResponse]:
+        request = self.__request(system_prompt, question, temperature, is_json, 1)
+
+        async def chunks() -> AsyncIterator[LLM.SimpleResponse]:
+            stream = await self.__create(**request, stream=True)
+            logprob = None
             try:
-                if not is_json:
-                    response = await self.__client.chat.completions.create(
-                        model=SUPPORTED_MODEL,
-                        messages=[
-                            {"role": "user", "content": question},
-                            {"role": "system", "content": system_prompt},
-                        ],
-                        logprobs=logprobs,
-                        temperature=temperature,
-                    )
-                else:
-                    response = await self.__client.chat.completions.create(
-                        model=SUPPORTED_MODEL,
-                        messages=[
-                            {"role": "user", "content": question},
-                            {"role": "system", "content": system_prompt},
-                        ],
-                        logprobs=logprobs,
-                        temperature=temperature,
-                        response_format={
-                            "type": "json_object",
-                            "schema": Choices.model_json_schema(),
-                        },
+                async for chunk in stream:
+                    choice = chunk.choices[0] if chunk.choices else None
+                    if choice and choice.logprobs is not None:
+                        # Same as choice_logprobs: every token so far
+                        logprob = (logprob or 0.0) + choice.logprobs
+                    yield LLM.SimpleResponse(
+                        answer=(choice.delta.content if choice and choice.delta else "")
+                        or "",
+                        probability=None if logprob is None else math.exp(logprob),
+                        input_tokens=chunk.usage.prompt_tokens if chunk.usage else 0,
+                        output_tokens=(
+                            chunk.usage.completion_tokens if chunk.usage else 0
+                        ),
                     )
+            finally:
+                await stream.aclose()
 
-                # pylint: disable=fixme
-                return LLM.SimpleResponse(
-                    answer=response.choices[0].message.content,
-                    probability=self.extract_logprobs(response),
-                    input_tokens=0,  # TODO
-                    output_tokens=0,  # TODO
-                )
-            except together.error.TogetherException as ex:
-                if ex.http_status in {429, 502, 503}:
-                    seconds = int(
-                        pow(2, retry) * (1.0 + random.randint(0, 100) / 100.0)
-                    )
-                    print(
-                        f"Llama on Together {ex.http_status}: waiting {seconds} seconds to avoid quota error attempt {retry}."
-                    )
-                    await asyncio.sleep(seconds)
-                else:
-                    print(f"Error in Llama on Together: {ex}")
-                    return EMPTY_ANSWER
-            except Exception as ex:
-                print(f"Error in Llama on Together: {ex}")
-                return EMPTY_ANSWER
+        try:
+            return await self.dispatch_with_retries(
+                self.streamed(chunks, until, system_prompt, question),
+                self.estimate_tokens(system_prompt, question, is_json),
+                self.cache_key(
+                    system_prompt,
+                    question,
+                    temperature,
+                    request.get("response_format"),
+                    until=until,
+                ),
+            )
+        except Exception as ex:
+            self.record_error(ex)
+        return []
+
+    # pylint: disable=broad-exception-caught
+    async def ask_generic_question_samples(
+        self,
+        system_prompt: str,
+        question: str,
+        temperature: float,
+        is_json: bool,
+        samples: int,
+    ) -> list[LLM.SimpleResponse]:
+        request = self.__request(system_prompt, question, temperature, is_json, samples)
+
+        async def send() -> list[LLM.SimpleResponse]:
+            return self.simple_responses(await self.__create(**request))
+
+        estimated_tokens = samples * self.estimate_tokens(
+            system_prompt, question, is_json
+        )
+        key = self.cache_key(
+            system_prompt,
+            question,
+            temperature,
+            request.get("response_format"),
+            samples,
+        )
+        try:
+            return await self.dispatch_with_retries(send, estimated_tokens, key)
+        except Exception as ex:
+            self.record_error(ex)
+        return []
+
+    async def __create(self, model: str, messages: list[dict], **options: Any) -> Any:
+        # The SDK opens a new aiohttp session per call unless one is set
+        token = together.aiosession.set(self.clients.get("together", pooled_session))
+        try:
+            return await self.__client.chat.completions.create(
+                model=model, messages=messages, **options
+            )
+        finally:
+            together.aiosession.reset(token)
+
+    def __request(
+        self,
+        system_prompt: str,
+        question: str,
+        temperature: float,
+        is_json: bool,
+        samples: int,
+    ) -> dict:
+        request = {
+            "model": SUPPORTED_MODEL,
+            "messages": [
+                {"role": "user", "content": question},
+                {"role": "system", "content": system_prompt},
+            ],
+            "logprobs": TOP_LOGPROBS if not is_json else 0,
+            "temperature": temperature,
+            "n": samples,
+        }
+        if is_json:
+            request["response_format"] = {
+                "type": "json_object",
+                "schema": CHOICES_SCHEMA,
+            }
+        return request
+
+    @property
+    def has_batch_api(self) -> bool:
+        return True
+
+    def create_batch_backend(self) -> BatchBackend:
+        return Batches(Together(api_key=api_key()))
+
+    def batch_line(self, request: BatchRequest) -> dict:
+        return {
+            "custom_id": request.id,
+            "body": self.__request(
+                request.system_prompt,
+                request.question,
+                request.temperature,
+                request.is_json,
+                1,
+            ),
+        }
+
+    def parse_batch_line(self, line: dict) -> tuple[str, LLM.SimpleResponse]:
+        body = (line.get("response") or {}).get("body")
+        if not body:
+            return line["custom_id"], EMPTY_ANSWER
+        responses = self.simple_responses(ChatCompletionResponse.model_validate(body))
+        return line["custom_id"], responses[0] if responses else EMPTY_ANSWER
 
     # pylint: disable=broad-exception-caught
     async def ask_for_open_list(
-        self, system_prompt: str, question: str, temperature: float
+        self,
+        system_prompt: str,
+        question: str,
+        temperature: float,
+        until: Callable[[], StreamDecoder] | None = None,
     ) -> LLM.Response:
         response = await self.ask_generic_question(
-            system_prompt, question, temperature, True
+            system_prompt, question, temperature, True, until
         )
         try:
-            answers = self.parse_json_ranked_list(response.answer)
-            return LLM.Response(answers=answers, input_tokens=0, output_tokens=0)
+            answers = self.ranked_list_answers(response.answer)
+            return LLM.Response(
+                answers=answers,
+                input_tokens=response.input_tokens,
+                output_tokens=response.output_tokens,
+            )
 
         except Exception as ex:
-            print(f'Error in Together.ask_for_open_list "{response.answer}": {ex} ')
+            self.record_parse_failure(response.answer, ex)
             return EMPTY_LIST
 
     async def ask_for_ranked_list(
-        self, system_prompt: str, question: str, temperature: float
+        self,
+        system_prompt: str,
+        question: str,
+        temperature: float,
+        until: Callable[[], StreamDecoder] | None = None,
     ) -> LLM.Response:
-        return await self.ask_for_open_list(system_prompt, question, temperature)
+        return await self.ask_for_open_list(system_prompt, question, temperature, until)
 
     async def ask_for_list(
         self,
@@ -134,13 +312,12 @@ class Model(LLM):
         temperature: float | None,
     ) -> LLM.Response:
         result = await self.ask_for_ranked_list(
-            RANKED_LIST_SYS_PROMPT, question, temperature
+            RANKED_LIST_SYS_PROMPT,
+            question,
+            temperature,
+            (lambda: ChoicesDecoder(choices)) if self.streaming else None,
         )
-        if len(result.answers) > choices:
-            print(
-                f'Ignoring extra {len(result.answers) - choices} choices in Together.llama: {",".join(result.answers)}'
-            )
-            result.answers = result.answers[:choices]
+        result.answers = self.truncate(result.answers, choices)
         return result
 
     async def choice_from_pair(
@@ -150,8 +327,15 @@ class Model(LLM):
         max_iterations: int,
         system_prompt=None,
     ) -> LLM.Choice:
+        if not system_prompt:
+            system_prompt = CHOICE_SYS_PROMPT
+
         result = await self.ask_generic_question(
-            CHOICE_SYS_PROMPT, question, temperature, False
+            system_prompt,
+            question,
+            temperature,
+            False,
+            WordDecoder if self.streaming else None,
         )
         return LLM.Choice(
             answer=self.clean_reply(result.answer),
@@ -160,13 +344,41 @@ class Model(LLM):
             output_tokens=result.output_tokens,
         )
 
-    async def ask_generic_question_with_retries(
-        self, system_prompt, question, temperature, is_json, max_retries=10
-    ):
-        pass
-
     async def conversation(self, questions, temperature) -> LLM.Conversation:
-        return LLM.Conversation()
+        return await self.converse(questions, temperature)
+
+    # pylint: disable=broad-exception-caught
+    async def ask_with_history(
+        self,
+        system_prompt: str,
+        history: list[LLM.Conversation.Answer],
+        question: str,
+        temperature: float | None,
+    ) -> list[LLM.SimpleResponse]:
+        messages = (
+            [{"role": "system", "content": system_prompt}] if system_prompt else []
+        )
+        for turn in history:
+            messages.append({"role": "user", "content": turn.question})
+            messages.append({"role": "assistant", "content": "".join(turn.answers)})
+        messages.append({"role": "user", "content": question})
+
+        async def send() -> list[LLM.SimpleResponse]:
+            response = await self.__create(
+                model=SUPPORTED_MODEL, messages=messages, temperature=temperature
+            )
+            return self.simple_responses(response)
+
+        try:
+            return await self.dispatch(
+                send,
+                self.estimate_tokens(
+                    system_prompt, self.history_text(history, question), False
+                ),
+            )
+        except Exception as ex:
+            self.record_error(ex)
+            return []
 
     @staticmethod
     def order_models(models: list[str]):
@@ -179,14 +391,106 @@ class Model(LLM):
     def display_name(model: str) -> str:
         return SUPPORTED_MODEL_DISPLAY_NAME
 
+    @staticmethod
+    def error_status(exc: Exception) -> int | None:
+        if isinstance(exc, together.error.TogetherException):
+            return exc.http_status
+        return None
+
+    @staticmethod
+    def retry_after(exc: Exception) -> float | None:
+        if isinstance(exc, together.error.TogetherException):
+            return parse_retry_after(exc.headers.get("retry-after"))
+        return None
+
+    def is_retryable(self, exc: Exception) -> bool:
+        # Connection failures and timeouts carry no status
+        return super().is_retryable(exc) or isinstance(
+            exc, (together.error.Timeout, together.error.APIConnectionError)
+        )
+
+    @staticmethod
+    def simple_responses(response: Any) -> list[LLM.SimpleResponse]:
+        # Usage is reported per request, so it is booked on the first sample
+        usage = response.usage
+        return [
+            LLM.SimpleResponse(
+                answer=choice.message.content,
+                probability=Model.choice_logprobs(choice),
+                alternatives=Model.choice_alternatives(choice),
+                input_tokens=usage.prompt_tokens if usage and i == 0 else 0,
+                output_tokens=usage.completion_tokens if usage and i == 0 else 0,
+            )
+            for i, choice in enumerate(response.choices or [])
+        ]
+
     @staticmethod
     def extract_logprobs(completion: Any) -> float | None:
-        if (
-            completion
-            and completion.choices
-            and len(completion.choices) > 0
-            and completion.choices[0].logprobs
-            and completion.choices[0].logprobs.token_logprobs
-        ):
-            return math.exp(sum(completion.choices[0].logprobs.token_logprobs))
+        if completion and completion.choices and len(completion.choices) > 0:
+            return Model.choice_logprobs(completion.choices[0])
         return None
+
+    @staticmethod
+    def choice_logprobs(choice: Any) -> float | None:
+        if choice and choice.logprobs and choice.logprobs.token_logprobs:
+            return math.exp(sum(choice.logprobs.token_logprobs))
+        return None
+
+    @staticmethod
+    def choice_alternatives(choice: Any) -> dict[str, float] | None:
+        # Not in the SDK's LogprobsPart model, so read from the extra fields
+        top = getattr(choice.logprobs, "top_logprobs", None) if choice else None
+        if top and top[0]:
+            return {
+                token: math.exp(logprob)
+                for token, logprob in top[0].items()
+                if logprob is not None
+            }
+        return None
+
+
+class Batches(BatchBackend):
+    # The async client has no file upload, so the sync client runs in a thread
+    def __init__(self, client: Together) -> None:
+        self.__client = client
+
+    async def submit(self, lines: list[dict]) -> str:
+        path = write_jsonl(lines)
+        try:
+            uploaded = await asyncio.to_thread(
+                self.__client.files.upload, path, purpose="batch-api", check=False
+            )
+        finally:
+            os.remove(path)
+        job = await asyncio.to_thread(
+            self.__client.batches.create_batch,
+            uploaded.id,
+            endpoint="/v1/chat/completions",
+        )
+        return job.id
+
+    async def poll(self, job_id: str) -> str:
+        job = await asyncio.to_thread(self.__client.batches.get_batch, job_id)
+        match job.status:
+            case BatchJobStatus.COMPLETED:
+                return BATCH_SUCCEEDED
+            case (
+                BatchJobStatus.FAILED
+                | BatchJobStatus.EXPIRED
+                | BatchJobStatus.CANCELLED
+            ):
+                return BATCH_FAILED
+            case _:
+                return BATCH_RUNNING
+
+    async def results(self, job_id: str) -> list[dict]:
+        job = await asyncio.to_thread(self.__client.batches.get_batch, job_id)
+        path = write_jsonl([])
+        try:
+            await asyncio.to_thread(
+                self.__client.files.retrieve_content, job.output_file_id, output=path
+            )
+            with open(path, encoding="utf-8") as f:
+                return read_jsonl(f.read())
+        finally:
+            os.remove(path)